@@ -0,0 +1,156 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import BaseEntity
+from .revocation import is_token_revoked
+
+# Authenticated users are cached briefly; any save or delete of the user also
+# invalidates the entry straight away (see accounts.signals).
+USER_CACHE_TIMEOUT = 60 * 5
+
+# How long a verified username/password pair is trusted without re-hashing.
+CREDENTIAL_CACHE_TIMEOUT = 60 * 5
+
+
+def user_version_key(user_id):
+    return f'auth-user-version:{user_id}'
+
+
+def get_auth_version(user_id):
+    """
+    Return the user's auth version, which changes whenever the user is saved or deleted.
+    """
+    version_key = user_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    return version
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with `user_id` from the cache, loading and caching it on a miss.
+
+    Entries are keyed by the user id and the user's auth version. Invalidation bumps the
+    version rather than deleting the entry, and bumps it again once the change commits,
+    so a request that read the old row before the commit cannot leave it under the key
+    that is read afterwards.
+
+    The password hash is never written to the cache. The cached user has the field
+    deferred, so reading it loads it from the database and `save()` leaves it alone. It
+    carries `password_fingerprint` instead: the digest of the hash that simplejwt puts
+    in every token (see `CHECK_REVOKE_TOKEN`).
+
+    Returns:
+        BaseEntity: The user, with `entity_type` and `branch` loaded, or None.
+    """
+    key = f'auth-user:{user_id}:{get_auth_version(user_id)}'
+    user = cache.get(key)
+    if user is None:
+        user = BaseEntity.objects.select_related('entity_type', 'branch').filter(pk=user_id).first()
+        if user is not None:
+            user.password_fingerprint = get_md5_hash_password(user.password)
+            del user.__dict__['password']
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def bump_auth_version(user_id):
+    try:
+        cache.incr(user_version_key(user_id))
+    except ValueError:
+        cache.set(user_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_cached_user(user_id, using=None):
+    """
+    Make the next authenticated request for `user_id` reload the user from the database.
+    """
+    bump_auth_version(user_id)
+    # Again once the change is committed, as requests that read the old row in between
+    # may have cached it under the version bumped above
+    transaction.on_commit(partial(bump_auth_version, user_id), using=using)
+
+
+def credential_key(userid, password):
+    """
+    Return the cache key for a username/password pair.
+
+    The key is an HMAC under the project's secret key, so neither the password nor an
+    unkeyed hash of it is ever written to the cache.
+    """
+    digest = salted_hmac('accounts.authentication.credentials', f'{userid}\0{password}', algorithm='sha256')
+    return f'auth-credentials:{digest.hexdigest()}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from the cache instead of the database.
+
+    Behaves like `JWTAuthentication.get_user`; authenticated requests with a warm cache
+    run no authentication queries. Tokens revoked through logout are rejected (see
+    `accounts.revocation`), as are tokens issued before the user's last password change.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_fingerprint:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    Basic authentication that skips the password hash for recently verified credentials.
+
+    A successful login caches the user id and the user's auth version under an HMAC of
+    the credentials. Later requests with the same credentials are accepted as long as the
+    user's auth version (see `get_auth_version`) has not changed, so a password change
+    through `PasswordResetConfirmView`, the admin or anywhere else that saves the user
+    invalidates the entry. Failed logins are never cached.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credential_key(userid, password)
+        cached = cache.get(key)
+        if cached is not None:
+            user_id, version = cached
+            user = get_cached_user(user_id)
+            if (user is not None and user.is_active and get_auth_version(user_id) == version
+                    and user.get_username() == userid):
+                return (user, None)
+            cache.delete(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache.set(key, (user.pk, get_auth_version(user.pk)), CREDENTIAL_CACHE_TIMEOUT)
+        return (user, auth)
@@ -138,3 +138,13 @@ class Branch(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey('BaseEntity', on_delete=models.CASCADE, null=True, related_name='revoked_tokens')
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'Revoked token {self.jti}'
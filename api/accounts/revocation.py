@@ -0,0 +1,151 @@
+import datetime
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .models import RevokedToken
+
+# Every write to the revocation table bumps this cache key so that each process
+# knows when to pull the new rows into its filter.
+REVISION_KEY = 'token-revocation:revision'
+
+# Sized for the number of unexpired revoked tokens we expect to hold at once. Going
+# over capacity only raises the false-positive rate, which costs a query per hit.
+FILTER_CAPACITY = 100_000
+FILTER_ERROR_RATE = 0.001
+
+# Each refresh re-reads the revocations made this long before the previous one. A row is
+# stamped when it is inserted but only visible once committed, possibly after a refresh
+# that started later; the overlap covers that delay and clock skew between servers.
+REFRESH_OVERLAP = datetime.timedelta(minutes=5)
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter over strings.
+
+    Membership tests never give false negatives; false positives occur at roughly
+    `error_rate` while fewer than `capacity` items have been added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        # Double hashing: k positions derived from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class TokenDenylist:
+    """
+    Per-process view of the revocation table.
+
+    Revoked JTIs are kept in a bloom filter that is topped up with the rows revoked since
+    shortly before the last refresh (see `REFRESH_OVERLAP`) whenever the shared revision
+    changes, so checking a token that was
+    not revoked costs one cache read and no queries. The table is only queried to rule
+    out a false positive when the filter reports a hit.
+    """
+
+    def __init__(self, capacity=FILTER_CAPACITY, error_rate=FILTER_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.filter = BloomFilter(self.capacity, self.error_rate)
+        self.refreshed_at = None
+        self.revision = None
+
+    def refresh(self):
+        """
+        Pull revocations added since the last refresh into the filter. Rows read by an
+        earlier refresh may be added again, which leaves the filter unchanged.
+        """
+        revision = cache.get(REVISION_KEY)
+        if revision is not None and revision == self.revision:
+            return
+        with self.lock:
+            if revision is None:
+                # The revision was evicted or pruning asked for a rebuild; start over
+                # rather than trust rows we may have missed.
+                self.reset()
+                cache.add(REVISION_KEY, time.time_ns(), None)
+                revision = cache.get(REVISION_KEY)
+            started = timezone.now()
+            rows = RevokedToken.objects.all()
+            if self.refreshed_at is not None:
+                rows = rows.filter(revoked_at__gte=self.refreshed_at - REFRESH_OVERLAP)
+            for jti in rows.values_list('jti', flat=True).iterator():
+                self.filter.add(jti)
+            self.refreshed_at = started
+            self.revision = revision
+
+    def __contains__(self, jti):
+        self.refresh()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+
+denylist = TokenDenylist()
+
+
+def bump_revision():
+    try:
+        cache.incr(REVISION_KEY)
+    except ValueError:
+        cache.set(REVISION_KEY, time.time_ns(), None)
+
+
+def is_token_revoked(token):
+    """
+    Return True if `token` (a validated simplejwt token) has been revoked.
+    """
+    return token[api_settings.JTI_CLAIM] in denylist
+
+
+def revoke_token(token, user=None):
+    """
+    Add `token` to the revocation table until it expires.
+    """
+    RevokedToken.objects.get_or_create(
+        jti=token[api_settings.JTI_CLAIM],
+        defaults={'user': user, 'expires_at': datetime_from_epoch(token['exp'])},
+    )
+    bump_revision()
+    # Again once the row is committed, for processes that refreshed before they could see it
+    db_transaction.on_commit(bump_revision)
+
+
+def prune_revoked_tokens():
+    """
+    Delete revocations for tokens that have expired anyway and make every process
+    rebuild its filter without them.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    if deleted:
+        cache.delete(REVISION_KEY)
+    return deleted
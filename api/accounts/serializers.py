@@ -1,13 +1,20 @@
-from rest_framework.serializers import ModelSerializer, Serializer, EmailField, CharField
+from rest_framework.serializers import ModelSerializer, Serializer, EmailField, CharField, ValidationError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 from .models import (
     Employee, EntityType, BaseEntity, Notification, Document,
     Department, Role, Branch,
     )
+from core.models import Status
 from django.core.mail import send_mail
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
+from .authentication import get_cached_user
+from .revocation import is_token_revoked, revoke_token
 
 
 class PasswordResetRequestSerializer(Serializer):
@@ -17,6 +24,53 @@ class PasswordResetConfirmSerializer(Serializer):
     new_password = CharField(write_only=True)
 
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses refresh tokens that were revoked or issued before the user's last password
+    change, and revokes the old refresh token when it is rotated.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = get_cached_user(refresh.get(api_settings.USER_ID_CLAIM))
+        if user is None or not user.is_active:
+            raise InvalidToken('User not found or inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if refresh.get(api_settings.REVOKE_TOKEN_CLAIM) != user.password_fingerprint:
+                raise InvalidToken("The user's password has been changed.")
+        if is_token_revoked(refresh):
+            raise InvalidToken('Token has been revoked')
+
+        data = super().validate(attrs)
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            revoke_token(refresh, user)
+        return data
+
+
+class LogoutSerializer(Serializer):
+    refresh = CharField(write_only=True, required=False)
+
+    def validate_refresh(self, value):
+        try:
+            refresh = RefreshToken(value)
+        except TokenError as error:
+            raise ValidationError(str(error))
+        user = self.context['request'].user
+        if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(user.pk):
+            raise ValidationError('Token does not belong to the current user.')
+        return refresh
+
+    def save(self):
+        """
+        Revoke the access token the request was made with and the refresh token, if given.
+        """
+        request = self.context['request']
+        if request.auth is not None and api_settings.JTI_CLAIM in request.auth:
+            revoke_token(request.auth, request.user)
+        if 'refresh' in self.validated_data:
+            revoke_token(self.validated_data['refresh'], request.user)
+
+
 class EntityTypeSerializer(ModelSerializer):
     class Meta:
         model = EntityType
@@ -107,3 +161,47 @@ class NotificationSerializer(ModelSerializer):
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
 
+
+#####################################################################
+## Read serializers: related objects are nested declaratively so a
+## list is rendered in a single pass over a select_related queryset.
+#####################################################################
+class EntityTypeDetailSerializer(EntityTypeSerializer):
+    updated_by = BaseEntitySerializer(read_only=True)
+
+
+class BaseEntityDetailSerializer(BaseEntitySerializer):
+    branch = BranchSerializer(read_only=True)
+    entity_type = EntityTypeSerializer(read_only=True)
+
+
+class DepartmentDetailSerializer(DepartmentSerializer):
+    head_of_department = EmployeeSerializer(read_only=True)
+    branch = BranchSerializer(read_only=True)
+
+
+class BranchDetailSerializer(BranchSerializer):
+    manager = EmployeeSerializer(read_only=True)
+
+
+class EmployeeDetailSerializer(EmployeeSerializer):
+    branch = BranchSerializer(read_only=True)
+    entity_type = EntityTypeSerializer(read_only=True)
+    role = RoleSerializer(read_only=True)
+    department = DepartmentSerializer(read_only=True)
+
+
+class DocumentDetailSerializer(DocumentSerializer):
+    owner = BaseEntitySerializer(read_only=True)
+
+
+class NotificationStatusSerializer(ModelSerializer):
+    # core.serializers imports this module, so Status is serialized locally
+    class Meta:
+        model = Status
+        fields = '__all__'
+
+
+class NotificationDetailSerializer(NotificationSerializer):
+    recipient = BaseEntitySerializer(read_only=True)
+    status = NotificationStatusSerializer(read_only=True)
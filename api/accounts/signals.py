@@ -0,0 +1,24 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .authentication import invalidate_cached_user
+from .models import BaseEntity
+
+
+def handle_user_change(sender, instance, using, **kwargs):
+    invalidate_cached_user(instance.pk, using=using)
+
+
+def connect_user_signals():
+    """
+    Connect the receivers to BaseEntity and each of its subclasses.
+
+    Saving an Employee only sends the signal for the Employee sender, so every subclass
+    is connected explicitly. Receivers bound to no sender at all would also stop Django
+    from fast-deleting the rows of every other model.
+    """
+    for model in apps.get_models():
+        if issubclass(model, BaseEntity):
+            uid = f'handle_user_change:{model._meta.label_lower}'
+            post_save.connect(handle_user_change, sender=model, dispatch_uid=uid)
+            post_delete.connect(handle_user_change, sender=model, dispatch_uid=uid)
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task
+def prune_revoked_tokens():
+    from .revocation import prune_revoked_tokens
+
+    return prune_revoked_tokens()
@@ -1,3 +1,191 @@
-from django.test import TestCase
+import base64
+import datetime
+import pickle
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.deletion import Collector
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import get_auth_version, get_cached_user
+from .models import BaseEntity, Branch, EntityType, RevokedToken
+from .revocation import BloomFilter, TokenDenylist, bump_revision
+
+
+def create_user():
+    branch = Branch.objects.create(name='Main', address='1 Main St', branch_code='001', phone_number='000')
+    user = BaseEntity.objects.create(
+        username='customer', email='customer@example.com', phone_number='1', address='1 Main St',
+        date_of_birth='2000-01-01', tax_identifier_number='1', branch=branch, is_active=True,
+        entity_type=EntityType.objects.create(type_name='Individual'),
+    )
+    user.set_password('password')
+    user.save()
+    return user
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedJWTAuthenticationTests(APITestCase):
+    """
+    JWT-authenticated requests resolve the user from the cache until the user changes.
+    """
+    url = '/api/v1/reference-data/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        return len(context.captured_queries), response
+
+    def test_warm_requests_run_no_auth_queries(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        queries, response = self.count_queries()
+        self.assertEqual(response.status_code, 200)
+        # The reference data is cached too, so the whole request is query-free
+        self.assertEqual(queries, 0)
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        self.client.get(self.url)
+        self.user.full_name = 'Renamed Customer'
+        self.user.save()
+        queries, response = self.count_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 1)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_user_cached_before_the_commit_is_not_served_after_it(self):
+        active = get_cached_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # A concurrent request that still saw the committed row caches it under the new version
+            cache.set(f'auth-user:{self.user.pk}:{get_auth_version(self.user.pk)}', active)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(self.url)
+        cached = cache.get(f'auth-user:{self.user.pk}:{get_auth_version(self.user.pk)}')
+        self.assertEqual(cached.pk, self.user.pk)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cached))
+        # The field is loaded on demand and not written back by a save of the cached copy
+        cached.full_name = 'Renamed Customer'
+        cached.save()
+        self.assertTrue(BaseEntity.objects.get(pk=self.user.pk).check_password('password'))
+        self.assertEqual(cached.password, self.user.password)
+
+    def test_receivers_leave_other_models_fast_deletable(self):
+        # A receiver bound to no sender makes Django load every row before deleting it
+        self.assertTrue(Collector(using='default').can_fast_delete(RevokedToken.objects.all()))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CachedBasicAuthenticationTests(APITestCase):
+    """
+    Verified basic-auth credentials are not re-hashed until the password changes.
+    """
+    url = '/api/v1/reference-data/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    def get(self, password):
+        credentials = base64.b64encode(f'customer:{password}'.encode()).decode()
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def test_verified_credentials_skip_the_password_hash(self):
+        self.assertEqual(self.get('password').status_code, 200)
+        self.get('password')
+        with mock.patch.object(BaseEntity, 'check_password') as check_password:
+            with CaptureQueriesContext(connection) as context:
+                response = self.get('password')
+        self.assertEqual(response.status_code, 200)
+        check_password.assert_not_called()
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_credential_cache_holds_no_password_hash(self):
+        self.get('password')
+        dumps = b''.join(pickle.dumps(value) for value in cache._cache.values())
+        self.assertNotIn(self.user.password.encode(), dumps)
+
+    def test_wrong_password_is_rejected_and_not_cached(self):
+        self.assertEqual(self.get('wrong').status_code, 401)
+        self.assertEqual(self.get('wrong').status_code, 401)
+
+    def test_password_change_invalidates_cached_credentials(self):
+        self.get('password')
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertEqual(self.get('password').status_code, 401)
+        self.assertEqual(self.get('new-password').status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TokenRevocationTests(APITestCase):
+    """
+    Logged-out, rotated and pre-password-change tokens stop working.
+    """
+    url = '/api/v1/reference-data/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def refresh_token(self, refresh):
+        return self.client.post('/api/v1/auth/login/refresh/', {'refresh': str(refresh)})
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f'jti-{index}' for index in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'other-{index}' in bloom for index in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_rows_committed_after_a_refresh_are_still_picked_up(self):
+        denylist = TokenDenylist(capacity=1000, error_rate=0.01)
+        expires = timezone.now() + datetime.timedelta(days=1)
+        RevokedToken.objects.create(id=10, jti='later', expires_at=expires)
+        self.assertNotIn('earlier', denylist)
+        # A revocation stamped before the refresh, with a lower id, committing after it
+        RevokedToken.objects.create(id=5, jti='earlier', expires_at=expires)
+        RevokedToken.objects.filter(id=5).update(revoked_at=timezone.now() - datetime.timedelta(seconds=30))
+        bump_revision()
+        self.assertIn('earlier', denylist)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.post('/api/v1/auth/logout/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        response = self.refresh_token(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_token(response.data['refresh']).status_code, 200)
+
+    def test_password_change_revokes_issued_tokens(self):
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.refresh_token(self.refresh).status_code, 401)
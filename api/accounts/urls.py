@@ -1,15 +1,12 @@
 from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenObtainPairView
 from .views import (
     EntityTypeViewSet, DepartmentViewSet, BaseEntityViewSet, DocumentViewSet,
     BranchViewSet, EmployeeViewSet, MimicLoginView, RoleViewSet,
     NotificationViewSet, ActivateAccountView, PasswordResetRequestView,
-    PasswordResetConfirmView,
+    PasswordResetConfirmView, RevocableTokenRefreshView, LogoutView,
 )
 
 # Enable custom error handlers only in production
@@ -34,7 +31,8 @@ router.register(r'notifications', NotificationViewSet)
 
 urlpatterns = [
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/login/refresh/', RevocableTokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/logout/', LogoutView.as_view(), name='logout'),
     path('auth/activate/<uidb64>/<token>/', ActivateAccountView.as_view(), name='activate_account'),
     path('auth/password_reset/', PasswordResetRequestView.as_view(), name='password_reset'),
     path('auth/reset/<uidb64>/<token>/', PasswordResetConfirmView.as_view(), name='reset_password_confirm'),
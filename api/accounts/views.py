@@ -1,7 +1,12 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from core.serializers import StatusSerializer
+from core.mixins import ReferenceDataCacheMixin
+from core.models import Account, Investment, Loan, Transaction
+from core.serializers import (
+    AccountSummarySerializer, InvestmentSerializer, LoanSerializer, TransactionSerializer,
+)
 from core.views import BaseViewSet
 from .models import (
     Employee, EntityType, BaseEntity, Notification, Document,
@@ -11,15 +16,24 @@ from .serializers import (
     BaseEntitySerializer, DepartmentSerializer, DocumentSerializer,
     EmployeeSerializer, EntityTypeSerializer, NotificationSerializer,
     RoleSerializer, BranchSerializer,
+    BaseEntityDetailSerializer, BranchDetailSerializer, DepartmentDetailSerializer,
+    DocumentDetailSerializer, EmployeeDetailSerializer, EntityTypeDetailSerializer,
+    NotificationDetailSerializer,
     )
 from rest_framework.views import APIView
 from rest_framework import status
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
+from django.core.cache import cache
 from django.core.mail import send_mail
+from django.db.models import Q
 from django.urls import reverse
-from .serializers import PasswordResetRequestSerializer, PasswordResetConfirmSerializer
+from .serializers import (
+    PasswordResetRequestSerializer, PasswordResetConfirmSerializer, RevocableTokenRefreshSerializer,
+    LogoutSerializer,
+)
+from rest_framework_simplejwt.views import TokenRefreshView
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.shortcuts import render
@@ -66,6 +80,10 @@ class ApiRootView(APIView):
                 'transactions': '/api/v1/transactions/',
                 'transaction-directions': '/api/v1/transaction-directions/',
                 'transaction-types': '/api/v1/transaction-types/',
+                'reference-data': '/api/v1/reference-data/',
+                'metrics': '/api/v1/metrics',
+                'slow-queries': '/api/v1/slow-queries/',
+                'batch': '/api/v1/batch/',
                 'auth-login': '/api/v1/auth/login/',
                 'auth-login-refresh': '/api/v1/auth/login/refresh/',
                 'auth-activate': '/api/v1/auth/activate/<uidb64>/<token>/',
@@ -99,6 +117,28 @@ class MimicLoginView(TemplateView):
     template_name = 'mimic_login.html'
 
 
+class RevocableTokenRefreshView(TokenRefreshView):
+    serializer_class = RevocableTokenRefreshSerializer
+
+
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=LogoutSerializer,
+        responses={
+            200: openapi.Response(description="Logged out successfully."),
+            400: openapi.Response(description="Invalid refresh token."),
+        },
+    )
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            serializer.save()
+            return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class PasswordResetRequestView(APIView):
     permission_classes = [AllowAny]
 
@@ -184,7 +224,7 @@ class ActivateAccountView(APIView):
             return render(request, 'activation_error.html', status=400)
 
 
-class EntityTypeViewSet(BaseViewSet):
+class EntityTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing EntityType instances.
 
@@ -196,51 +236,9 @@ class EntityTypeViewSet(BaseViewSet):
     """
     queryset = EntityType.objects.select_related('updated_by').all()
     serializer_class = EntityTypeSerializer
+    read_serializer_class = EntityTypeDetailSerializer
     permission_classes = [IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific EntityType instance and include full details of the 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'updated_by'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['updated_by'] = BaseEntitySerializer(instance.updated_by).data if instance.updated_by else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all EntityType instances and include full details of the 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'updated_by' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace updated_by with the full object
-        for item, instance in zip(data, queryset):
-            item['updated_by'] = BaseEntitySerializer(instance.updated_by).data if instance.updated_by else None
-
-        return Response(data)
-
 
 class DepartmentViewSet(BaseViewSet):
     """
@@ -254,54 +252,9 @@ class DepartmentViewSet(BaseViewSet):
     """
     queryset = Department.objects.select_related('head_of_department', 'branch').all()
     serializer_class = DepartmentSerializer
+    read_serializer_class = DepartmentDetailSerializer
     permission_classes = [IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Department instance and include full details of the 'head_of_department' and 'branch' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'head_of_department' and 'branch'.
-        """
-
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['head_of_department'] = EmployeeSerializer(instance.head_of_department).data if instance.head_of_department else None
-        data['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Department instances and include full details of the 'head_of_department' and 'branch' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'head_of_department' and 'branch' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace head_of_department and branch with full objects
-        for item, instance in zip(data, queryset):
-            item['head_of_department'] = EmployeeSerializer(instance.head_of_department).data if instance.head_of_department else None
-            item['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-
-        return Response(data)
-
 
 class BaseEntityViewSet(BaseViewSet):
     """
@@ -316,51 +269,72 @@ class BaseEntityViewSet(BaseViewSet):
 
     queryset = BaseEntity.objects.select_related('branch', 'entity_type').all()
     serializer_class = BaseEntitySerializer
+    read_serializer_class = BaseEntityDetailSerializer
     permission_classes = [IsAuthenticated]
+    overview_cache_timeout = 30
+    overview_transactions = 10
+    overview_max_transactions = 100
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific BaseEntity instance and include full details of the 'branch' and 'entity_type' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'branch' and 'entity_type'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-        data['entity_type'] = EntityTypeSerializer(instance.entity_type).data if instance.entity_type else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
+    @action(detail=True, methods=['get'], url_path='overview')
+    def overview(self, request, pk=None):
         """
-        List all BaseEntity instances and include full details of the 'branch' and 'entity_type' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
+        Return everything the customer screen shows in one response: accounts with balances,
+        active loans with outstanding amounts, investments, the latest transactions and the
+        number of unread notifications.
 
-        Returns:
-            Response: A list of serialized data including 'branch' and 'entity_type' for each item.
+        Runs a fixed number of queries however many accounts or transactions the customer
+        has. `?transactions=` sets how many transactions are returned (default 10, up to
+        100). Responses are cached for a few seconds; pass `?refresh=true` to skip the cache.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace branch and entity_type with full objects
-        for item, instance in zip(data, queryset):
-            item['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-            item['entity_type'] = EntityTypeSerializer(instance.entity_type).data if instance.entity_type else None
-
+        entity = self.get_object()
+        if not (request.user.is_staff or request.user.pk == entity.pk):
+            raise PermissionDenied()
+        try:
+            limit = min(int(request.query_params.get('transactions', self.overview_transactions)),
+                        self.overview_max_transactions)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            return Response({"error": "transactions must be a non-negative integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        key = f'customer-overview:{entity.pk}:{limit}'
+        if request.query_params.get('refresh', '').lower() not in ('1', 'true', 'yes'):
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+        accounts = list(
+            Account.objects.filter(owner=entity)
+            .select_related('owner', 'account_type', 'branch', 'status')
+            .order_by('created_at')
+        )
+        account_ids = [account.pk for account in accounts]
+        loans, investments, transactions = [], [], []
+        if account_ids:
+            loans = list(Loan.objects.filter(to_account__in=account_ids, fully_paid=False).order_by('disbursement_date'))
+            investments = list(
+                Investment.objects.filter(Q(from_account__in=account_ids) | Q(to_account__in=account_ids))
+                .order_by('-created_at')
+            )
+            transactions = list(
+                Transaction.objects.filter(Q(sender_account__in=account_ids) | Q(recipient_account__in=account_ids))
+                .order_by('-created_at')[:limit]
+            )
+        unread = Notification.objects.filter(recipient=entity).exclude(
+            status__status_name__in=['Read', 'Acknowledged']
+        ).count()
+
+        data = {
+            'customer': BaseEntityDetailSerializer(entity).data,
+            'accounts': AccountSummarySerializer(accounts, many=True).data,
+            'total_balance': sum(account.current_balance for account in accounts),
+            'active_loans': LoanSerializer(loans, many=True).data,
+            'outstanding_loan_amount': sum(loan.current_loan_amount for loan in loans),
+            'investments': InvestmentSerializer(investments, many=True).data,
+            'recent_transactions': TransactionSerializer(transactions, many=True).data,
+            'unread_notifications': unread,
+        }
+        cache.set(key, data, self.overview_cache_timeout)
         return Response(data)
 
 class BranchViewSet(BaseViewSet):
@@ -376,59 +350,9 @@ class BranchViewSet(BaseViewSet):
 
     queryset = Branch.objects.select_related('manager').all()
     serializer_class = BranchSerializer
+    read_serializer_class = BranchDetailSerializer
     permission_classes = [IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Branch instance and include full details of the 'manager' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'manager'.
-        """
-
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # Extract manager object if it exists
-        if instance.manager:
-            data['manager'] = EmployeeSerializer(instance.manager).data
-        else:
-            data['manager'] = None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Branch instances and include full details of the 'manager' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'manager' for each item.
-        """
-
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace manager with full object
-        for item, instance in zip(data, queryset):
-            if instance.manager:
-                item['manager'] = EmployeeSerializer(instance.manager).data
-            else:
-                item['manager'] = None
-
-        return Response(data)
-
 class EmployeeViewSet(BaseViewSet):
     """
     A viewset for viewing and editing Employee instances.
@@ -441,59 +365,10 @@ class EmployeeViewSet(BaseViewSet):
     """
     queryset = Employee.objects.select_related('branch', 'entity_type', 'role', 'department').all()
     serializer_class = EmployeeSerializer
+    read_serializer_class = EmployeeDetailSerializer
     permission_classes = [IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Employee instance and include full details of the 'branch', 'entity_type', 'role', and 'department' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'branch', 'entity_type', 'role', and 'department'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-        data['entity_type'] = EntityTypeSerializer(instance.entity_type).data if instance.entity_type else None
-        data['role'] = RoleSerializer(instance.role).data if instance.role else None
-        data['department'] = DepartmentSerializer(instance.department).data if instance.department else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Employee instances and include full details of the 'branch', 'entity_type', 'role', and 'department' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'branch', 'entity_type', 'role', and 'department' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace branch, entity_type, role and department with full objects
-        for item, instance in zip(data, queryset):
-            item['role'] = RoleSerializer(instance.role).data if instance.role else None
-            item['department'] = DepartmentSerializer(instance.department).data if instance.department else None
-            item['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-            item['entity_type'] = EntityTypeSerializer(instance.entity_type).data if instance.entity_type else None
-
-
-        return Response(data)
-
-class RoleViewSet(BaseViewSet):
+class RoleViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing Role instances.
 
@@ -520,51 +395,9 @@ class DocumentViewSet(BaseViewSet):
     """
     queryset = Document.objects.select_related('owner').all()
     serializer_class = DocumentSerializer
+    read_serializer_class = DocumentDetailSerializer
     permission_classes = [IsAuthenticated]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Document instance and include full details of the 'owner' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'owner'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['owner'] = BaseEntitySerializer(instance.owner).data if instance.owner else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Document instances and include full details of the 'owner' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'owner' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace owner with full object
-        for item, instance in zip(data, queryset):
-            item['owner'] = BaseEntitySerializer(instance.owner).data if instance.owner else None
-
-        return Response(data)
-
 
 class NotificationViewSet(BaseViewSet):
     """
@@ -578,49 +411,5 @@ class NotificationViewSet(BaseViewSet):
     """
     queryset = Notification.objects.select_related('recipient', 'status').all()
     serializer_class = NotificationSerializer
+    read_serializer_class = NotificationDetailSerializer
     permission_classes = [IsAuthenticated]
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Notification instance and include full details of the 'recipient' and 'status' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'recipient' and 'status'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        # The related objects are already fetched with select_related, so serializing them
-        data['recipient'] = BaseEntitySerializer(instance.recipient).data if instance.recipient else None
-        data['status'] = StatusSerializer(instance.status).data if instance.status else None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Notification instances and include full details of the 'recipient' and 'status' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'recipient' and 'status' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Iterate through each item to replace recipient and status with full objects
-        for item, instance in zip(data, queryset):
-            item['recipient'] = BaseEntitySerializer(instance.recipient).data if instance.recipient else None
-            item['status'] = StatusSerializer(instance.status).data if instance.status else None
-
-        return Response(data)
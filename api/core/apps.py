@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+
+        from .cache import connect_reference_data_signals
+        from .metrics import install_instrumentation
+        from .portfolio import connect_portfolio_signals
+        from .projections import connect_projection_signals
+        from .slow_queries import connect_slow_query_log
+        connect_reference_data_signals()
+        connect_portfolio_signals()
+        connect_projection_signals()
+        if settings.METRICS_ENABLED:
+            install_instrumentation()
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            connect_slow_query_log()
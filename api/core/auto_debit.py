@@ -0,0 +1,154 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .interest import lookup
+from .models import (
+    Account, CollectionRun, Loan, LoanInstallment, LoanPayment, Status, Transaction, TransactionDirection,
+    TransactionType,
+)
+from .repayments import load_schedules, paid_to_date, record_payments, to_cents
+from .schedules import portfolio_chunks, regenerate_chunk
+
+logger = logging.getLogger(__name__)
+
+# Loans collected per Celery task (and per database transaction).
+COLLECTION_CHUNK_SIZE = 500
+
+# Loans whose account cannot cover what is due are tried again this many times,
+# this many seconds apart, before being left for the next installment date.
+COLLECTION_RETRIES = 3
+COLLECTION_RETRY_DELAY = 4 * 60 * 60
+
+
+def collection_reference(run_date, loan_id):
+    """
+    The reference of the payment collected from one loan on one run date.
+    """
+    return f'collection:{run_date.isoformat()}:{loan_id}'
+
+
+def plan_collection(run_date):
+    """
+    Start the collection run for `run_date` and split the loans with an installment
+    due that day into chunks of loan ids.
+
+    Open loans that have no schedule yet get one first, so that their installments are
+    in the due-date table.
+    """
+    for ids in portfolio_chunks(Loan.objects.filter(fully_paid=False, closed_at__isnull=True, schedule__isnull=True)):
+        regenerate_chunk(ids)
+    loan_ids = list(
+        LoanInstallment.objects.filter(due_date=run_date, loan__fully_paid=False, loan__closed_at__isnull=True)
+        .order_by('loan_id').values_list('loan_id', flat=True).distinct()
+    )
+    CollectionRun.objects.update_or_create(run_date=run_date, defaults={'loans_due': len(loan_ids)})
+    return [
+        [str(loan_id) for loan_id in loan_ids[start:start + COLLECTION_CHUNK_SIZE]]
+        for start in range(0, len(loan_ids), COLLECTION_CHUNK_SIZE)
+    ]
+
+
+@db_transaction.atomic
+def collect_chunk(run_date, loan_ids, final=False):
+    """
+    Debit what is due on a chunk of loans from the borrowers' accounts into the bank's.
+
+    Everything due up to `run_date` and not yet paid is collected, so arrears left by
+    earlier runs are picked up too. A loan is only debited when its account covers the
+    full amount. The borrowers' accounts are locked in id order; the bank's account is
+    credited last with a single relative update, so parallel chunks only contend for it
+    briefly.
+
+    Args:
+        run_date: The date of the collection run.
+        loan_ids: The loans to collect from.
+        final: Whether this is the last attempt; loans still short are counted as abandoned.
+
+    Returns:
+        list: Ids of the loans whose account could not cover what is due.
+    """
+    started = time.perf_counter()
+    bank = Account.objects.only('pk').get(account_number=settings.BANK_ACCOUNT_NUMBER)
+    loans = dict(
+        Loan.objects.filter(pk__in=loan_ids, fully_paid=False, closed_at__isnull=True, to_account__isnull=False)
+        .exclude(to_account=bank).values_list('pk', 'to_account_id')
+    )
+    accounts = {
+        account.pk: account
+        for account in Account.objects.select_for_update().filter(pk__in=set(loans.values())).order_by('pk')
+    }
+    schedules = load_schedules(list(loans))
+    paid = paid_to_date(list(loans))
+    as_of = np.datetime64(run_date, 'D').astype(np.int64)
+
+    completed = lookup(Status, status_name='Completed')
+    transfer = lookup(TransactionType, type_name='Transfer')
+    internal = lookup(TransactionDirection, direction='Internal')
+    debited, transactions, payments, short = {}, [], [], []
+    now = timezone.now()
+    for loan_id, account_id in loans.items():
+        records, account = schedules.get(loan_id), accounts.get(account_id)
+        if records is None or account is None:
+            continue
+        owed = int(records['payment'][records['due_date'] <= as_of].sum()) - int(to_cents(paid.get(loan_id) or 0))
+        if owed <= 0:
+            continue
+        amount = owed / 100
+        if account.current_balance < amount:
+            short.append(str(loan_id))
+            continue
+        account.current_balance -= amount
+        account.updated_at = now
+        debited[account.pk] = account
+        reference = collection_reference(run_date, loan_id)
+        transaction = Transaction(
+            sender_account=account, recipient_account_id=bank.pk, transaction_type=transfer,
+            transaction_amount=amount, sender_account_balance=account.current_balance, status=completed,
+            branch_id=account.branch_id, transaction_direction=internal, external_reference=reference,
+            description=f'Loan installment collected on {run_date.isoformat()}',
+        )
+        transactions.append(transaction)
+        payments.append(LoanPayment(
+            loan_id=loan_id, payment_amount=amount, transaction=transaction, paid_by_id=account.owner_id,
+            status=completed, reference=reference,
+        ))
+
+    total = round(sum(payment.payment_amount for payment in payments), 2)
+    if payments:
+        Account.objects.bulk_update(debited.values(), ['current_balance', 'updated_at'], batch_size=1000)
+        Transaction.objects.bulk_create(transactions, batch_size=1000)
+        record_payments(payments, schedules=schedules)
+        Account.objects.filter(pk=bank.pk).update(current_balance=F('current_balance') + total, updated_at=now)
+
+    elapsed = time.perf_counter() - started
+    CollectionRun.objects.filter(run_date=run_date).update(
+        collected=F('collected') + len(payments),
+        amount_collected=F('amount_collected') + total,
+        insufficient_funds=F('insufficient_funds') + len(short),
+        abandoned=F('abandoned') + (len(short) if final else 0),
+        processing_seconds=F('processing_seconds') + elapsed,
+        updated_at=now,
+    )
+    logger.info(
+        'Collected %d of %d installments (%.2f) for %s in %.3fs (%.0f/s), %d short of funds',
+        len(payments), len(loan_ids), total, run_date, elapsed, len(payments) / elapsed if elapsed else 0, len(short),
+    )
+    return short
+
+
+def run_collection(run_date):
+    """
+    Collect the installments due on `run_date` in this process, without Celery or retries.
+
+    Returns:
+        CollectionRun: The run, with its totals.
+    """
+    for loan_ids in plan_collection(run_date):
+        collect_chunk(run_date, loan_ids, final=True)
+    return CollectionRun.objects.get(run_date=run_date)
@@ -0,0 +1,85 @@
+import hashlib
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from accounts.models import EntityType, Role
+from .models import (
+    AccountType, AssetType, CapitalType, ExpenseType, IncomeType, InterestRateType,
+    InvestmentType, LiabilityType, LoanType, Status, TransactionDirection, TransactionType,
+)
+
+# Reference tables change almost never; cached responses live for a day and are
+# invalidated by bumping the table's version whenever one of its rows is written.
+REFERENCE_DATA_TIMEOUT = 60 * 60 * 24
+
+REFERENCE_DATA_MODELS = [
+    Status, TransactionType, TransactionDirection, LoanType, InterestRateType,
+    AccountType, AssetType, CapitalType, LiabilityType, IncomeType, ExpenseType,
+    InvestmentType, EntityType, Role,
+]
+
+
+def version_key(model):
+    return f'reference-data:version:{model._meta.label_lower}'
+
+
+def get_table_versions(models):
+    """
+    Return the current version of each model's table, in one cache round trip.
+
+    Versions start from the current time rather than 1 so that an evicted version key
+    can never be re-created with a value that still has cached responses under it.
+    """
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = time.time_ns()
+        for key in missing:
+            cache.add(key, initial, None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_table_version(model, using=None):
+    """
+    Invalidate every cached response built from `model`'s table.
+
+    The version is bumped again once the current transaction commits, as a request that
+    read the old rows in between may have cached them under the version bumped now.
+    """
+    key = version_key(model)
+    incr_version(key)
+    transaction.on_commit(partial(incr_version, key), using=using)
+
+
+def reference_cache_key(models, *parts):
+    """
+    Build a cache key that changes whenever one of `models` is written to.
+    """
+    labels = [model._meta.label_lower for model in models]
+    versions = get_table_versions(models)
+    digest = hashlib.md5(f'{labels}|{versions}|{parts}'.encode(), usedforsecurity=False).hexdigest()
+    return f'reference-data:{digest}'
+
+
+def invalidate_reference_data(sender, using, **kwargs):
+    bump_table_version(sender, using=using)
+
+
+def connect_reference_data_signals():
+    for model in REFERENCE_DATA_MODELS:
+        uid = f'invalidate_reference_data:{model._meta.label_lower}'
+        post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=uid)
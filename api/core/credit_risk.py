@@ -0,0 +1,186 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import billiard
+import numpy as np
+from django.utils import timezone
+
+from accounts.models import Branch
+from .models import Loan
+
+# Assumptions for loans without a loan type; loan types carry their own.
+DEFAULT_PROBABILITY = 0.02
+RECOVERY_RATE = 0.4
+
+# Correlation of each borrower with the single economic factor shared by all of them
+# (a one-factor Gaussian copula); it is what makes defaults cluster in bad scenarios.
+ASSET_CORRELATION = 0.12
+
+# Losses are simulated over this horizon, or a loan's remaining term if shorter.
+HORIZON_YEARS = 1.0
+
+# Scenarios are drawn in batches with their own seed, so the results depend on the seed
+# only, not on how many workers share the batches.
+SCENARIO_BATCH_SIZE = 1000
+
+# Random draws held in memory at once by a worker (loans times scenarios).
+DRAWS_PER_BLOCK = 4_000_000
+
+CONFIDENCE_LEVELS = (0.95, 0.99, 0.999)
+
+NO_BRANCH = -1
+
+
+def load_book(as_of, stress=1.0):
+    """
+    Load the open loan book as arrays, sorted by branch.
+
+    Each loan's default probability is its type's annual probability, scaled by
+    `stress` and taken over the horizon or its remaining term if shorter. Its loss if it
+    defaults is its outstanding amount plus the interest of half that period (defaults
+    happen on average half way through), less its type's recovery rate.
+
+    Returns:
+        tuple: (branch ids, start index of each branch's loans, default thresholds on the
+        standard normal scale, loss given default, exposure) arrays.
+    """
+    rows = list(
+        Loan.objects.filter(fully_paid=False, closed_at__isnull=True, current_loan_amount__gt=0).order_by('pk').values_list(
+            'to_account__branch_id', 'current_loan_amount', 'interest_rate', 'disbursement_date',
+            'loan_term__term_duration', 'loan_type__default_probability', 'loan_type__recovery_rate',
+        )
+    )
+    count = len(rows)
+    columns = list(zip(*rows)) or [()] * 7
+    branch = np.array([NO_BRANCH if value is None else value for value in columns[0]], dtype=np.int64)
+    outstanding = np.array(columns[1], dtype=np.float64)
+    rate = np.array(columns[2], dtype=np.float64)
+    disbursed = np.array(columns[3], dtype='datetime64[D]').reshape(count)
+    term = np.array([np.nan if value is None else value for value in columns[4]], dtype=np.float64)
+    probability = np.array([DEFAULT_PROBABILITY if value is None else value for value in columns[5]], dtype=np.float64)
+    recovery = np.array([RECOVERY_RATE if value is None else value for value in columns[6]], dtype=np.float64)
+
+    # Remaining term in years; loans past their term, or without one, run the full horizon
+    months = disbursed.astype('datetime64[M]') + np.nan_to_num(term).astype(np.int64)
+    day = disbursed - disbursed.astype('datetime64[M]').astype('datetime64[D]')
+    month_lengths = (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    matures = months.astype('datetime64[D]') + np.minimum(day, month_lengths - 1)
+    remaining = (matures - np.datetime64(as_of, 'D')).astype(np.float64) / 365.25
+    horizon = np.where(np.isnan(term) | (remaining <= 0), HORIZON_YEARS, np.minimum(remaining, HORIZON_YEARS))
+
+    annual = np.clip(probability * stress, 0, 1)
+    period_probability = np.clip(1 - (1 - annual) ** horizon, 1e-12, 1 - 1e-12)
+    unique, inverse = np.unique(period_probability, return_inverse=True)
+    thresholds = np.array([NormalDist().inv_cdf(value) for value in unique.tolist()])[inverse]
+    exposure = outstanding * (1 + rate / 100 * horizon / 2)
+    loss = exposure * (1 - np.clip(recovery, 0, 1))
+
+    order = np.argsort(branch, kind='stable')
+    branch_ids, starts = np.unique(branch[order], return_index=True)
+    return branch_ids, starts, thresholds[order], loss[order], exposure[order]
+
+
+def simulate_batch(seed, scenarios, thresholds, loss, starts, correlation):
+    """
+    Simulate `scenarios` draws of the book's losses per branch.
+
+    In each scenario a loan defaults when its latent variable, mixing the economy-wide
+    factor with its own shock, falls below its default threshold. Runs in worker
+    processes, so it only takes and returns arrays.
+
+    Returns:
+        ndarray: Losses of shape (scenarios, branches).
+    """
+    rng = np.random.default_rng(seed)
+    losses = np.zeros((scenarios, len(starts)))
+    if len(loss) == 0:
+        return losses
+    step = max(1, DRAWS_PER_BLOCK // len(loss))
+    for first in range(0, scenarios, step):
+        count = min(step, scenarios - first)
+        factor = rng.standard_normal((count, 1))
+        latent = math.sqrt(correlation) * factor + math.sqrt(1 - correlation) * rng.standard_normal((count, len(loss)))
+        losses[first:first + count] = np.add.reduceat(np.where(latent < thresholds, loss, 0.0), starts, axis=1)
+    return losses
+
+
+def distribution(losses, exposure):
+    """
+    Summarize simulated losses: expected loss, value at risk and expected shortfall at
+    each of `CONFIDENCE_LEVELS`, and the worst scenario.
+    """
+    summary = {
+        'exposure': round(float(exposure), 2),
+        'expected_loss': round(float(losses.mean()), 2),
+        'worst_loss': round(float(losses.max()), 2) if len(losses) else 0.0,
+    }
+    for level in CONFIDENCE_LEVELS:
+        var = float(np.quantile(losses, level)) if len(losses) else 0.0
+        tail = losses[losses >= var]
+        label = f'{level * 100:g}'.replace('.', '_')
+        summary[f'var_{label}'] = round(var, 2)
+        summary[f'expected_shortfall_{label}'] = round(float(tail.mean()) if len(tail) else var, 2)
+    return summary
+
+
+def is_daemon_process():
+    """
+    Return True if this process is daemonic, such as a Celery prefork worker, and so
+    cannot start child processes.
+    """
+    return multiprocessing.current_process().daemon or billiard.current_process().daemon
+
+
+def simulate_credit_losses(scenarios=10000, seed=0, workers=None, correlation=ASSET_CORRELATION, stress=1.0, as_of=None):
+    """
+    Run a Monte Carlo simulation of credit losses on the open loan book.
+
+    Scenarios are split into batches of `SCENARIO_BATCH_SIZE`, each seeded from `seed`,
+    and simulated by a pool of `workers` processes (default: one per CPU; 1 runs them
+    in this process, as do daemonic processes, which cannot start a pool). The same
+    seed always gives the same results.
+
+    Args:
+        scenarios: Number of scenarios.
+        seed: Seed of the random number generator.
+        workers: Number of worker processes.
+        correlation: Asset correlation with the common factor, from 0 to 1.
+        stress: Multiplier applied to every default probability.
+        as_of: Date the book's remaining terms are measured from (default: today).
+
+    Returns:
+        dict: The parameters, the loss distribution of the whole book and one per branch.
+    """
+    as_of = as_of or timezone.localdate()
+    branch_ids, starts, thresholds, loss, exposure = load_book(as_of, stress)
+    sizes = [min(SCENARIO_BATCH_SIZE, scenarios - first) for first in range(0, scenarios, SCENARIO_BATCH_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(batch_seed, size, thresholds, loss, starts, correlation) for batch_seed, size in zip(seeds, sizes)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(arguments) == 1 or is_daemon_process():
+        batches = [simulate_batch(*batch) for batch in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(arguments))) as pool:
+            batches = list(pool.map(simulate_batch, *zip(*arguments)))
+    losses = np.concatenate(batches) if batches else np.zeros((0, len(starts)))
+
+    exposures = np.add.reduceat(exposure, starts) if len(exposure) else np.zeros(0)
+    names = dict(Branch.objects.filter(pk__in=branch_ids.tolist()).values_list('pk', 'name'))
+    return {
+        'as_of': as_of.isoformat(),
+        'scenarios': scenarios,
+        'seed': seed,
+        'correlation': correlation,
+        'stress': stress,
+        'loans': len(loss),
+        'portfolio': distribution(losses.sum(axis=1), exposure.sum()),
+        'branches': [
+            {'branch': None if branch == NO_BRANCH else branch, 'branch_name': names.get(branch),
+             **distribution(losses[:, index], exposures[index])}
+            for index, branch in enumerate(branch_ids.tolist())
+        ],
+    }
@@ -0,0 +1,235 @@
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .interest import lookup
+from .models import (
+    Account, Loan, LoanDelinquency, LoanInstallment, LoanPayment, Status, Transaction, TransactionDirection,
+    TransactionType,
+)
+from .repayments import PAID_OFF_THRESHOLD, paid_to_date
+
+logger = logging.getLogger(__name__)
+
+# Loans assessed per Celery task (and per database transaction).
+DELINQUENCY_CHUNK_SIZE = 5000
+
+# A loan is in the bucket of the oldest installment it has not fully paid, by days past due.
+CURRENT = 'current'
+DELINQUENCY_BUCKETS = (CURRENT, '1-29', '30-59', '60-89', '90+')
+BUCKET_THRESHOLDS = (1, 30, 60, 90)
+
+NO_DATE = np.iinfo(np.int64).max
+
+
+def plan_assessment(run_date):
+    """
+    Split the open loans behind on their schedule on `run_date` into chunks of ids.
+
+    Everything due before `run_date` is compared with everything paid in one grouped
+    query, so only delinquent loans are loaded.
+    """
+    paid = (
+        LoanPayment.objects.filter(loan=OuterRef('loan')).values('loan')
+        .annotate(total=Sum(F('interest_paid') + F('principal_paid'))).values('total')
+    )
+    loan_ids = list(
+        LoanInstallment.objects.filter(due_date__lt=run_date, loan__fully_paid=False, loan__closed_at__isnull=True)
+        .values('loan')
+        .annotate(due=Sum('amount'), paid=Coalesce(Subquery(paid, output_field=FloatField()), Value(0.0)))
+        .filter(due__gt=F('paid') + PAID_OFF_THRESHOLD)
+        .order_by('loan').values_list('loan', flat=True)
+    )
+    return [
+        [str(loan_id) for loan_id in loan_ids[start:start + DELINQUENCY_CHUNK_SIZE]]
+        for start in range(0, len(loan_ids), DELINQUENCY_CHUNK_SIZE)
+    ]
+
+
+def classify(run_date, loans, due_dates, amounts, paid, charged_through):
+    """
+    Work out the arrears of a chunk of loans from their installments, all at once.
+
+    Args:
+        run_date: Installments due before this date are overdue.
+        loans: Array of loan ids, one per installment, grouped by loan in period order.
+        due_dates: Array of due dates as days since 1970-01-01.
+        amounts: Array of installment amounts.
+        paid: Array of the amount paid on each loan, in the order the loans appear.
+        charged_through: Array of the last due date each loan was charged a fee for (-NO_DATE if never).
+
+    Returns:
+        dict: Arrays, one entry per loan: `loan`, `overdue` (amount), `installments`,
+        `oldest` (due date), `days`, `bucket`, `newly_late` (installments not charged
+        a fee yet) and `latest` (due date of the newest unpaid installment).
+    """
+    starts = np.flatnonzero(np.r_[True, loans[1:] != loans[:-1]])
+    counts = np.diff(np.r_[starts, len(loans)])
+    totals = np.cumsum(amounts)
+    due_so_far = totals - np.repeat(totals[starts] - amounts[starts], counts)
+    unpaid = due_so_far > np.repeat(paid, counts) + PAID_OFF_THRESHOLD
+
+    oldest = np.minimum.reduceat(np.where(unpaid, due_dates, NO_DATE), starts)
+    days = np.where(oldest == NO_DATE, 0, np.datetime64(run_date, 'D').astype(np.int64) - oldest)
+    return {
+        'loan': loans[starts],
+        'overdue': np.maximum(np.add.reduceat(amounts, starts) - paid, 0),
+        'installments': np.add.reduceat(unpaid.astype(np.int64), starts),
+        'oldest': oldest,
+        'days': days,
+        'bucket': np.digitize(days, BUCKET_THRESHOLDS),
+        'newly_late': np.add.reduceat((unpaid & (due_dates > np.repeat(charged_through, counts))).astype(np.int64), starts),
+        'latest': np.maximum.reduceat(np.where(unpaid, due_dates, -NO_DATE), starts),
+    }
+
+
+def to_date(days):
+    return None if abs(days) == NO_DATE else np.datetime64(int(days), 'D').item()
+
+
+@db_transaction.atomic
+def assess_chunk(run_date, loan_ids):
+    """
+    Classify a chunk of delinquent loans, charge their late fees and update their rows
+    in the delinquency table.
+
+    Each loan is charged its terms' `late_fee` once for every overdue installment it
+    has not been charged for yet, as one 'Fee' transfer from the borrower's account to
+    the bank's. Accounts are locked in id order and debited with one bulk update; the
+    bank's account is credited last with a single relative update.
+
+    Returns:
+        float: The late fees charged.
+    """
+    rows = list(
+        LoanInstallment.objects.filter(loan_id__in=loan_ids, due_date__lt=run_date)
+        .order_by('loan_id', 'period').values_list('loan_id', 'due_date', 'amount')
+    )
+    if not rows:
+        return 0.0
+    previous = {
+        loan_id: (fees, through)
+        for loan_id, fees, through in LoanDelinquency.objects.filter(loan_id__in=loan_ids)
+        .values_list('loan_id', 'fees_charged', 'fees_charged_through')
+    }
+    paid = paid_to_date(loan_ids)
+    loans = np.array([row[0] for row in rows])
+    order = list(dict.fromkeys(row[0] for row in rows))
+    charged_through = [previous.get(loan_id, (0, None))[1] for loan_id in order]
+    arrears = classify(
+        run_date, loans,
+        np.array([row[1] for row in rows], dtype='datetime64[D]').astype(np.int64),
+        np.array([row[2] for row in rows], dtype=np.float64),
+        np.array([paid.get(loan_id) or 0 for loan_id in order], dtype=np.float64),
+        np.array([-NO_DATE if through is None else np.datetime64(through, 'D').astype(np.int64)
+                  for through in charged_through], dtype=np.int64),
+    )
+
+    terms = {
+        loan_id: (account_id, late_fee or 0)
+        for loan_id, account_id, late_fee in Loan.objects.filter(pk__in=loan_ids)
+        .values_list('pk', 'to_account_id', 'loan_term__late_fee')
+    }
+    fees = {}
+    for loan_id, newly_late in zip(arrears['loan'], arrears['newly_late'].tolist()):
+        account_id, late_fee = terms.get(loan_id, (None, 0))
+        if newly_late and late_fee and account_id:
+            fees[loan_id] = round(newly_late * late_fee, 2)
+
+    total = 0.0
+    if fees:
+        total = charge_fees(run_date, {loan_id: terms[loan_id][0] for loan_id in fees}, fees)
+
+    delinquencies = []
+    for index, loan_id in enumerate(arrears['loan']):
+        fees_before, through_before = previous.get(loan_id, (0, None))
+        latest = to_date(arrears['latest'][index])
+        delinquencies.append(LoanDelinquency(
+            loan_id=loan_id,
+            bucket=DELINQUENCY_BUCKETS[arrears['bucket'][index]],
+            days_past_due=int(arrears['days'][index]),
+            amount_overdue=round(float(arrears['overdue'][index]), 2),
+            installments_overdue=int(arrears['installments'][index]),
+            oldest_due_date=to_date(arrears['oldest'][index]),
+            fees_charged=round(fees_before + fees.get(loan_id, 0), 2),
+            fees_charged_through=max(filter(None, (through_before, latest)), default=None),
+            updated_on=run_date,
+        ))
+    LoanDelinquency.objects.bulk_create(
+        delinquencies, batch_size=1000, update_conflicts=True, unique_fields=['loan'],
+        update_fields=[
+            'bucket', 'days_past_due', 'amount_overdue', 'installments_overdue', 'oldest_due_date',
+            'fees_charged', 'fees_charged_through', 'updated_on',
+        ],
+    )
+    return total
+
+
+def charge_fees(run_date, accounts_by_loan, fees):
+    """
+    Debit `fees` ({loan_id: amount}) from the loans' accounts into the bank's account.
+
+    Returns:
+        float: The total charged.
+    """
+    bank = Account.objects.only('pk').get(account_number=settings.BANK_ACCOUNT_NUMBER)
+    accounts = {
+        account.pk: account
+        for account in Account.objects.select_for_update()
+        .filter(pk__in=set(accounts_by_loan.values())).exclude(pk=bank.pk).order_by('pk')
+    }
+    completed = lookup(Status, status_name='Completed')
+    fee_type = lookup(TransactionType, type_name='Fee')
+    internal = lookup(TransactionDirection, direction='Internal')
+    transactions = []
+    now = timezone.now()
+    for loan_id, amount in fees.items():
+        account = accounts.get(accounts_by_loan[loan_id])
+        if account is None:
+            continue
+        account.current_balance -= amount
+        account.updated_at = now
+        transactions.append(Transaction(
+            sender_account=account, recipient_account_id=bank.pk, transaction_type=fee_type,
+            transaction_amount=amount, sender_account_balance=account.current_balance, status=completed,
+            branch_id=account.branch_id, transaction_direction=internal,
+            external_reference=f'late-fee:{run_date.isoformat()}:{loan_id}',
+            description=f'Late fee for loan {loan_id}',
+        ))
+    total = round(sum(transaction.transaction_amount for transaction in transactions), 2)
+    Account.objects.bulk_update(accounts.values(), ['current_balance', 'updated_at'], batch_size=1000)
+    Transaction.objects.bulk_create(transactions, batch_size=1000)
+    Account.objects.filter(pk=bank.pk).update(current_balance=F('current_balance') + total, updated_at=now)
+    return total
+
+
+def complete_assessment(run_date):
+    """
+    Mark loans that were delinquent but were not assessed on `run_date` (they have
+    caught up, been repaid or closed) as current, in one update.
+
+    Returns:
+        dict: The number of loans in each bucket.
+    """
+    LoanDelinquency.objects.filter(bucket__in=DELINQUENCY_BUCKETS[1:], updated_on__lt=run_date).update(
+        bucket=CURRENT, days_past_due=0, amount_overdue=0, installments_overdue=0, oldest_due_date=None,
+        updated_on=run_date,
+    )
+    counts = dict(LoanDelinquency.objects.values('bucket').annotate(count=Count('pk')).values_list('bucket', 'count'))
+    summary = {bucket: counts.get(bucket, 0) for bucket in DELINQUENCY_BUCKETS}
+    logger.info('Delinquency on %s: %s', run_date, summary)
+    return summary
+
+
+def run_assessment(run_date):
+    """
+    Assess delinquency and charge late fees for `run_date` in this process, without Celery.
+    """
+    for loan_ids in plan_assessment(run_date):
+        assess_chunk(run_date, loan_ids)
+    return complete_assessment(run_date)
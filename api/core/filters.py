@@ -0,0 +1,152 @@
+import datetime
+from collections import namedtuple
+from itertools import product
+
+from django.db.models import ForeignKey, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination
+
+# A query parameter that filters on `columns` with `lookup` ('' for equality). When
+# several columns are given the filter matches any of them, and each needs an index.
+Filter = namedtuple('Filter', ['columns', 'lookup', 'parse'])
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO date or datetime; dates mean midnight in the current time zone.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def model_indexes(model):
+    """
+    Return the column tuples of every index on `model`, including the implicit
+    single-column indexes on foreign keys and `db_index`/`unique` fields.
+    """
+    indexes = [tuple(name.lstrip('-') for name in index.fields) for index in model._meta.indexes]
+    for field in model._meta.concrete_fields:
+        if isinstance(field, ForeignKey) or field.db_index or field.unique:
+            indexes.append((field.name,))
+    return indexes
+
+
+def is_indexed(equality, sort_column, indexes):
+    """
+    Return True if an index can serve the filters and ordering.
+
+    An index qualifies when its leading columns are exactly the equality-filtered
+    columns, in any order, and the next column is the range/ordering column.
+
+    Args:
+        equality: Column-alternative tuples of the equality filters.
+        sort_column: The column that is range-filtered and ordered on, or None.
+        indexes: Column tuples, as returned by `model_indexes`.
+    """
+    for columns in product(*equality):
+        width = len(set(columns))
+        if not any(
+            set(index[:width]) == set(columns)
+            and (sort_column is None or index[width:width + 1] == (sort_column,))
+            for index in indexes
+        ):
+            return False
+    return True
+
+
+class IndexedFilterBackend(BaseFilterBackend):
+    """
+    Filters and orders `list` responses by query parameters, rejecting any combination
+    that no index of the model can serve.
+
+    Viewsets declare:
+
+    - `filter_params`: {param: Filter(columns, lookup, parse)}.
+    - `ordering_fields`: the columns accepted by `?ordering=` (prefix `-` to descend).
+    - `default_ordering`: used when neither `?ordering=` nor a range filter is given;
+      a range filter on its own orders by the filtered column.
+
+    At most one column may be range-filtered, and it must be the ordering column, so
+    every accepted request is a single index range scan in index order. The columns
+    the viewset scopes rows by (see `RowScopingMixin.get_scope_columns`) count as
+    equality filters, as they are part of the query that runs.
+    """
+    ordering_param = 'ordering'
+
+    def parse(self, request, view):
+        """
+        Parse the filters and ordering of a request.
+
+        Returns:
+            tuple: (condition, ordering), with `ordering` a column name, `-` prefixed to descend.
+
+        Raises:
+            ValidationError: If a value is invalid or no index serves the combination.
+        """
+        condition, equality, ranges = Q(), [], set()
+        for param, spec in view.filter_params.items():
+            if param not in request.query_params:
+                continue
+            try:
+                value = spec.parse(request.query_params[param])
+            except (TypeError, ValueError):
+                raise ValidationError({param: 'Invalid value.'})
+            matches = Q()
+            for column in spec.columns:
+                matches |= Q(**{f'{column}{spec.lookup}': value})
+            condition &= matches
+            if spec.lookup:
+                ranges.add(spec.columns[0])
+            elif spec.columns not in equality:
+                equality.append(spec.columns)
+        scope = getattr(view, 'get_scope_columns', None)
+        for columns in scope() if scope else []:
+            if columns not in equality:
+                equality.append(columns)
+
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering is None:
+            ordering = next(iter(ranges)) if len(ranges) == 1 else view.default_ordering
+        sort_column = ordering.lstrip('-')
+        if sort_column not in view.ordering_fields:
+            raise ValidationError({self.ordering_param: f"Must be one of: {', '.join(view.ordering_fields)}."})
+        if ranges - {sort_column}:
+            raise ValidationError({
+                self.ordering_param: 'Range filters are only supported on the ordering column.',
+            })
+        if not is_indexed(equality, sort_column, model_indexes(view.queryset.model)):
+            raise ValidationError({'filters': 'This combination of filters and ordering is not supported.'})
+        return condition, ordering
+
+    def filter_queryset(self, request, queryset, view):
+        if not getattr(view, 'filter_params', None) or getattr(view, 'action', None) != 'list':
+            return queryset
+        condition, ordering = self.parse(request, view)
+        return queryset.filter(condition).order_by(ordering)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        The ordering `IndexedCursorPagination` pages along.
+        """
+        return (self.parse(request, view)[1],)
+
+
+class IndexedCursorPagination(CursorPagination):
+    """
+    Pages `list` responses with a cursor on the ordering column chosen by
+    `IndexedFilterBackend`, so each page is a bounded range scan of the same index
+    instead of an offset into it.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,263 @@
+import datetime
+import math
+
+import numpy as np
+from django.db import transaction as db_transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    Account, InterestAccrualRun, Investment, InvestmentCrediting, Status, Transaction,
+    TransactionDirection, TransactionType,
+)
+
+# Interest is simple daily interest on an actual/365 basis; rates are annual percentages.
+DAY_COUNT_BASIS = 365
+
+# Positions written per Celery task (and per database transaction).
+ACCRUAL_CHUNK_SIZE = 5000
+
+
+def lookup(model, **fields):
+    """
+    Return the lookup row matching `fields`, creating it if the table does not have it yet.
+    """
+    return model.objects.get_or_create(**fields)[0]
+
+
+def accrual_reference(run_date, position_id):
+    """
+    The `external_reference` of the crediting transaction for one position and day.
+
+    It makes each chunk idempotent: a retried chunk skips positions already credited.
+    """
+    return f'interest:{run_date.isoformat()}:{position_id}'
+
+
+def accrue(principal, rate, days):
+    """
+    Return the interest earned by each position, unrounded.
+
+    Args:
+        principal: Array of balances or principals.
+        rate: Array of annual interest rates, in percent.
+        days: Array of days accrued.
+    """
+    return principal * (rate / 100.0) * days / DAY_COUNT_BASIS
+
+
+def compute_accrual(principal, rate, days):
+    """
+    Return the interest earned by each position, rounded to cents (see `accrue`).
+    """
+    return np.round(accrue(principal, rate, days), 2)
+
+
+def whole_cents(carried, amount):
+    """
+    Split what a position has accrued (`carried` from earlier days plus `amount`) into
+    the whole cents to credit and the fraction of a cent to carry forward.
+
+    Returns:
+        tuple: (credit, remainder).
+    """
+    total = carried + amount
+    # The tolerance keeps float error from turning a full cent into 0.99999...
+    credit = math.floor(total * 100 + 1e-6) / 100
+    return credit, max(total - credit, 0.0)
+
+
+def accrual_days(created, accrued_through, since, run_date):
+    """
+    Days each position accrues for, up to `run_date`: from the day it last accrued
+    through, or, if it never has, from the day it was opened but not before `since`.
+    """
+    start = np.where(np.isnat(accrued_through), np.maximum(created, np.datetime64(since, 'D')), accrued_through)
+    return np.clip((np.datetime64(run_date, 'D') - start).astype(np.int64), 0, None)
+
+
+def load_positions(queryset, principal, rate):
+    """
+    Load a queryset of positions as NumPy arrays.
+
+    Returns:
+        tuple: (ids, principal, rate, created, accrued_through) with the dates as
+        datetime64[D]; `accrued_through` is NaT for positions that never accrued.
+    """
+    rows = list(
+        queryset.values_list('pk', principal, rate, 'created_at', 'interest_accrued_through')
+        .order_by('pk').iterator(chunk_size=ACCRUAL_CHUNK_SIZE)
+    )
+    count = len(rows)
+    ids = [row[0] for row in rows]
+    principals = np.fromiter((row[1] or 0 for row in rows), dtype=np.float64, count=count)
+    rates = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=count)
+    created = np.array([row[3].date() for row in rows], dtype='datetime64[D]').reshape(count)
+    accrued_through = np.array([row[4] for row in rows], dtype='datetime64[D]').reshape(count)
+    return ids, principals, rates, created, accrued_through
+
+
+def plan_accrual(run_date):
+    """
+    Compute the day's interest for every active investment and interest-bearing account.
+
+    Investments with a crediting schedule or a maturity date are left to the investment
+    processor (`core.investments`), which credits them on their own dates.
+
+    All positions of a kind are accrued in one vectorized pass, unrounded; the non-zero
+    results are split into chunks for `apply_accrual_chunk`, which credits them in whole
+    cents. Each position accrues from its own `interest_accrued_through`, so days missed
+    by a failed chunk are caught up on the next run; positions that never accrued start
+    from the day they were opened, but not before the first run. Positions that earn
+    nothing are marked accrued without a chunk, so a later balance is not applied to
+    those days. Positions already accrued for `run_date` are left out.
+
+    Returns:
+        tuple: (run, chunks) where each chunk is a dict with `kind`, `ids` and `amounts`.
+    """
+    run, _ = InterestAccrualRun.objects.get_or_create(run_date=run_date)
+    first = InterestAccrualRun.objects.order_by('run_date').values_list('run_date', flat=True).first()
+    since = first - datetime.timedelta(days=1)
+
+    investments = Investment.objects.filter(
+        status__status_name='Active', closed_at__isnull=True, from_account__isnull=False, next_event_date__isnull=True,
+    ).exclude(interest_accrued_through__gte=run_date)
+    accounts = Account.objects.filter(
+        status__status_name='Active', closed_at__isnull=True, account_type__interest_rate__gt=0,
+    ).exclude(interest_accrued_through__gte=run_date)
+    now = timezone.now()
+    investments.filter(Q(principal__lte=0) | Q(interest_rate__lte=0)).update(interest_accrued_through=run_date, updated_at=now)
+    accounts.filter(current_balance__lte=0).update(interest_accrued_through=run_date, updated_at=now)
+
+    sources = {
+        'investment': load_positions(investments, 'principal', 'interest_rate'),
+        'account': load_positions(accounts, 'current_balance', 'account_type__interest_rate'),
+    }
+
+    chunks = []
+    for kind, (ids, principal, rate, created, accrued_through) in sources.items():
+        amounts = accrue(principal, rate, accrual_days(created, accrued_through, since, run_date))
+        accruing = np.flatnonzero(amounts > 0)
+        for start in range(0, len(accruing), ACCRUAL_CHUNK_SIZE):
+            selected = accruing[start:start + ACCRUAL_CHUNK_SIZE]
+            chunks.append({
+                'kind': kind,
+                'ids': [str(ids[index]) for index in selected],
+                'amounts': amounts[selected].tolist(),
+            })
+    return run, chunks
+
+
+def apply_accrual_chunk(run_date, kind, ids, amounts):
+    """
+    Credit one chunk of accruals: lock the positions and their receiving accounts, add
+    each day's accrual to the fraction of a cent the position carries, credit the whole
+    cents with a single bulk balance update and bulk-created crediting transactions
+    (and, for investments, `InvestmentCrediting` rows), and carry the rest forward on
+    the position.
+
+    Returns:
+        float: The interest credited by this chunk.
+    """
+    model = Investment if kind == 'investment' else Account
+    references = {position_id: accrual_reference(run_date, position_id) for position_id in ids}
+    completed = lookup(Status, status_name='Completed')
+    interest_type = lookup(TransactionType, type_name='Interest Crediting')
+    external = lookup(TransactionDirection, direction='External')
+
+    with db_transaction.atomic():
+        credited = set(
+            Transaction.objects.filter(external_reference__in=references.values())
+            .values_list('external_reference', flat=True)
+        )
+        # Positions already accrued for the day are skipped, whether or not they were credited
+        positions = {
+            str(position_id): (carried, account_id)
+            for position_id, carried, account_id in model.objects.select_for_update()
+            .filter(pk__in=ids).exclude(interest_accrued_through__gte=run_date).order_by('pk')
+            .values_list('pk', 'accrued_interest', 'from_account_id' if kind == 'investment' else 'pk')
+        }
+        pending = [
+            (position_id, amount) for position_id, amount in zip(ids, amounts)
+            if position_id in positions and references[position_id] not in credited
+        ]
+        if not pending:
+            return 0.0
+
+        # Lock in primary key order so concurrent chunks cannot deadlock
+        accounts = {
+            str(account.pk): account
+            for account in Account.objects.select_for_update()
+            .filter(pk__in={positions[position_id][1] for position_id, _ in pending}).order_by('pk')
+        }
+        transactions, creditings, accrued = [], [], []
+        now = timezone.now()
+        for position_id, amount in pending:
+            carried, account_id = positions[position_id]
+            account = accounts.get(str(account_id))
+            if account is None:
+                continue
+            credit, remainder = whole_cents(carried, amount)
+            if kind == 'investment':
+                accrued.append(Investment(
+                    pk=position_id, accrued_interest=remainder, interest_accrued_through=run_date, updated_at=now,
+                ))
+            else:
+                account.accrued_interest, account.interest_accrued_through = remainder, run_date
+            # bulk_update and update() skip auto_now, so `updated_at` is set explicitly to
+            # change the validators of the conditional GETs (see `core.mixins.ConditionalGetMixin`)
+            account.updated_at = now
+            if credit <= 0:
+                continue
+            account.current_balance += credit
+            transaction = Transaction(
+                recipient_account=account, transaction_type=interest_type, transaction_amount=credit,
+                recipient_account_balance=account.current_balance, status=completed, branch_id=account.branch_id,
+                transaction_direction=external, external_reference=references[position_id],
+                description=f'Interest for {run_date.isoformat()}',
+            )
+            transactions.append(transaction)
+            if kind == 'investment':
+                creditings.append(InvestmentCrediting(
+                    investment_id=position_id, transaction=transaction, payment_amount=credit,
+                    interest_earned=credit, status=completed, created_at=now,
+                ))
+
+        fields = ['current_balance', 'updated_at']
+        if kind == 'account':
+            fields += ['accrued_interest', 'interest_accrued_through']
+        Account.objects.bulk_update(accounts.values(), fields, batch_size=1000)
+        Transaction.objects.bulk_create(transactions, batch_size=1000)
+        InvestmentCrediting.objects.bulk_create(creditings, batch_size=1000)
+        Investment.objects.bulk_update(
+            accrued, ['accrued_interest', 'interest_accrued_through', 'updated_at'], batch_size=1000,
+        )
+        if creditings:
+            Investment.objects.filter(pk__in=[crediting.investment_id for crediting in creditings]).update(
+                last_credited_on=run_date, updated_at=now,
+            )
+    return round(sum(transaction.transaction_amount for transaction in transactions), 2)
+
+
+def complete_accrual_run(run_date):
+    """
+    Record the totals of a finished run from the transactions it wrote.
+    """
+    totals = Transaction.objects.filter(
+        external_reference__startswith=accrual_reference(run_date, ''),
+    ).aggregate(total=Sum('transaction_amount'), positions=Count('pk'))
+    InterestAccrualRun.objects.filter(run_date=run_date).update(
+        completed_at=timezone.now(),
+        positions=totals['positions'] or 0,
+        total_interest=totals['total'] or 0,
+    )
+
+
+def run_accrual(run_date):
+    """
+    Accrue interest for `run_date` in this process, without Celery.
+    """
+    _, chunks = plan_accrual(run_date)
+    for chunk in chunks:
+        apply_accrual_chunk(run_date, **chunk)
+    complete_accrual_run(run_date)
@@ -0,0 +1,215 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_table_version
+from .interest import compute_accrual, lookup
+from .models import (
+    Account, Investment, InvestmentCrediting, InvestmentProcessingRun, Status, Transaction, TransactionDirection,
+    TransactionType,
+)
+from .schedules import due_dates, payments_per_year
+
+logger = logging.getLogger(__name__)
+
+# Investments processed per Celery task (and per database transaction).
+INVESTMENT_CHUNK_SIZE = 1000
+
+INVESTMENT_FIELDS = (
+    'pk', 'principal', 'interest_rate', 'created_at', 'last_credited_on', 'maturity_date', 'crediting_frequency',
+    'from_account_id', 'to_account_id',
+)
+
+
+def investment_reference(kind, run_date, investment_id):
+    """
+    The `external_reference` of an investment's interest credit or principal return on one run date.
+    """
+    return f'investment-{kind}:{run_date.isoformat()}:{investment_id}'
+
+
+def next_event_date(start, frequency, maturity, after=None):
+    """
+    Return an investment's next crediting or maturity date after `after`, whichever
+    comes first, or None if it has neither.
+
+    Crediting dates follow `crediting_frequency` from `start`, the day the investment
+    was made, the same way loan due dates do (see `core.schedules.due_dates`).
+    """
+    after = after or start
+    events = [maturity] if maturity else []
+    if frequency:
+        per_year = payments_per_year(frequency)
+        dates = due_dates(start, per_year, (after - start).days * per_year // 365 + 2)
+        following = dates[dates > np.datetime64(after, 'D').astype(np.int64)]
+        events.append(np.datetime64(int(following[0]), 'D').item())
+    return min(events, default=None)
+
+
+def plan_processing(run_date):
+    """
+    Start the processing run for `run_date` and split the open investments with a
+    crediting or maturity date on or before it into chunks of ids, through the index on
+    `next_event_date`.
+    """
+    ids = list(
+        Investment.objects.filter(next_event_date__lte=run_date, closed_at__isnull=True)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    run, created = InvestmentProcessingRun.objects.get_or_create(run_date=run_date, defaults={'investments_due': len(ids)})
+    if not created:
+        # A rerun adds whatever is still due to what the earlier attempts processed
+        InvestmentProcessingRun.objects.filter(pk=run.pk).update(
+            investments_due=F('processed') + len(ids), completed_at=None,
+        )
+    return [
+        [str(investment_id) for investment_id in ids[start:start + INVESTMENT_CHUNK_SIZE]]
+        for start in range(0, len(ids), INVESTMENT_CHUNK_SIZE)
+    ]
+
+
+@db_transaction.atomic
+def process_chunk(run_date, investment_ids):
+    """
+    Credit the interest of a chunk of investments and repay the ones that have matured.
+
+    Interest is simple interest (see `core.interest.compute_accrual`) from the last
+    crediting, or the day the investment was made, up to `run_date` or the maturity
+    date, computed for the whole chunk at once. It is credited to the investor's
+    account (`from_account`) with an `InvestmentCrediting` row and its transaction. At
+    maturity the principal goes back from `to_account`, or the bank's account if there
+    is none, and the investment is closed. Everything is written with bulk inserts and
+    updates, accounts are locked in id order, and each investment's next event date
+    moves forward in the same transaction, so a retried chunk skips what it already did.
+
+    Returns:
+        dict: The investments processed, the interest credited, and the investments
+        matured with the principal they returned.
+    """
+    started = time.perf_counter()
+    rows = list(
+        Investment.objects.select_for_update().filter(
+            pk__in=investment_ids, next_event_date__lte=run_date, closed_at__isnull=True,
+        ).order_by('pk').values_list(*INVESTMENT_FIELDS)
+    )
+    if not rows:
+        return {'processed': 0, 'interest': 0.0, 'matured': 0, 'principal': 0.0}
+    ids, principal, rate, created, last_credited, maturity, frequency, investors, holders = zip(*rows)
+    start = [last or made.date() for last, made in zip(last_credited, created)]
+    end = [min(run_date, matures) if matures else run_date for matures in maturity]
+    days = np.clip((np.array(end, dtype='datetime64[D]') - np.array(start, dtype='datetime64[D]')).astype(np.int64), 0, None)
+    interest = compute_accrual(np.array(principal, dtype=np.float64), np.array(rate, dtype=np.float64), days).tolist()
+    matured = [matures is not None and matures <= run_date for matures in maturity]
+
+    bank = Account.objects.only('pk').filter(account_number=settings.BANK_ACCOUNT_NUMBER).first()
+    payers = [holder or (bank.pk if bank else None) for holder in holders]
+    accounts = {
+        account.pk: account
+        for account in Account.objects.select_for_update()
+        .filter(pk__in={*investors, *payers} - {None}).order_by('pk')
+    }
+    completed = lookup(Status, status_name='Completed')
+    crediting = lookup(TransactionType, type_name='Interest Crediting')
+    maturity_type = lookup(TransactionType, type_name='Investment Maturity')
+    external = lookup(TransactionDirection, direction='External')
+    internal = lookup(TransactionDirection, direction='Internal')
+
+    now = timezone.now()
+    transactions, creditings, still_open, closed = [], [], [], []
+    totals = {'processed': 0, 'interest': 0.0, 'matured': 0, 'principal': 0.0}
+    for index, investment_id in enumerate(ids):
+        investor = accounts.get(investors[index])
+        if investor is None:
+            continue
+        if interest[index] > 0:
+            investor.current_balance += interest[index]
+            investor.updated_at = now
+            transaction = Transaction(
+                recipient_account=investor, transaction_type=crediting, transaction_amount=interest[index],
+                recipient_account_balance=investor.current_balance, status=completed, branch_id=investor.branch_id,
+                transaction_direction=external, external_reference=investment_reference('interest', run_date, investment_id),
+                description=f'Interest on investment {investment_id} to {end[index].isoformat()}',
+            )
+            transactions.append(transaction)
+            creditings.append(InvestmentCrediting(
+                investment_id=investment_id, transaction=transaction, payment_amount=interest[index],
+                interest_earned=interest[index], status=completed, created_at=now,
+            ))
+            totals['interest'] += interest[index]
+        totals['processed'] += 1
+
+        payer = accounts.get(payers[index])
+        if not matured[index] or payer is None:
+            # Not due yet, or nowhere to repay it from: try again on the next event
+            still_open.append(Investment(
+                pk=investment_id, last_credited_on=end[index], updated_at=now,
+                next_event_date=next_event_date(created[index].date(), frequency[index], maturity[index], run_date),
+            ))
+            continue
+        if payer is not investor:
+            payer.current_balance -= principal[index]
+            investor.current_balance += principal[index]
+            payer.updated_at = investor.updated_at = now
+            transactions.append(Transaction(
+                sender_account=payer, recipient_account=investor, transaction_type=maturity_type,
+                transaction_amount=principal[index], sender_account_balance=payer.current_balance,
+                recipient_account_balance=investor.current_balance, status=completed, branch_id=investor.branch_id,
+                transaction_direction=internal, external_reference=investment_reference('maturity', run_date, investment_id),
+                description=f'Principal of investment {investment_id} returned at maturity',
+            ))
+        closed.append(Investment(
+            pk=investment_id, last_credited_on=end[index], next_event_date=None, closed_at=now, status=completed,
+            updated_at=now,
+        ))
+        totals['matured'] += 1
+        totals['principal'] += principal[index]
+
+    Account.objects.bulk_update(accounts.values(), ['current_balance', 'updated_at'], batch_size=INVESTMENT_CHUNK_SIZE)
+    Transaction.objects.bulk_create(transactions, batch_size=INVESTMENT_CHUNK_SIZE)
+    InvestmentCrediting.objects.bulk_create(creditings, batch_size=INVESTMENT_CHUNK_SIZE)
+    Investment.objects.bulk_update(
+        still_open, ['last_credited_on', 'next_event_date', 'updated_at'], batch_size=INVESTMENT_CHUNK_SIZE,
+    )
+    Investment.objects.bulk_update(
+        closed, ['last_credited_on', 'next_event_date', 'closed_at', 'status', 'updated_at'], batch_size=INVESTMENT_CHUNK_SIZE,
+    )
+
+    bump_table_version(Investment)  # Invalidates the cash-flow projections
+    totals['interest'], totals['principal'] = round(totals['interest'], 2), round(totals['principal'], 2)
+    InvestmentProcessingRun.objects.filter(run_date=run_date).update(
+        processed=F('processed') + totals['processed'],
+        interest_credited=F('interest_credited') + totals['interest'],
+        matured=F('matured') + totals['matured'],
+        principal_returned=F('principal_returned') + totals['principal'],
+        updated_at=now,
+    )
+    logger.info(
+        'Processed %d investments for %s in %.3fs: %.2f interest credited, %d matured',
+        totals['processed'], run_date, time.perf_counter() - started, totals['interest'], totals['matured'],
+    )
+    return totals
+
+
+def complete_processing_run(run_date):
+    """
+    Mark the processing run for `run_date` as finished.
+
+    Returns:
+        InvestmentProcessingRun: The run, with its totals.
+    """
+    InvestmentProcessingRun.objects.filter(run_date=run_date).update(completed_at=timezone.now())
+    return InvestmentProcessingRun.objects.get(run_date=run_date)
+
+
+def run_processing(run_date):
+    """
+    Process the investments due on `run_date` in this process, without Celery.
+    """
+    for investment_ids in plan_processing(run_date):
+        process_chunk(run_date, investment_ids)
+    return complete_processing_run(run_date)
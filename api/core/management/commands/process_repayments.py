@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.repayments import process_repayment_files
+
+
+class Command(BaseCommand):
+    help = 'Record the loan repayments in one or more repayment files (CSV: loan, amount, reference)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Repayment files to process, e.g. a day\'s files')
+
+    def handle(self, *args, **options):
+        result = process_repayment_files(options['files'])
+        for path, line, error in result['rejected']:
+            self.stderr.write(f'{path}:{line}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Recorded {result['recorded']} payments totalling {result['amount']:.2f}; "
+            f"skipped {result['skipped']} already recorded, rejected {len(result['rejected'])}."
+        ))
@@ -0,0 +1,325 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, suppress
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import signals
+from rest_framework.serializers import BaseSerializer
+
+# Upper bounds of the histogram buckets; an implicit +Inf bucket follows the last one.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Wall time spent handling the request.', DURATION_BUCKETS),
+    'http_request_db_queries': ('Database queries run per request.', QUERY_COUNT_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent in database queries per request.', DURATION_BUCKETS),
+    'http_request_serializer_duration_seconds': ('Time spent serializing response data per request.', DURATION_BUCKETS),
+    'http_request_signal_duration_seconds': ('Time spent in model signal receivers per request.', DURATION_BUCKETS),
+    'http_response_size_bytes': ('Size of the response body.', SIZE_BUCKETS),
+    'signal_receivers_duration_seconds': ('Time spent running the receivers of one model signal.', DURATION_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests handled, by view, action and status code.',
+}
+
+# Each worker writes its own snapshot to the metrics directory at most this often.
+FLUSH_INTERVAL = 5
+
+# Model signals whose receivers are timed, by name.
+TIMED_SIGNALS = {
+    'pre_save': signals.pre_save,
+    'post_save': signals.post_save,
+    'pre_delete': signals.pre_delete,
+    'post_delete': signals.post_delete,
+    'm2m_changed': signals.m2m_changed,
+}
+
+# Timings collected while the current request is being handled.
+request_timings = ContextVar('request_timings', default=None)
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters, shared with other workers through files.
+
+    Every worker periodically writes a snapshot of its own metrics to
+    `<METRICS_DIR>/<pid>.json`; `collect` merges the snapshots of all workers, so any
+    worker can answer a scrape for the whole host. Snapshots of workers that have
+    exited are deleted when found, so restarts do not grow the directory; Prometheus
+    sees the totals dropping as a counter reset, which `rate()` and `increase()` handle.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(dict)
+        self.counters = defaultdict(dict)
+        self.last_flush = 0
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms[name].get(key)
+            if series is None:
+                series = self.histograms[name][key] = [[0] * (len(buckets) + 1), 0, 0]
+            series[0][bisect_left(buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def increment(self, name, labels, amount=1):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.counters[name][key] = self.counters[name].get(key, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': [
+                    [name, dict(key), list(series[0]), series[1], series[2]]
+                    for name, values in self.histograms.items() for key, series in values.items()
+                ],
+                'counters': [
+                    [name, dict(key), value]
+                    for name, values in self.counters.items() for key, value in values.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """
+        Write this worker's snapshot to the metrics directory if it is due.
+        """
+        now = time.monotonic()
+        if not force and now - self.last_flush < FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """
+        Merge the snapshots of every running worker, using live values for this one, and
+        delete those of workers that have exited.
+
+        Returns:
+            dict: The merged snapshot, in the format written by `flush`.
+        """
+        snapshots = [self.snapshot()]
+        directory = settings.METRICS_DIR
+        own_file = f'{os.getpid()}.json'
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                pid = filename.split('.')[0]
+                if filename == own_file or not pid.isdigit():
+                    continue
+                path = os.path.join(directory, filename)
+                if not worker_running(int(pid)):
+                    with suppress(OSError):
+                        os.remove(path)
+                    continue
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+
+        histograms, counters = {}, {}
+        for snapshot in snapshots:
+            for name, labels, buckets, total, count in snapshot['histograms']:
+                key = (name, tuple(sorted(labels.items())))
+                if key in histograms:
+                    merged = histograms[key]
+                    merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                    merged[1] += total
+                    merged[2] += count
+                else:
+                    histograms[key] = [list(buckets), total, count]
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+        return {
+            'histograms': [[name, dict(labels), *series] for (name, labels), series in histograms.items()],
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        }
+
+
+registry = MetricsRegistry()
+
+
+def worker_running(pid):
+    """
+    Return True if a process with `pid` is running on this host.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, under another user
+        return True
+    return True
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, **extra):
+    pairs = sorted({**labels, **extra}.items())
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def render_prometheus(snapshot):
+    """
+    Render a merged snapshot in the Prometheus text exposition format.
+    """
+    lines = []
+    series_by_name = defaultdict(list)
+    for name, labels, buckets, total, count in snapshot['histograms']:
+        series_by_name[name].append((labels, buckets, total, count))
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, buckets, total, count in sorted(series_by_name[name], key=lambda series: sorted(series[0].items())):
+            cumulative = 0
+            for bound, observed in zip((*bounds, '+Inf'), buckets):
+                cumulative += observed
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+    counters_by_name = defaultdict(list)
+    for name, labels, value in snapshot['counters']:
+        counters_by_name[name].append((labels, value))
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in sorted(counters_by_name[name], key=lambda series: sorted(series[0].items())):
+            lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def add_timing(name, seconds):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] += seconds
+
+
+def timed_serializer_data(data_property):
+    """
+    Wrap `BaseSerializer.data` so the time spent building response data is recorded.
+
+    Only the outermost serializer calls `.data`; nested serializers go through
+    `to_representation` directly, so time is never counted twice.
+    """
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return data_property.fget(self)
+        finally:
+            add_timing('serializer', time.perf_counter() - started)
+    return property(data)
+
+
+def timed_send(signal_name, send):
+    def send_and_time(sender, **named):
+        started = time.perf_counter()
+        try:
+            return send(sender, **named)
+        finally:
+            elapsed = time.perf_counter() - started
+            add_timing('signal', elapsed)
+            label = sender._meta.label_lower if hasattr(sender, '_meta') else getattr(sender, '__name__', str(sender))
+            registry.observe('signal_receivers_duration_seconds', {'signal': signal_name, 'sender': label}, elapsed)
+    return send_and_time
+
+
+def install_instrumentation():
+    """
+    Time serializer output and model signal receivers. Called once from `CoreConfig.ready`.
+    """
+    if getattr(BaseSerializer, '_metrics_installed', False):
+        return
+    BaseSerializer.data = timed_serializer_data(BaseSerializer.data)
+    BaseSerializer._metrics_installed = True
+    for name, signal in TIMED_SIGNALS.items():
+        signal.send = timed_send(name, signal.send)
+
+
+class QueryTimer:
+    """
+    `execute_wrapper` that counts queries and adds up the time spent in them.
+    """
+
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db'] += time.perf_counter() - started
+            self.timings['queries'] += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, database queries and time, serializer time, signal receiver
+    time and response size for every request, labelled by view and action.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        timings = defaultdict(float)
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                timer = QueryTimer(timings)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        elapsed = time.perf_counter() - started
+
+        labels = getattr(request, 'metrics_labels', {'view': 'unresolved', 'action': request.method.lower()})
+        registry.increment('http_requests_total', {**labels, 'status': response.status_code})
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('http_request_db_queries', labels, timings['queries'])
+        registry.observe('http_request_db_duration_seconds', labels, timings['db'])
+        registry.observe('http_request_serializer_duration_seconds', labels, timings['serializer'])
+        registry.observe('http_request_signal_duration_seconds', labels, timings['signal'])
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', labels, len(response.content))
+        registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_labels = {
+            'view': view_class.__name__ if view_class else view_func.__name__,
+            'action': actions.get(method, method),
+        }
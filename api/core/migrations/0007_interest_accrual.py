@@ -0,0 +1,29 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestAccrualRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('positions', models.IntegerField(default=0)),
+                ('total_interest', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='accounttype',
+            name='interest_rate',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_interest_accrual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSchedule',
+            fields=[
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='core.loan')),
+                ('annual_rate', models.FloatField()),
+                ('installment', models.FloatField()),
+                ('periods', models.IntegerField()),
+                ('inputs_hash', models.CharField(max_length=32)),
+                ('rows', models.BinaryField()),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='interestratetype',
+            name='index_rate',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='interestratetype',
+            name='is_variable',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_loan_schedules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanpayment',
+            name='reference',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
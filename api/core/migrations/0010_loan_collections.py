@@ -0,0 +1,42 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_loan_payment_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('loans_due', models.IntegerField(default=0)),
+                ('collected', models.IntegerField(default=0)),
+                ('amount_collected', models.FloatField(default=0)),
+                ('insufficient_funds', models.IntegerField(default=0)),
+                ('abandoned', models.IntegerField(default=0)),
+                ('processing_seconds', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LoanInstallment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.IntegerField()),
+                ('due_date', models.DateField()),
+                ('amount', models.FloatField()),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='core.loan')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date', 'loan'], name='core_loanin_due_dat_554d8a_idx')],
+            },
+        ),
+    ]
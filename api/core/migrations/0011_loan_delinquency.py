@@ -0,0 +1,31 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_loan_collections'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanDelinquency',
+            fields=[
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='delinquency', serialize=False, to='core.loan')),
+                ('bucket', models.CharField(max_length=10)),
+                ('days_past_due', models.IntegerField(default=0)),
+                ('amount_overdue', models.FloatField(default=0)),
+                ('installments_overdue', models.IntegerField(default=0)),
+                ('oldest_due_date', models.DateField(blank=True, null=True)),
+                ('fees_charged', models.FloatField(default=0)),
+                ('fees_charged_through', models.DateField(blank=True, null=True)),
+                ('updated_on', models.DateField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'days_past_due'], name='core_loande_bucket_3e4b87_idx'), models.Index(fields=['bucket', 'updated_on'], name='core_loande_bucket_ddf59c_idx')],
+            },
+        ),
+    ]
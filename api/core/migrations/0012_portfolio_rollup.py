@@ -0,0 +1,30 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_revokedtoken'),
+        ('core', '0011_loan_delinquency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=120, unique=True)),
+                ('loan_count', models.IntegerField(default=0)),
+                ('exposure', models.FloatField(default=0)),
+                ('outstanding_principal', models.FloatField(default=0)),
+                ('rate_weight', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='accounts.branch')),
+                ('interest_rate_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.interestratetype')),
+                ('loan_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.loantype')),
+            ],
+        ),
+    ]
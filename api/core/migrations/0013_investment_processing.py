@@ -0,0 +1,48 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_portfolio_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvestmentProcessingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('investments_due', models.IntegerField(default=0)),
+                ('processed', models.IntegerField(default=0)),
+                ('interest_credited', models.FloatField(default=0)),
+                ('matured', models.IntegerField(default=0)),
+                ('principal_returned', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='crediting_frequency',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='last_credited_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='maturity_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='next_event_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_investment_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loantype',
+            name='default_probability',
+            field=models.FloatField(default=0.02),
+        ),
+        migrations.AddField(
+            model_name='loantype',
+            name='recovery_rate',
+            field=models.FloatField(default=0.4),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_loan_type_credit_risk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='accrued_interest',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='interest_accrued_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='accrued_interest',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='interest_accrued_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
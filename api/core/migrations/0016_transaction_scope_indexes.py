@@ -0,0 +1,37 @@
+# Generated by Django 4.2.15 on 2026-10-19 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_accrued_interest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'sender_account', 'created_at'], name='transaction_branch_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'recipient_account', 'created_at'], name='transaction_branch_recip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'transaction_type', 'created_at'], name='transaction_branch_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'transaction_direction', 'created_at'], name='transaction_branch_dir_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'external_reference', 'created_at'], name='transaction_branch_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['branch', 'transaction_amount'], name='transaction_branch_amount_idx'),
+        ),
+    ]
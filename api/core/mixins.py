@@ -0,0 +1,380 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .cache import REFERENCE_DATA_TIMEOUT, reference_cache_key
+from .models import Account
+from .renderers import ORJSONRenderer, dumps
+
+
+class SparseFieldsetMixin:
+    """
+    Lets clients shape `list` and `retrieve` responses through query parameters.
+
+    `?fields=id,account_name,owner` keeps only the named top-level fields.
+    `?expand=owner,owner.branch` nests the named relations (dotted paths reach
+    into nested objects); every relation that is not expanded is rendered as
+    its primary key. Without either parameter the response is unchanged.
+
+    When a request is shaped, the queryset follows the shape: `select_related`
+    joins only the expanded relations and `only()` loads only the columns that
+    are rendered.
+    """
+    fields_param = 'fields'
+    expand_param = 'expand'
+    shaped_actions = ('list', 'retrieve')
+
+    def get_requested_shape(self):
+        """
+        Parse `?fields=` and `?expand=` from the request.
+
+        Returns:
+            tuple: (fields, expand) where `fields` is a set of names or None and `expand`
+            is a nested dict of relation names, or None if the request is not shaped.
+        """
+        request = getattr(self, 'request', None)
+        if request is None or self.action not in self.shaped_actions:
+            return None
+        params = request.query_params
+        if self.fields_param not in params and self.expand_param not in params:
+            return None
+
+        fields = None
+        if self.fields_param in params:
+            fields = {name.strip() for name in params[self.fields_param].split(',') if name.strip()}
+
+        expand = {}
+        for path in params.get(self.expand_param, '').split(','):
+            node = expand
+            for name in path.strip().split('.'):
+                if name:
+                    node = node.setdefault(name, {})
+        if fields is not None:
+            fields.update(expand)
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Build the serializer and prune or collapse its fields to the requested shape.
+        """
+        serializer = super().get_serializer(*args, **kwargs)
+        shape = self.get_requested_shape()
+        if shape is not None:
+            fields, expand = shape
+            target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            shape_serializer(target, fields, expand)
+        return serializer
+
+    def get_queryset(self):
+        """
+        Restrict joins and loaded columns to what the shaped serializer renders.
+        """
+        queryset = super().get_queryset()
+        if self.get_requested_shape() is None:
+            return queryset
+        paths = queryset_paths(self.get_serializer(), queryset.model)
+        if paths is None:
+            return queryset
+        select, only = paths
+        queryset = queryset.select_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        return queryset.only(*only)
+
+
+class StreamingListMixin:
+    """
+    Streams `list` responses when the client asks for `?stream=true`.
+
+    Rows are read with `queryset.iterator(chunk_size=...)`, serialized one chunk at a
+    time and written out as a JSON array through a `StreamingHttpResponse`, so memory
+    stays flat however many rows the endpoint returns.
+    """
+    stream_param = 'stream'
+    stream_chunk_size = 2000
+
+    def wants_stream(self):
+        """
+        Return True if the request asks for a streamed list.
+        """
+        return self.request.query_params.get(self.stream_param, '').lower() in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        if not self.wants_stream():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(many=True).child
+        return StreamingHttpResponse(
+            self.stream_rows(queryset, serializer),
+            content_type=ORJSONRenderer.media_type,
+        )
+
+    def stream_rows(self, queryset, serializer):
+        """
+        Yield the JSON array for `queryset` chunk by chunk.
+        """
+        yield b'['
+        separator = b''
+        chunk = []
+        for instance in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(dumps(serializer.to_representation(instance)))
+            if len(chunk) == self.stream_chunk_size:
+                yield separator + b','.join(chunk)
+                separator, chunk = b',', []
+        if chunk:
+            yield separator + b','.join(chunk)
+        yield b']'
+
+
+class RowScopingMixin:
+    """
+    Scopes the queryset to the rows the requesting user may see, in SQL.
+
+    Viewsets declare how their rows relate to a user:
+
+    - `owner_fields`: foreign keys to `BaseEntity` that identify the customer, e.g. `('owner',)`.
+    - `account_fields`: foreign keys to `Account`; a customer sees the row if one of them is
+      an account they own. The owned accounts are matched with a subquery on the indexed
+      `owner_id` column, so no account rows are loaded.
+    - `branch_field`: the foreign key to `Branch`, or the path to it through an account
+      (e.g. `'to_account__branch'`), used to limit staff assigned to a branch.
+
+    Superusers and staff without a branch see every row. Viewsets that declare nothing are
+    left unscoped.
+    """
+    owner_fields = ()
+    account_fields = ()
+    branch_field = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not (self.owner_fields or self.account_fields or self.branch_field):
+            return queryset
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        if user.is_superuser:
+            return queryset
+        if user.is_staff:
+            if self.branch_field and user.branch_id:
+                return queryset.filter(**{self.branch_field: user.branch_id})
+            return queryset
+        return queryset.filter(self.get_customer_filter(user))
+
+    def get_scope_columns(self):
+        """
+        Return the columns `get_queryset` filters on for the requesting user, as tuples of
+        alternatives in the form of `core.filters.Filter.columns`, so that index checks
+        cover the query that actually runs.
+        """
+        user = self.request.user
+        if not (self.owner_fields or self.account_fields or self.branch_field) or user.is_anonymous or user.is_superuser:
+            return []
+        if user.is_staff:
+            return [(self.branch_field,)] if self.branch_field and user.branch_id else []
+        return [tuple(self.owner_fields) + tuple(self.account_fields)]
+
+    def get_customer_filter(self, user):
+        """
+        Build the condition matching the rows related to a customer.
+        """
+        condition = Q(pk__in=[])
+        for field in self.owner_fields:
+            condition |= Q(**{field: user.pk})
+        if self.account_fields:
+            owned_accounts = Account.objects.filter(owner_id=user.pk).values('pk')
+            for field in self.account_fields:
+                condition |= Q(**{f'{field}__in': owned_accounts})
+        return condition
+
+
+class ConditionalGetMixin:
+    """
+    Answers `If-None-Match` and `If-Modified-Since` with a 304 before serialization runs.
+
+    Validators come from the model's `updated_at` column: for `retrieve` from the row
+    itself, for `list` from `MAX(updated_at)` and `COUNT(*)` over the filtered queryset,
+    computed in one aggregate query. The count catches deletions that leave the maximum
+    unchanged. The ETag also covers the request path and query string, so differently
+    shaped responses (`?fields=`, `?expand=`) get different tags.
+
+    Changes to related rows that do not touch the model's own `updated_at` are not
+    reflected in the validators. Viewsets whose model has no such column are unaffected.
+    """
+    last_modified_field = 'updated_at'
+
+    def supports_conditional_get(self):
+        """
+        Return True if the viewset's model carries the `last_modified_field` column.
+        """
+        try:
+            self.queryset.model._meta.get_field(self.last_modified_field)
+        except (AttributeError, FieldDoesNotExist):
+            return False
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.supports_conditional_get():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        summary = queryset.order_by().aggregate(
+            last_modified=Max(self.last_modified_field), count=Count('pk'),
+        )
+        return self.conditional_response(
+            request, summary['last_modified'], summary['count'],
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.supports_conditional_get():
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        return self.conditional_response(
+            request, getattr(instance, self.last_modified_field), instance.pk,
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+    def conditional_response(self, request, last_modified, state, render):
+        """
+        Return a 304 if the client's validators still match, else the rendered response.
+
+        Args:
+            request: The HTTP request.
+            last_modified: The datetime the resource last changed, or None.
+            state: Any other value that changes with the resource (a pk, a row count).
+            render: Callable producing the full response.
+
+        Returns:
+            Response: The 304 or full response, carrying `ETag` and `Last-Modified`.
+        """
+        digest = hashlib.md5(
+            f'{self.queryset.model._meta.label}|{request.get_full_path()}|{last_modified}|{state}'.encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        etag = quote_etag(digest)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class ReferenceDataCacheMixin:
+    """
+    Serves `list` and `retrieve` for reference tables from the shared cache.
+
+    Entries are keyed by the table's version and the request's full path; writing to
+    the table bumps the version (see `core.cache`), so stale entries are never read.
+    The validators set by `ConditionalGetMixin` are cached alongside the data, so a
+    matching `If-None-Match` is answered with a 304 without touching the database.
+    """
+    cache_timeout = REFERENCE_DATA_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, view, *args, **kwargs):
+        """
+        Return the cached response for this request, rendering and caching it on a miss.
+        """
+        key = reference_cache_key([self.queryset.model], request.get_full_path())
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                headers = {name: response[name] for name in ('ETag', 'Last-Modified') if name in response}
+                cache.set(key, {'data': response.data, 'headers': headers}, self.cache_timeout)
+            return response
+
+        headers = cached['headers']
+        response = None
+        if headers:
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+            )
+        if response is None:
+            response = Response(cached['data'])
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+
+def shape_serializer(serializer, fields, expand, path=''):
+    """
+    Drop the fields not listed in `fields` and render every nested serializer that is
+    not in `expand` as a primary key.
+
+    Raises:
+        ValidationError: If a requested field or expansion does not exist.
+    """
+    if fields is not None:
+        unknown = fields - set(serializer.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+
+    nested_names = {
+        name for name, field in serializer.fields.items()
+        if isinstance(field, BaseSerializer)
+    }
+    unknown = set(expand) - nested_names
+    if unknown:
+        names = ', '.join(sorted(f'{path}{name}' for name in unknown))
+        raise ValidationError({'expand': f'Cannot expand: {names}'})
+
+    for name, field in list(serializer.fields.items()):
+        if fields is not None and name not in fields:
+            serializer.fields.pop(name)
+        elif name in nested_names:
+            many = isinstance(field, ListSerializer)
+            if name in expand:
+                shape_serializer(field.child if many else field, None, expand[name], f'{path}{name}.')
+            else:
+                kwargs = {} if field.source == name else {'source': field.source}
+                serializer.fields[name] = PrimaryKeyRelatedField(read_only=True, many=many, **kwargs)
+
+
+def queryset_paths(serializer, model, prefix=''):
+    """
+    Collect the `select_related` and `only()` paths needed to render `serializer`.
+
+    Returns:
+        tuple: (select, only) lists of lookups, or None if a field does not map onto a
+        concrete model field and the queryset must be left unrestricted.
+    """
+    select, only = [], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        lookup = f'{prefix}{field.source}'
+        only.append(lookup)
+        if isinstance(field, BaseSerializer):
+            select.append(lookup)
+            nested = queryset_paths(field, model_field.related_model, f'{lookup}__')
+            if nested is None:
+                return None
+            select.extend(nested[0])
+            only.extend(nested[1])
+    return select, only
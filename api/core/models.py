@@ -16,6 +16,8 @@ class Account(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     closed_at = models.DateTimeField(blank=True, null=True)
     current_balance = models.FloatField(default=80)
+    accrued_interest = models.FloatField(default=0)  # Interest earned but not yet credited (under a cent)
+    interest_accrued_through = models.DateField(blank=True, null=True)
     branch = models.ForeignKey('accounts.Branch', on_delete=models.SET_NULL, blank=True, null=True)
     status = models.ForeignKey('Status', on_delete=models.SET_NULL, blank=True, null=True)
     created_by = models.ForeignKey('accounts.BaseEntity', on_delete=models.SET_NULL, blank=True, null=True, related_name='created_accounts')
@@ -55,6 +57,29 @@ class Transaction(models.Model):
     transaction_direction = models.ForeignKey('TransactionDirection', on_delete=models.SET_NULL, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # One index per filter supported by TransactionViewSet, each ending in the
+        # column the results are ordered by (see core.filters.IndexedFilterBackend)
+        indexes = [
+            models.Index(fields=['created_at'], name='transaction_created_idx'),
+            models.Index(fields=['sender_account', 'created_at'], name='transaction_sender_idx'),
+            models.Index(fields=['recipient_account', 'created_at'], name='transaction_recipient_idx'),
+            models.Index(fields=['transaction_type', 'created_at'], name='transaction_type_idx'),
+            models.Index(fields=['transaction_direction', 'created_at'], name='transaction_direction_idx'),
+            models.Index(fields=['status', 'created_at'], name='transaction_status_idx'),
+            models.Index(fields=['branch', 'created_at'], name='transaction_branch_idx'),
+            models.Index(fields=['branch', 'status', 'created_at'], name='transaction_branch_status_idx'),
+            # Staff assigned to a branch are always filtered on it (see core.mixins.RowScopingMixin)
+            models.Index(fields=['branch', 'sender_account', 'created_at'], name='transaction_branch_sender_idx'),
+            models.Index(fields=['branch', 'recipient_account', 'created_at'], name='transaction_branch_recip_idx'),
+            models.Index(fields=['branch', 'transaction_type', 'created_at'], name='transaction_branch_type_idx'),
+            models.Index(fields=['branch', 'transaction_direction', 'created_at'], name='transaction_branch_dir_idx'),
+            models.Index(fields=['branch', 'external_reference', 'created_at'], name='transaction_branch_ref_idx'),
+            models.Index(fields=['branch', 'transaction_amount'], name='transaction_branch_amount_idx'),
+            models.Index(fields=['external_reference', 'created_at'], name='transaction_reference_idx'),
+            models.Index(fields=['transaction_amount'], name='transaction_amount_idx'),
+        ]
+
     def clean(self):
         if self.transaction_direction.direction == 'Internal':
             if not self.sender_account or not self.recipient_account:
@@ -112,6 +137,8 @@ class Loan(models.Model):
 
 class LoanType(models.Model):
     type_name = models.CharField(max_length=40)
+    default_probability = models.FloatField(default=0.02)  # Annual probability of default, as a fraction
+    recovery_rate = models.FloatField(default=0.4)  # Share of the exposure recovered after a default
 
     def __str__(self):
         return self.type_name
@@ -136,6 +163,8 @@ class LoanTerms(models.Model):
 
 class InterestRateType(models.Model):
     type_name = models.CharField(max_length=40)
+    is_variable = models.BooleanField(default=False)
+    index_rate = models.FloatField(default=0)  # Benchmark rate added to a variable loan's own rate
 
     def __str__(self):
         return self.type_name
@@ -152,6 +181,12 @@ class Investment(models.Model):
     principal = models.FloatField()
     status = models.ForeignKey('Status', on_delete=models.SET_NULL, blank=True, null=True)
     transaction = models.ForeignKey('Transaction', on_delete=models.SET_NULL, blank=True, null=True)
+    maturity_date = models.DateField(blank=True, null=True)
+    crediting_frequency = models.CharField(max_length=20, blank=True, null=True)  # E.g., Monthly, Quarterly
+    last_credited_on = models.DateField(blank=True, null=True)
+    next_event_date = models.DateField(blank=True, null=True, db_index=True)  # Next crediting or maturity
+    accrued_interest = models.FloatField(default=0)  # Interest earned but not yet credited (under a cent)
+    interest_accrued_through = models.DateField(blank=True, null=True)
 
     def __str__(self):
         return f'Investment {self.id}'
@@ -167,6 +202,7 @@ class LoanPayment(models.Model):
     loan = models.ForeignKey('Loan', on_delete=models.SET_NULL, blank=True, null=True)
     interest_paid = models.FloatField()
     principal_paid = models.FloatField()
+    reference = models.CharField(max_length=100, blank=True, null=True, unique=True)  # From the repayment file
 
     def __str__(self):
         return f'Loan Payment {self.id}'
@@ -268,6 +304,7 @@ class TransactionDirection(models.Model):
 
 class AccountType(models.Model):
     type_name = models.CharField(max_length=40)
+    interest_rate = models.FloatField(default=0)  # Annual percentage paid on balances
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     updated_by = models.ForeignKey('accounts.BaseEntity', on_delete=models.SET_NULL, blank=True, null=True, related_name='account_type_updates')
@@ -357,3 +394,119 @@ class ExpenseType(models.Model):
     def __str__(self):
         return self.type_name
 
+
+class InterestAccrualRun(models.Model):
+    run_date = models.DateField(unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    positions = models.IntegerField(default=0)
+    total_interest = models.FloatField(default=0)
+
+    def __str__(self):
+        return f'Interest accrual for {self.run_date}'
+
+
+class LoanSchedule(models.Model):
+    loan = models.OneToOneField('Loan', on_delete=models.CASCADE, primary_key=True, related_name='schedule')
+    annual_rate = models.FloatField()
+    installment = models.FloatField()
+    periods = models.IntegerField()
+    inputs_hash = models.CharField(max_length=32)  # Digest of the loan terms the rows were built from
+    rows = models.BinaryField()  # core.schedules.SCHEDULE_DTYPE records, amounts in cents
+    generated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'Schedule for loan {self.loan_id}'
+
+
+class LoanInstallment(models.Model):
+    loan = models.ForeignKey('Loan', on_delete=models.CASCADE, related_name='installments')
+    period = models.IntegerField()
+    due_date = models.DateField()
+    amount = models.FloatField()
+
+    class Meta:
+        indexes = [models.Index(fields=['due_date', 'loan'])]
+
+    def __str__(self):
+        return f'Installment {self.period} of loan {self.loan_id}'
+
+
+class CollectionRun(models.Model):
+    run_date = models.DateField(unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    loans_due = models.IntegerField(default=0)
+    collected = models.IntegerField(default=0)
+    amount_collected = models.FloatField(default=0)
+    insufficient_funds = models.IntegerField(default=0)  # Attempts that found too little money
+    abandoned = models.IntegerField(default=0)  # Loans still unpaid after the last retry
+    processing_seconds = models.FloatField(default=0)  # Summed over chunks
+
+    @property
+    def throughput(self):
+        """
+        Installments collected per second of worker time.
+        """
+        return self.collected / self.processing_seconds if self.processing_seconds else 0
+
+    def __str__(self):
+        return f'Collection run for {self.run_date}'
+
+
+class LoanDelinquency(models.Model):
+    loan = models.OneToOneField('Loan', on_delete=models.CASCADE, primary_key=True, related_name='delinquency')
+    bucket = models.CharField(max_length=10)  # current, 1-29, 30-59, 60-89 or 90+ days past due
+    days_past_due = models.IntegerField(default=0)
+    amount_overdue = models.FloatField(default=0)
+    installments_overdue = models.IntegerField(default=0)
+    oldest_due_date = models.DateField(blank=True, null=True)
+    fees_charged = models.FloatField(default=0)
+    fees_charged_through = models.DateField(blank=True, null=True)  # Due date of the last installment charged a late fee
+    updated_on = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'days_past_due']),
+            models.Index(fields=['bucket', 'updated_on']),
+        ]
+
+    def __str__(self):
+        return f'Loan {self.loan_id}: {self.bucket}'
+
+
+class PortfolioRollup(models.Model):
+    key = models.CharField(max_length=120, unique=True)  # branch:loan_type:interest_rate_type, '-' for none
+    branch = models.ForeignKey('accounts.Branch', on_delete=models.CASCADE, blank=True, null=True)
+    loan_type = models.ForeignKey('LoanType', on_delete=models.CASCADE, blank=True, null=True)
+    interest_rate_type = models.ForeignKey('InterestRateType', on_delete=models.CASCADE, blank=True, null=True)
+    loan_count = models.IntegerField(default=0)  # Open loans
+    exposure = models.FloatField(default=0)  # Amount originated on the open loans
+    outstanding_principal = models.FloatField(default=0)
+    rate_weight = models.FloatField(default=0)  # Sum of outstanding principal times interest rate
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Portfolio rollup {self.key}'
+
+
+class InvestmentProcessingRun(models.Model):
+    run_date = models.DateField(unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    investments_due = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    interest_credited = models.FloatField(default=0)
+    matured = models.IntegerField(default=0)
+    principal_returned = models.FloatField(default=0)
+
+    @property
+    def progress(self):
+        """
+        Share of the investments due that have been processed, from 0 to 1.
+        """
+        return self.processed / self.investments_due if self.investments_due else 1.0
+
+    def __str__(self):
+        return f'Investment processing for {self.run_date}'
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_table_version
+from .interest import lookup
+from .models import (
+    Account, Asset, AssetType, Audit, Loan, Status, Transaction, TransactionDirection, TransactionType,
+)
+from .portfolio import record_originations
+
+# Loans written per query; a batch of any size is still originated in one transaction.
+ORIGINATION_BATCH_SIZE = 1000
+
+# Largest batch accepted by the batch origination endpoint.
+MAX_BATCH_LOANS = 10000
+
+
+@db_transaction.atomic
+def originate_loans(loans, initiated_by=None):
+    """
+    Disburse and record a batch of loans in one database transaction.
+
+    The bank's account (`BANK_ACCOUNT_NUMBER`) must cover the whole batch. Each loan is
+    disbursed from it to its `to_account` with a 'Loan Disbursement' transaction,
+    recorded as an 'Accounts Receivable' asset of the bank's branch and audited, and the
+    portfolio rollup is updated. Every kind of row is written with one bulk insert, so
+    the number of queries does not grow with the batch. The borrowers' accounts are
+    locked in id order and credited with one bulk update; the bank's account is debited
+    after them with a single conditional relative update, in the same lock order as the
+    collection, fee and accrual runs.
+
+    Args:
+        loans: Unsaved `Loan` instances with `to_account_id`, `loan_amount`, `interest_rate`
+            and `disbursement_date` set.
+        initiated_by: The user originating the loans, if any.
+
+    Returns:
+        list: The saved loans.
+
+    Raises:
+        ValidationError: If a loan has no borrower account or is not lent from the
+            bank's account, or the bank's account is missing or cannot cover the batch.
+    """
+    if not loans:
+        return []
+    bank = Account.objects.only('pk', 'branch_id').filter(account_number=settings.BANK_ACCOUNT_NUMBER).first()
+    if bank is None:
+        raise ValidationError("The bank's account does not exist.")
+    errors = {}
+    for index, loan in enumerate(loans):
+        if loan.from_account_id is None:
+            loan.from_account_id = bank.pk
+        if loan.from_account_id != bank.pk:
+            errors[index] = "The 'from_account' must be the bank's account."
+        elif loan.to_account_id is None or loan.to_account_id == bank.pk:
+            errors[index] = "The 'to_account' must be the borrower's account."
+    if errors:
+        raise ValidationError(errors)
+    total = round(sum(loan.loan_amount for loan in loans), 2)
+
+    accounts = {
+        account.pk: account
+        for account in Account.objects.select_for_update().filter(pk__in={loan.to_account_id for loan in loans}).order_by('pk')
+    }
+    # The bank's row is locked last, as the other batch runs do, so they cannot deadlock
+    now = timezone.now()
+    debited = Account.objects.filter(pk=bank.pk, current_balance__gte=total).update(
+        current_balance=F('current_balance') - total, updated_at=now,
+    )
+    if not debited:
+        raise ValidationError("Insufficient funds in the bank account.")
+    bank_balance = Account.objects.filter(pk=bank.pk).values_list('current_balance', flat=True).get() + total
+    completed = lookup(Status, status_name='Completed')
+    active = lookup(Status, status_name='Active')
+    disbursement = lookup(TransactionType, type_name='Loan Disbursement')
+    internal = lookup(TransactionDirection, direction='Internal')
+    receivable = lookup(AssetType, type_name='Accounts Receivable')
+    last_asset = Asset.objects.filter(branch_id=bank.branch_id, asset_type=receivable).order_by('created_at').last()
+    receivables = last_asset.updated_balance if last_asset else 0
+
+    transactions, assets, audits = [], [], []
+    for loan in loans:
+        account = accounts.get(loan.to_account_id)
+        if account is None:
+            raise ValidationError(f'Account {loan.to_account_id} does not exist.')
+        account.current_balance += loan.loan_amount
+        account.updated_at = now
+        bank_balance -= loan.loan_amount
+        receivables += loan.loan_amount
+        loan.current_loan_amount = loan.loan_amount
+        loan.status = loan.status or active
+        loan.transaction = Transaction(
+            sender_account_id=bank.pk, recipient_account=account, transaction_type=disbursement,
+            initiated_by=initiated_by, transaction_amount=loan.loan_amount, recipient_account_balance=account.current_balance,
+            sender_account_balance=bank_balance, status=completed, branch_id=bank.branch_id,
+            transaction_direction=internal,
+            description=f'Loan disbursement of {loan.loan_amount} to {account.account_name}',
+        )
+        transactions.append(loan.transaction)
+        assets.append(Asset(
+            branch_id=bank.branch_id, name=f'Loan Receivable for loan {loan.id}', value=loan.loan_amount,
+            updated_balance=receivables, asset_type=receivable, status=active,
+            description=f'Loan receivable for loan {loan.id}',
+        ))
+        audits.append(Audit(
+            action_initiator=initiated_by, action='Loan originated', table_name='Loan, Transaction, Asset',
+            new_value=f'Loan ID {loan.id}, Amount: {loan.loan_amount}, To Account: {account.account_name}',
+        ))
+
+    Transaction.objects.bulk_create(transactions, batch_size=ORIGINATION_BATCH_SIZE)
+    Loan.objects.bulk_create(loans, batch_size=ORIGINATION_BATCH_SIZE)
+    Asset.objects.bulk_create(assets, batch_size=ORIGINATION_BATCH_SIZE)
+    Audit.objects.bulk_create(audits, batch_size=ORIGINATION_BATCH_SIZE)
+    Account.objects.bulk_update(accounts.values(), ['current_balance', 'updated_at'], batch_size=ORIGINATION_BATCH_SIZE)
+    record_originations([loan.pk for loan in loans])
+    bump_table_version(Loan)  # Invalidates the cash-flow projections
+    return loans
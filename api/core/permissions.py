@@ -1,4 +1,4 @@
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 class IsStaffOrRelated(BasePermission):
     """
@@ -24,12 +24,23 @@ class IsStaffOrRelated(BasePermission):
         if request.user.is_staff:
             return True
 
-        # Otherwise, allow only viewing (GET) and ensure the user is related to the transaction
-        if request.method in ['GET', 'HEAD', 'OPTIONS']:
-            return (
-                ((hasattr(obj, 'sender_account') and obj.sender_account.owner == request.user)) or
-                ((hasattr(obj, 'recipient_account') and obj.recipient_account.owner == request.user)) or
-                ((hasattr(obj, 'owner') and obj.owner == request.user))
-            )
+        # Otherwise, allow only viewing (GET) and ensure the user is related to the object
+        if request.method in SAFE_METHODS:
+            return self.is_related(request.user, view, obj)
         return False
 
+    def is_related(self, user, view, obj):
+        """
+        Return True if the view's row scoping (its `owner_fields` and `account_fields`, see
+        `core.mixins.RowScopingMixin`) shows `obj` to the user, so that every row of a
+        customer's list can also be retrieved.
+
+        Direct foreign keys to the user are compared by id; anything else is checked with
+        one query on the object's primary key, without loading the related objects.
+        """
+        owner_fields = getattr(view, 'owner_fields', ())
+        if any(getattr(obj, f'{field}_id', None) == user.pk for field in owner_fields if '__' not in field):
+            return True
+        if not hasattr(view, 'get_customer_filter'):
+            return False
+        return type(obj)._default_manager.filter(view.get_customer_filter(user), pk=obj.pk).exists()
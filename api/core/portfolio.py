@@ -0,0 +1,181 @@
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import Loan, PortfolioRollup
+
+# The dimensions the portfolio is rolled up by: the loan column each one is read from
+# and the rollup column holding its display name.
+PORTFOLIO_DIMENSIONS = {
+    'branch': ('to_account__branch_id', 'branch__name'),
+    'loan_type': ('loan_type_id', 'loan_type__type_name'),
+    'interest_rate_type': ('loan_term__interest_rate_type_id', 'interest_rate_type__type_name'),
+}
+GROUP_FIELDS = tuple(column for column, _ in PORTFOLIO_DIMENSIONS.values())
+
+# Rollup rows written per query when the table is rebuilt.
+ROLLUP_BATCH_SIZE = 500
+
+
+def rollup_key(group):
+    """
+    The unique key of the rollup row for a (branch, loan type, interest rate type) group.
+    """
+    return ':'.join('-' if value is None else str(value) for value in group)
+
+
+def apply_deltas(deltas):
+    """
+    Add `deltas` to the rollup, creating the rows of groups it does not have yet.
+
+    Args:
+        deltas: {(branch_id, loan_type_id, interest_rate_type_id): [loans, exposure,
+            outstanding principal, rate weight]}.
+
+    Rows are changed with relative updates in key order, so concurrent writers only wait
+    for each other on the groups they share and cannot deadlock.
+    """
+    for key, group in sorted((rollup_key(group), group) for group in deltas):
+        loans, exposure, outstanding, weight = deltas[group]
+        rollup, _ = PortfolioRollup.objects.get_or_create(
+            key=key, defaults={f'{name}_id': value for name, value in zip(PORTFOLIO_DIMENSIONS, group)},
+        )
+        PortfolioRollup.objects.filter(pk=rollup.pk).update(
+            loan_count=F('loan_count') + loans,
+            exposure=F('exposure') + exposure,
+            outstanding_principal=F('outstanding_principal') + outstanding,
+            rate_weight=F('rate_weight') + weight,
+            updated_at=timezone.now(),
+        )
+
+
+def record_originations(loan_ids):
+    """
+    Add newly originated loans to the rollup.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for *group, amount, outstanding, rate in Loan.objects.filter(pk__in=loan_ids).values_list(
+        *GROUP_FIELDS, 'loan_amount', 'current_loan_amount', 'interest_rate',
+    ):
+        outstanding = amount if outstanding is None else outstanding
+        delta = deltas[tuple(group)]
+        delta[0] += 1
+        delta[1] += amount
+        delta[2] += outstanding
+        delta[3] += outstanding * rate
+    apply_deltas(deltas)
+
+
+def roll_up_origination(sender, instance, created, **kwargs):
+    if created:
+        record_originations([instance.pk])
+
+
+def connect_portfolio_signals():
+    post_save.connect(roll_up_origination, sender=Loan, dispatch_uid='roll_up_origination')
+
+
+def record_repayments(principal_by_loan, closed):
+    """
+    Take repaid principal off the rollup, and loans repaid in full out of it.
+
+    Args:
+        principal_by_loan: {loan_id: principal repaid}, at most the loan's outstanding amount.
+        closed: Ids of the loans the repayments closed.
+    """
+    closed = set(closed)
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for loan_id, *group, amount, rate in Loan.objects.filter(pk__in=set(principal_by_loan) | closed).values_list(
+        'pk', *GROUP_FIELDS, 'loan_amount', 'interest_rate',
+    ):
+        delta = deltas[tuple(group)]
+        principal = principal_by_loan.get(loan_id, 0)
+        delta[2] -= principal
+        delta[3] -= principal * rate
+        if loan_id in closed:
+            delta[0] -= 1
+            delta[1] -= amount
+    apply_deltas(deltas)
+
+
+@db_transaction.atomic
+def rebuild_rollups():
+    """
+    Recompute the whole rollup from the open loans with one grouped query.
+
+    The rollup is kept up to date incrementally; rebuilding it picks up loans changed
+    outside origination and repayment (edits, write-offs) and clears rounding drift.
+
+    Returns:
+        int: The number of rollup rows.
+    """
+    now = timezone.now()
+    rollups = [
+        PortfolioRollup(
+            key=rollup_key(group), loan_count=loans, exposure=exposure or 0, outstanding_principal=outstanding or 0,
+            rate_weight=weight or 0, updated_at=now,
+            **{f'{name}_id': value for name, value in zip(PORTFOLIO_DIMENSIONS, group)},
+        )
+        for *group, loans, exposure, outstanding, weight in Loan.objects.filter(
+            fully_paid=False, closed_at__isnull=True,
+        ).values(*GROUP_FIELDS).annotate(
+            loans=Count('pk'), exposure=Sum('loan_amount'), outstanding=Sum('current_loan_amount'),
+            weight=Sum(F('current_loan_amount') * F('interest_rate')),
+        ).order_by().values_list(*GROUP_FIELDS, 'loans', 'exposure', 'outstanding', 'weight')
+    ]
+    PortfolioRollup.objects.all().delete()
+    PortfolioRollup.objects.bulk_create(rollups, batch_size=ROLLUP_BATCH_SIZE)
+    return len(rollups)
+
+
+def summarize(measures):
+    outstanding = measures['outstanding_principal'] or 0
+    return {
+        'loan_count': measures['loan_count'] or 0,
+        'exposure': round(measures['exposure'] or 0, 2),
+        'outstanding_principal': round(outstanding, 2),
+        'weighted_average_rate': round(measures['rate_weight'] / outstanding, 4) if outstanding else None,
+    }
+
+
+def portfolio_summary(group_by=('branch',), filters=None):
+    """
+    Summarize the open loan portfolio from the rollup table.
+
+    Args:
+        group_by: The dimensions (keys of `PORTFOLIO_DIMENSIONS`) to break the portfolio down by.
+        filters: {dimension: id} to drill down into; an id of None selects the loans without one.
+
+    Returns:
+        dict: `totals` and one entry in `groups` per combination of the `group_by`
+        dimensions, each with the loan count, exposure, outstanding principal and
+        outstanding-weighted average interest rate.
+    """
+    condition = Q()
+    for name, value in (filters or {}).items():
+        condition &= Q(**{f'{name}__isnull': True} if value is None else {f'{name}_id': value})
+    rollups = PortfolioRollup.objects.filter(condition).exclude(loan_count=0)
+    measures = {
+        'loan_count': Sum('loan_count'), 'exposure': Sum('exposure'),
+        'outstanding_principal': Sum('outstanding_principal'), 'rate_weight': Sum('rate_weight'),
+    }
+
+    columns = [column for name in group_by for column in (name, PORTFOLIO_DIMENSIONS[name][1])]
+    groups = []
+    for row in rollups.values(*columns).annotate(**measures).order_by(*columns):
+        group = {}
+        for name in group_by:
+            group[name] = row[name]
+            group[f'{name}_name'] = row[PORTFOLIO_DIMENSIONS[name][1]]
+        group.update(summarize(row))
+        groups.append(group)
+
+    totals = rollups.aggregate(**measures, updated_at=Max('updated_at'))
+    return {
+        'totals': summarize(totals),
+        'groups': groups,
+        'updated_at': totals['updated_at'],
+    }
@@ -0,0 +1,236 @@
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from accounts.models import Branch
+from .cache import invalidate_reference_data, reference_cache_key
+from .interest import accrue, compute_accrual
+from .models import Investment, Loan, LoanPayment, LoanSchedule
+from .repayments import to_cents
+from .schedules import SCHEDULE_DTYPE, due_dates, payments_per_year, portfolio_chunks, regenerate_chunk
+
+# Cash flows are projected this many months past the run date.
+PROJECTION_MONTHS = 12
+
+# Projections are keyed by the versions of the tables they are built from (see
+# `projection_cache_key`), so cached copies can live for a day.
+PROJECTION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# The flows a projection is made of: repayments come in, investment interest and principal go out.
+INFLOWS = ('loan_repayments',)
+OUTFLOWS = ('investment_interest', 'investment_maturities')
+
+# Stands in for the branch of loans and investments whose account has none.
+NO_BRANCH = -1
+
+
+# Tables whose versions key the projections. Bulk writes bump them explicitly: schedule
+# regeneration, loan origination, repayments and investment processing.
+PROJECTION_MODELS = [LoanSchedule, Investment, Loan, LoanPayment]
+
+
+def projection_cache_key(run_date):
+    """
+    Build the cache key of a run date's projection. It changes whenever schedules are
+    rebuilt, loans are originated or repaid, or investments are written or processed.
+    """
+    return reference_cache_key(PROJECTION_MODELS, 'cash-flow-projection', run_date.isoformat())
+
+
+def connect_projection_signals():
+    """
+    Bump the projection tables' versions on every single-row save or delete, such as
+    those made through the API or the admin.
+    """
+    for model in (Investment, Loan, LoanPayment):
+        uid = f'invalidate_projections:{model._meta.label_lower}'
+        post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=uid)
+
+
+def no_flows():
+    return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+
+
+def projection_window(run_date):
+    """
+    Return the first and last day of the projection, as days since 1970-01-01.
+    """
+    start = np.datetime64(run_date, 'D').astype(np.int64) + 1
+    return start, int(due_dates(run_date, 12, PROJECTION_MONTHS)[-1])
+
+
+def loan_flows(start, end):
+    """
+    Project the repayments of every open loan from its schedule.
+
+    A loan is expected to pay each future installment in full, less anything it has
+    paid ahead of its schedule; arrears are not projected.
+
+    Returns:
+        tuple: (branch ids, due dates, amounts) arrays, one entry per expected installment.
+    """
+    open_loans = Loan.objects.filter(fully_paid=False, closed_at__isnull=True)
+    for ids in portfolio_chunks(open_loans.filter(schedule__isnull=True)):
+        regenerate_chunk(ids)
+    rows = list(
+        LoanSchedule.objects.filter(loan__in=open_loans)
+        .values_list('loan_id', 'loan__to_account__branch_id', 'rows')
+    )
+    if not rows:
+        return no_flows()
+    paid = dict(
+        LoanPayment.objects.filter(loan__in=open_loans).values('loan_id')
+        .annotate(paid=Sum(F('interest_paid') + F('principal_paid'))).values_list('loan_id', 'paid')
+    )
+
+    schedules = [np.frombuffer(data, SCHEDULE_DTYPE) for _, _, data in rows]
+    counts = np.array([len(records) for records in schedules])
+    records = np.concatenate(schedules)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    due, payment = records['due_date'].astype(np.int64), records['payment']
+
+    # Credit each loan with what it has paid, or with what was due by the run date if
+    # that is more, and expect the part of each installment beyond that credit
+    credit = np.maximum(
+        to_cents([paid.get(loan_id) or 0 for loan_id, _, _ in rows]),
+        np.add.reduceat(np.where(due < start, payment, 0), starts),
+    )
+    totals = np.cumsum(payment)
+    due_by = totals - np.repeat(totals[starts] - payment[starts], counts)
+    expected = np.clip(due_by - np.repeat(credit, counts), 0, payment)
+
+    selected = (due >= start) & (due <= end) & (expected > 0)
+    branches = np.repeat(np.array([NO_BRANCH if branch is None else branch for _, branch, _ in rows]), counts)
+    return branches[selected], due[selected], expected[selected] / 100
+
+
+def investment_flows(start, end):
+    """
+    Project the interest credits and maturities of every open investment.
+
+    Investments with a crediting schedule or maturity date (see `core.investments`) are
+    credited on their own dates; the others earn a day's interest every day.
+
+    Returns:
+        tuple: (interest, maturities), each a (branch ids, dates, amounts) tuple of arrays.
+    """
+    rows = list(
+        Investment.objects.filter(closed_at__isnull=True, from_account__isnull=False).values_list(
+            'from_account__branch_id', 'principal', 'interest_rate', 'created_at', 'last_credited_on',
+            'maturity_date', 'crediting_frequency', 'next_event_date', 'status__status_name',
+        )
+    )
+    interest, maturities, daily = ([], [], []), ([], [], []), {}
+    for branch, principal, rate, created, last_credited, maturity, frequency, next_event, status in rows:
+        branch = NO_BRANCH if branch is None else branch
+        if next_event is None:
+            if status == 'Active':
+                # Unrounded: the accrual job carries fractions of a cent forward, not drops them
+                daily[branch] = daily.get(branch, 0) + accrue(principal, rate, 1)
+            continue
+
+        made = created.date()
+        last = np.datetime64(last_credited or made, 'D').astype(np.int64)
+        matures = np.datetime64(maturity, 'D').astype(np.int64) if maturity else None
+        stop = end if matures is None else min(end, matures)
+        dates = np.empty(0, np.int64)
+        if frequency:
+            per_year = payments_per_year(frequency)
+            dates = due_dates(made, per_year, max(1, (stop - np.datetime64(made, 'D').astype(np.int64)) * per_year // 365 + 2))
+        if matures is not None and matures <= end:
+            dates = np.union1d(dates, [matures])
+            for column, value in zip(maturities, (branch, matures, principal)):
+                column.append(np.array([value]))
+        dates = dates[(dates > last) & (dates <= stop)]
+        amounts = compute_accrual(principal, rate, np.diff(np.r_[last, dates]))
+        for column, values in zip(interest, (np.full(len(dates), branch), dates, amounts)):
+            column.append(values)
+
+    # Investments credited daily are summed per branch first, then spread over the days
+    days = np.arange(start, end + 1)
+    for branch, amount in daily.items():
+        for column, values in zip(interest, (np.full(len(days), branch), days, np.full(len(days), amount))):
+            column.append(values)
+
+    def combine(flows):
+        return tuple(np.concatenate(parts) for parts in flows) if flows[0] else no_flows()
+
+    return combine(interest), combine(maturities)
+
+
+def aggregate(flows, branch_ids, start, length):
+    """
+    Sum the flows that fall in the window per branch and day with one bincount.
+
+    Returns:
+        ndarray: Amounts of shape (branches, days), in the order of `branch_ids`.
+    """
+    branches, dates, amounts = flows
+    selected = (dates >= start) & (dates < start + length)
+    cells = np.searchsorted(branch_ids, branches[selected]) * length + (dates[selected] - start)
+    return np.bincount(cells, weights=amounts[selected], minlength=len(branch_ids) * length).reshape(len(branch_ids), length)
+
+
+def project_cash_flows(run_date):
+    """
+    Project the portfolio's expected inflows and outflows per branch and day for the
+    `PROJECTION_MONTHS` after `run_date`.
+
+    Every flow is built as NumPy arrays of (branch, date, amount) over all open loans
+    and investments, then summed into a branch-by-day matrix per kind of flow.
+
+    Returns:
+        dict: The window, the totals of each flow, and per branch its totals and the
+        days on which anything is expected to move.
+    """
+    start, end = projection_window(run_date)
+    length = end - start + 1
+    interest, maturities = investment_flows(start, end)
+    flows = {'loan_repayments': loan_flows(start, end), 'investment_interest': interest,
+             'investment_maturities': maturities}
+
+    branch_ids = np.unique(np.concatenate([branches for branches, _, _ in flows.values()]))
+    matrices = {name: aggregate(flow, branch_ids, start, length) for name, flow in flows.items()}
+    net = sum(matrices[name] for name in INFLOWS) - sum(matrices[name] for name in OUTFLOWS)
+    dates = np.arange(start, end + 1).astype('datetime64[D]').astype(str).tolist()
+    names = dict(Branch.objects.filter(pk__in=branch_ids.tolist()).values_list('pk', 'name'))
+
+    branches = []
+    for index, branch in enumerate(branch_ids.tolist()):
+        active = np.flatnonzero(np.any([matrix[index] for matrix in matrices.values()], axis=0))
+        branches.append({
+            'branch': None if branch == NO_BRANCH else branch,
+            'branch_name': names.get(branch),
+            'totals': {name: round(float(matrix[index].sum()), 2) for name, matrix in matrices.items()},
+            'net': round(float(net[index].sum()), 2),
+            'days': [
+                {'date': dates[day], **{name: round(float(matrix[index, day]), 2) for name, matrix in matrices.items()},
+                 'net': round(float(net[index, day]), 2)}
+                for day in active.tolist()
+            ],
+        })
+    return {
+        'run_date': run_date.isoformat(),
+        'start': dates[0],
+        'end': dates[-1],
+        'totals': {name: round(float(matrix.sum()), 2) for name, matrix in matrices.items()},
+        'net': round(float(net.sum()), 2),
+        'branches': branches,
+    }
+
+
+def get_projection(run_date=None, refresh=False):
+    """
+    Return the cash-flow projection for `run_date` (default: today), from the cache
+    unless `refresh` is set.
+    """
+    run_date = run_date or timezone.localdate()
+    data = None if refresh else cache.get(projection_cache_key(run_date))
+    if data is None:
+        data = project_cash_flows(run_date)
+        # Keyed after projecting, as building missing schedules bumps the version
+        cache.set(projection_cache_key(run_date), data, PROJECTION_CACHE_TIMEOUT)
+    return data
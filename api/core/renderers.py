@@ -0,0 +1,35 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson encodes dicts, lists, UUIDs, dates and datetimes natively; anything else
+# (Decimal, lazy translation strings, querysets...) goes through DRF's encoder.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+_default = JSONEncoder().default
+
+
+def dumps(data, indent=False):
+    """
+    Encode `data` as compact JSON bytes, or indented by two spaces when `indent` is set.
+    """
+    option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+    return orjson.dumps(data, default=_default, option=option)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Drop-in replacement for DRF's `JSONRenderer` backed by orjson.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = renderer_context.get('indent')
+        if accepted_media_type and not indent:
+            # Honour `Accept: application/json; indent=4` the way JSONRenderer does
+            indent = 'indent=' in accepted_media_type
+        return dumps(data, indent=bool(indent))
@@ -0,0 +1,257 @@
+import csv
+from collections import defaultdict
+from uuid import UUID
+
+import numpy as np
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_table_version
+from .interest import lookup
+from .models import Loan, LoanPayment, LoanSchedule, Status
+from .portfolio import record_repayments
+from .schedules import LOAN_FIELDS, SCHEDULE_DTYPE, inputs_digest, regenerate_chunk
+
+# Payments recorded per database transaction when processing repayment files.
+REPAYMENT_CHUNK_SIZE = 5000
+
+# Balances below half a cent count as repaid.
+PAID_OFF_THRESHOLD = 0.005
+
+
+def to_cents(amounts):
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def allocate(records, paid_before, amounts):
+    """
+    Split payments on one loan into interest and principal, following its schedule.
+
+    The schedule is read as a queue of dues - period 1 interest, period 1 principal,
+    period 2 interest and so on - and each payment settles the dues after those covered
+    by earlier payments. Anything paid beyond the end of the schedule goes to principal.
+
+    Args:
+        records: The loan's schedule (`SCHEDULE_DTYPE`), or None to put everything on principal.
+        paid_before: Cents already allocated by earlier payments.
+        amounts: Array of payments in cents, in the order they were made.
+
+    Returns:
+        tuple: (interest, principal) arrays in cents.
+    """
+    if records is None or len(records) == 0:
+        return np.zeros_like(amounts), amounts
+    dues = np.column_stack([records['interest'], records['principal']]).ravel()
+    due_by = np.cumsum(dues)
+    ends = paid_before + np.cumsum(amounts)
+    starts = ends - amounts
+    settled = np.clip(
+        np.minimum(due_by, ends[:, None]) - np.maximum(due_by - dues, starts[:, None]), 0, None,
+    )
+    interest = settled[:, 0::2].sum(axis=1)
+    return interest, amounts - interest
+
+
+def load_schedules(loan_ids):
+    """
+    Return {loan_id: schedule records} for the given loans, rebuilding any that are
+    missing or no longer match their loan. Loans without usable terms are left out.
+    """
+    rows = {row[0]: row for row in Loan.objects.filter(pk__in=loan_ids, loan_term__isnull=False).values_list(*LOAN_FIELDS)}
+    stored = {
+        loan_id: (digest, data)
+        for loan_id, digest, data in LoanSchedule.objects.filter(loan_id__in=loan_ids).values_list('loan_id', 'inputs_hash', 'rows')
+    }
+    stale = [loan_id for loan_id, row in rows.items() if stored.get(loan_id, (None,))[0] != inputs_digest(row)]
+    if stale:
+        stored.update({schedule.loan_id: (schedule.inputs_hash, schedule.rows) for schedule in regenerate_chunk(stale)})
+    return {loan_id: np.frombuffer(data, SCHEDULE_DTYPE) for loan_id, (_, data) in stored.items() if loan_id in rows}
+
+
+def paid_to_date(loan_ids):
+    """
+    Return {loan_id: amount} of everything allocated to the given loans so far.
+    """
+    return dict(
+        LoanPayment.objects.filter(loan_id__in=loan_ids).values('loan_id')
+        .annotate(paid=Sum(F('interest_paid') + F('principal_paid'))).values_list('loan_id', 'paid')
+    )
+
+
+@db_transaction.atomic
+def record_payments(payments, schedules=None):
+    """
+    Allocate and save a batch of loan payments, then bring their loans up to date.
+
+    The loans are locked in primary key order, so concurrent batches on the same loans
+    wait for each other rather than allocating the same dues twice. Each loan's
+    outstanding amount drops by the principal paid in one set-based update, and loans
+    whose balance reaches zero are closed in another; the portfolio rollup follows.
+    Payments are taken in list order.
+
+    Args:
+        payments: Unsaved `LoanPayment` instances with `loan_id` and `payment_amount` set.
+        schedules: The loans' schedules, as returned by `load_schedules`, if already loaded.
+
+    Returns:
+        list: The saved payments, with `interest_paid` and `principal_paid` filled in.
+
+    Raises:
+        ValidationError: If a payment is for a loan that is missing, repaid or closed;
+            nothing is recorded then.
+    """
+    by_loan = defaultdict(list)
+    for payment in payments:
+        by_loan[payment.loan_id].append(payment)
+    loan_ids = sorted(by_loan)
+    locked = Loan.objects.select_for_update(of=('self',)).filter(pk__in=loan_ids).order_by('pk')
+    balances = {
+        loan_id: balance
+        for loan_id, balance, fully_paid, closed_at in locked.values_list(
+            'pk', 'current_loan_amount', 'fully_paid', 'closed_at',
+        )
+        if not fully_paid and closed_at is None
+    }
+    # Checked under the lock, so a payment racing the one that repays the loan is refused too
+    not_open = [loan_id for loan_id in loan_ids if loan_id not in balances]
+    if not_open:
+        raise ValidationError({'loan': [f'Loan {loan_id} is repaid or closed.' for loan_id in not_open]})
+
+    paid_before = paid_to_date(loan_ids)
+    if schedules is None:
+        schedules = load_schedules(loan_ids)
+
+    principal_by_loan = {}
+    for loan_id, loan_payments in by_loan.items():
+        amounts = to_cents([payment.payment_amount for payment in loan_payments])
+        interest, principal = allocate(schedules.get(loan_id), int(to_cents(paid_before.get(loan_id) or 0)), amounts)
+        for payment, interest_cents, principal_cents in zip(loan_payments, interest.tolist(), principal.tolist()):
+            payment.interest_paid = interest_cents / 100
+            payment.principal_paid = principal_cents / 100
+        principal_by_loan[loan_id] = int(principal.sum()) / 100
+
+    LoanPayment.objects.bulk_create(payments, batch_size=1000)
+    now = timezone.now()
+    repaid = Case(
+        *[When(pk=loan_id, then=Value(amount)) for loan_id, amount in principal_by_loan.items()],
+        default=Value(0.0), output_field=FloatField(),
+    )
+    Loan.objects.filter(pk__in=loan_ids).update(
+        current_loan_amount=Greatest(F('current_loan_amount') - repaid, Value(0.0)), updated_at=now,
+    )
+    closed = [
+        loan_id for loan_id, balance in balances.items() if balance - principal_by_loan[loan_id] < PAID_OFF_THRESHOLD
+    ]
+    Loan.objects.filter(pk__in=closed).update(fully_paid=True, current_loan_amount=0, closed_at=now, updated_at=now)
+    record_repayments(
+        {loan_id: min(principal_by_loan[loan_id], balance) for loan_id, balance in balances.items()}, closed,
+    )
+    bump_table_version(LoanPayment)  # Invalidates the cash-flow projections
+    return payments
+
+
+def read_repayment_file(path):
+    """
+    Yield (line, loan_id, amount, reference) from a repayment file.
+
+    Files are CSV with a header row and the columns `loan`, `amount` and, optionally,
+    `reference`. Rows that cannot be parsed are yielded with an error message in place
+    of the amount.
+    """
+    with open(path, newline='') as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            try:
+                loan_id = UUID(row['loan'].strip())
+                amount = float(row['amount'])
+                if not amount > 0:
+                    raise ValueError
+            except (AttributeError, KeyError, TypeError, ValueError):
+                yield line, None, f'Invalid row: {row}', None
+                continue
+            yield line, loan_id, amount, (row.get('reference') or '').strip() or None
+
+
+def chunk_by_loan(rows):
+    """
+    Split accepted rows into chunks of about `REPAYMENT_CHUNK_SIZE`, keeping all the rows
+    of a loan in the same chunk, in file order.
+    """
+    by_loan = defaultdict(list)
+    for row in rows:
+        by_loan[row[2]].append(row)
+    chunk = []
+    for loan_rows in by_loan.values():
+        if chunk and len(chunk) + len(loan_rows) > REPAYMENT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+        chunk.extend(loan_rows)
+    if chunk:
+        yield chunk
+
+
+def process_repayment_files(paths):
+    """
+    Record every repayment in `paths` in one pass: rows are validated against the loans
+    and the references already recorded up front, then written in chunks of about
+    `REPAYMENT_CHUNK_SIZE` with bulk inserts. A loan's rows are always in one chunk, so a
+    payment that repays it cannot make a later chunk fail. A chunk that fails anyway (a
+    loan repaid or closed elsewhere in the meantime) is rolled back and its rows are
+    rejected. Rows whose reference was already recorded are skipped, so a file can
+    safely be processed again.
+
+    Returns:
+        dict: Counts of recorded and skipped payments, the total amount recorded and the
+        rejected rows as (path, line, error).
+    """
+    rows, rejected = [], []
+    for path in paths:
+        for line, loan_id, amount, reference in read_repayment_file(path):
+            if loan_id is None:
+                rejected.append((str(path), line, amount))
+            else:
+                rows.append((path, line, loan_id, amount, reference))
+
+    references = [row[4] for row in rows if row[4]]
+    recorded = set()
+    for start in range(0, len(references), REPAYMENT_CHUNK_SIZE):
+        recorded.update(LoanPayment.objects.filter(
+            reference__in=references[start:start + REPAYMENT_CHUNK_SIZE],
+        ).values_list('reference', flat=True))
+    payers = {}
+    loan_ids = list({row[2] for row in rows})
+    for start in range(0, len(loan_ids), REPAYMENT_CHUNK_SIZE):
+        payers.update(Loan.objects.filter(
+            pk__in=loan_ids[start:start + REPAYMENT_CHUNK_SIZE], fully_paid=False, closed_at__isnull=True,
+        ).values_list('pk', 'to_account__owner_id'))
+
+    completed = lookup(Status, status_name='Completed')
+    accepted, skipped = [], 0
+    for path, line, loan_id, amount, reference in rows:
+        if reference and reference in recorded:
+            skipped += 1
+        elif loan_id not in payers:
+            rejected.append((str(path), line, f'No open loan {loan_id}.'))
+        else:
+            if reference:
+                recorded.add(reference)
+            accepted.append((path, line, loan_id, LoanPayment(
+                loan_id=loan_id, payment_amount=amount, reference=reference,
+                paid_by_id=payers[loan_id], status=completed,
+            )))
+
+    payments = []
+    for chunk in chunk_by_loan(accepted):
+        try:
+            payments += record_payments([payment for _, _, _, payment in chunk])
+        except ValidationError as error:
+            reason = ' '.join(error.detail['loan'])
+            rejected += [(str(path), line, f'Not recorded with its chunk: {reason}') for path, line, _, _ in chunk]
+    return {
+        'recorded': len(payments),
+        'skipped': skipped,
+        'amount': round(sum(payment.payment_amount for payment in payments), 2),
+        'rejected': rejected,
+    }
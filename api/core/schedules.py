@@ -0,0 +1,293 @@
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .cache import bump_table_version
+from .models import Loan, LoanInstallment, LoanSchedule
+
+# Cached schedules are keyed by the digest of their loan's inputs, so they can live for a day.
+SCHEDULE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Loans rebuilt per batch of queries (and per Celery task in bulk mode).
+SCHEDULE_CHUNK_SIZE = 1000
+
+# Payments per year, by `LoanTerms.payment_frequency` (matched case-insensitively).
+# `LoanTerms.term_duration` is read as a number of months.
+PAYMENT_FREQUENCIES = {
+    'weekly': 52, 'biweekly': 26, 'bi-weekly': 26, 'fortnightly': 26, 'monthly': 12,
+    'quarterly': 4, 'semi-annually': 2, 'semiannually': 2, 'annually': 1, 'yearly': 1,
+}
+
+# One schedule row. Amounts are whole cents and due dates are days since 1970-01-01,
+# so a 30-year monthly schedule takes about 12 KB.
+SCHEDULE_DTYPE = np.dtype([
+    ('due_date', '<i4'), ('payment', '<i8'), ('principal', '<i8'), ('interest', '<i8'), ('balance', '<i8'),
+])
+AMOUNT_COLUMNS = ('payment', 'principal', 'interest', 'balance')
+
+# The loan columns a schedule is built from, in the order `build_schedules` expects.
+LOAN_FIELDS = (
+    'pk', 'loan_amount', 'interest_rate', 'disbursement_date', 'loan_term__term_duration',
+    'loan_term__payment_frequency', 'loan_term__interest_rate_type__is_variable',
+    'loan_term__interest_rate_type__index_rate',
+)
+
+
+def schedule_cache_key(loan_id, digest):
+    return f'loan-schedule:{loan_id}:{digest}'
+
+
+def inputs_digest(row):
+    """
+    Fingerprint the loan columns (`LOAN_FIELDS` minus the key) a schedule depends on.
+    """
+    return hashlib.md5(repr(tuple(row[1:])).encode(), usedforsecurity=False).hexdigest()
+
+
+def payments_per_year(frequency):
+    try:
+        return PAYMENT_FREQUENCIES[frequency.strip().lower()]
+    except (AttributeError, KeyError):
+        raise ValueError(f'Unsupported payment frequency: {frequency!r}')
+
+
+def due_dates(start, per_year, count):
+    """
+    Return the `count` due dates following `start` as days since 1970-01-01.
+
+    Monthly, quarterly and yearly schedules fall on the day of month of `start`,
+    or on the last day of shorter months; weekly ones step by 7 or 14 days.
+    """
+    steps = np.arange(1, count + 1)
+    start = np.datetime64(start, 'D')
+    if 12 % per_year:
+        return (start + steps * (364 // per_year)).astype(np.int64)
+    months = start.astype('datetime64[M]') + steps * (12 // per_year)
+    day = start - start.astype('datetime64[M]').astype('datetime64[D]')
+    month_starts = months.astype('datetime64[D]')
+    month_lengths = (months + 1).astype('datetime64[D]') - month_starts
+    return (month_starts + np.minimum(day, month_lengths - 1)).astype(np.int64)
+
+
+def amortize(opening, rate, count):
+    """
+    Amortize loans that have the same number of periods left, all at once.
+
+    Balances come from the closed-form annuity formula and are rounded to cents; each
+    period's principal is the drop in balance, so the principal always adds up to the
+    opening balance and the last period clears the loan exactly.
+
+    Args:
+        opening: Array of opening balances.
+        rate: Array of interest rates per period, as fractions.
+        count: Number of periods.
+
+    Returns:
+        tuple: (payment, principal, interest, balance) arrays of shape (loans, count), in cents.
+    """
+    steps = np.arange(1, count + 1)
+    periodic = rate[:, None]
+    growth = (1 + periodic) ** steps
+    with np.errstate(divide='ignore', invalid='ignore'):
+        installment = np.round(np.where(rate > 0, opening * rate / (1 - (1 + rate) ** -count), opening / count), 2)
+        balance = np.where(
+            periodic > 0,
+            opening[:, None] * growth - installment[:, None] * (growth - 1) / periodic,
+            opening[:, None] - installment[:, None] * steps,
+        )
+    balance = np.maximum(np.rint(balance * 100), 0).astype(np.int64)
+    balance[:, -1] = 0
+    previous = np.concatenate([np.rint(opening * 100).astype(np.int64)[:, None], balance[:, :-1]], axis=1)
+    interest = np.rint(previous * periodic).astype(np.int64)
+    principal = previous - balance
+    return principal + interest, principal, interest, balance
+
+
+def periods_already_due(previous, dates, amount, today):
+    """
+    Return the rows of a previous schedule that are already due, provided they were
+    built for the same due dates and loan amount; otherwise no rows.
+    """
+    kept = previous[previous['due_date'] <= today][:len(dates)]
+    if (
+        len(kept) == 0
+        or not np.array_equal(kept['due_date'], dates[:len(kept)])
+        or kept['principal'].sum() + kept['balance'][-1] != round(amount * 100)
+    ):
+        return previous[:0]
+    return kept
+
+
+def build_schedules(rows, previous, today):
+    """
+    Build the schedules of a batch of loans.
+
+    Fixed-rate schedules are amortized from disbursement. Variable-rate schedules keep
+    the periods of their previous schedule that are already due and re-amortize what is
+    left at the current rate, so a rate change only moves future installments. Loans
+    with the same number of periods left are amortized together.
+
+    Args:
+        rows: Tuples of `LOAN_FIELDS`.
+        previous: {loan_id: SCHEDULE_DTYPE array} of the current schedules of variable-rate loans.
+        today: The date up to which periods count as due.
+
+    Returns:
+        list: Unsaved `LoanSchedule` instances. Loans with an unsupported payment
+        frequency are left out.
+    """
+    today = np.datetime64(today, 'D').astype(np.int64)
+    plans, groups, amortized = {}, defaultdict(list), {}
+    for row in rows:
+        loan_id, amount, rate, disbursed, term, frequency, variable, index_rate = row
+        try:
+            per_year = payments_per_year(frequency)
+        except ValueError:
+            continue
+        annual_rate = rate + ((index_rate or 0) if variable else 0)
+        dates = due_dates(disbursed, per_year, max(1, round(term * per_year / 12)))
+        kept = np.empty(0, SCHEDULE_DTYPE)
+        if variable and loan_id in previous:
+            kept = periods_already_due(previous[loan_id], dates, amount, today)
+        plans[loan_id] = (kept, dates, annual_rate, inputs_digest(row))
+        if len(kept) < len(dates):
+            opening = kept['balance'][-1] / 100 if len(kept) else amount
+            groups[len(dates) - len(kept)].append((loan_id, opening, annual_rate / 100 / per_year))
+
+    for count, members in groups.items():
+        ids, opening, rate = zip(*members)
+        columns = amortize(np.array(opening, dtype=np.float64), np.array(rate, dtype=np.float64), count)
+        for index, loan_id in enumerate(ids):
+            amortized[loan_id] = [column[index] for column in columns]
+
+    generated_at = timezone.now()
+    schedules = []
+    for loan_id, (kept, dates, annual_rate, digest) in plans.items():
+        records = np.empty(len(dates), SCHEDULE_DTYPE)
+        records[:len(kept)] = kept
+        installment = records['payment'][len(kept) - 1] if len(kept) else 0
+        if loan_id in amortized:
+            fresh = records[len(kept):]
+            fresh['due_date'] = dates[len(kept):]
+            for name, values in zip(AMOUNT_COLUMNS, amortized[loan_id]):
+                fresh[name] = values
+            installment = fresh['payment'][0]
+        schedules.append(LoanSchedule(
+            loan_id=loan_id, annual_rate=annual_rate, installment=float(installment) / 100, periods=len(records),
+            inputs_hash=digest, rows=records.tobytes(), generated_at=generated_at,
+        ))
+    return schedules
+
+
+def installments(schedules):
+    """
+    Yield the `LoanInstallment` rows of the due-date table for the given schedules.
+    """
+    for schedule in schedules:
+        records = np.frombuffer(schedule.rows, SCHEDULE_DTYPE)
+        dates = records['due_date'].astype('datetime64[D]').tolist()
+        for period, (due_date, payment) in enumerate(zip(dates, (records['payment'] / 100).tolist()), start=1):
+            yield LoanInstallment(loan_id=schedule.loan_id, period=period, due_date=due_date, amount=payment)
+
+
+def regenerate_chunk(loan_ids, today=None):
+    """
+    Rebuild and store the schedules of the given loans, and their rows in the due-date
+    table, with a fixed number of queries.
+
+    Returns:
+        list: The stored `LoanSchedule` instances.
+    """
+    rows = Loan.objects.filter(pk__in=loan_ids, loan_term__isnull=False).values_list(*LOAN_FIELDS)
+    previous = {
+        loan_id: np.frombuffer(data, SCHEDULE_DTYPE)
+        for loan_id, data in LoanSchedule.objects.filter(
+            loan_id__in=loan_ids, loan__loan_term__interest_rate_type__is_variable=True,
+        ).values_list('loan_id', 'rows')
+    }
+    schedules = build_schedules(rows, previous, today or timezone.localdate())
+    with db_transaction.atomic():
+        LoanSchedule.objects.bulk_create(
+            schedules, batch_size=500, update_conflicts=True, unique_fields=['loan'],
+            update_fields=['annual_rate', 'installment', 'periods', 'inputs_hash', 'rows', 'generated_at'],
+        )
+        LoanInstallment.objects.filter(loan_id__in=[schedule.loan_id for schedule in schedules]).delete()
+        LoanInstallment.objects.bulk_create(installments(schedules), batch_size=1000)
+    cache.delete_many([schedule_cache_key(schedule.loan_id, schedule.inputs_hash) for schedule in schedules])
+    bump_table_version(LoanSchedule)  # Invalidates the cash-flow projections
+    return schedules
+
+
+def portfolio_chunks(queryset=None):
+    """
+    Split the loans to regenerate into chunks of ids; by default every open loan.
+    """
+    if queryset is None:
+        queryset = Loan.objects.filter(fully_paid=False, closed_at__isnull=True)
+    ids = list(queryset.filter(loan_term__isnull=False).order_by('pk').values_list('pk', flat=True))
+    return [ids[start:start + SCHEDULE_CHUNK_SIZE] for start in range(0, len(ids), SCHEDULE_CHUNK_SIZE)]
+
+
+def regenerate_schedules(queryset=None, today=None):
+    """
+    Rebuild the schedules of `queryset` (by default the whole open portfolio) in this process.
+
+    Returns:
+        int: The number of schedules stored.
+    """
+    return sum(len(regenerate_chunk(ids, today)) for ids in portfolio_chunks(queryset))
+
+
+def serialize_schedule(schedule):
+    records = np.frombuffer(schedule.rows, SCHEDULE_DTYPE)
+    dates = records['due_date'].astype('datetime64[D]').astype(str).tolist()
+    amounts = [(records[name] / 100).tolist() for name in AMOUNT_COLUMNS]
+    return {
+        'loan': str(schedule.loan_id),
+        'annual_rate': schedule.annual_rate,
+        'installment': schedule.installment,
+        'periods': schedule.periods,
+        'total_interest': int(records['interest'].sum()) / 100,
+        'generated_at': schedule.generated_at,
+        'schedule': [
+            {'period': period, 'due_date': due_date, 'payment': payment, 'principal': principal,
+             'interest': interest, 'balance': balance}
+            for period, (due_date, payment, principal, interest, balance)
+            in enumerate(zip(dates, *amounts), start=1)
+        ],
+    }
+
+
+def get_schedule(loan_id):
+    """
+    Return a loan's schedule as response data, from the cache when possible.
+
+    The loan's inputs are read first and their digest is part of the cache key, so a
+    loan or terms changed anywhere (the API, the admin, bulk updates) is never answered
+    from a stale copy. A stored schedule whose inputs no longer match the loan is
+    rebuilt first.
+
+    Returns:
+        dict: The schedule, or None if the loan has no terms a schedule can be built from.
+    """
+    row = Loan.objects.filter(pk=loan_id, loan_term__isnull=False).values_list(*LOAN_FIELDS).first()
+    if row is None:
+        return None
+    digest = inputs_digest(row)
+    data = cache.get(schedule_cache_key(loan_id, digest))
+    if data is not None:
+        return data
+
+    schedule = LoanSchedule.objects.filter(loan_id=loan_id).first()
+    if schedule is None or schedule.inputs_hash != digest:
+        schedules = regenerate_chunk([loan_id])
+        if not schedules:
+            return None
+        schedule = schedules[0]
+    data = serialize_schedule(schedule)
+    cache.set(schedule_cache_key(loan_id, schedule.inputs_hash), data, SCHEDULE_CACHE_TIMEOUT)
+    return data
@@ -1,10 +1,19 @@
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import (
+    BooleanField, CharField, ChoiceField, DateField, DictField, FloatField, IntegerField, JSONField, ListField,
+    ModelSerializer, Serializer, UUIDField, ValidationError,
+)
+from django.utils import timezone
+from accounts.serializers import BaseEntitySerializer, BaseEntityDetailSerializer, BranchSerializer
 from .models import (
     Account, AccountType, AnnualBalance, AssetType, Asset,
     Audit, Capital, CapitalType, Expense, ExpenseType,
     Income, IncomeType, InterestRateType, Investment, InvestmentCrediting,
     InvestmentType, Liability, LiabilityType, Loan, LoanPayment, LoanTerms,
     LoanType, Status, TransactionDirection, Transaction, TransactionType)
+from .investments import next_event_date
+from .origination import MAX_BATCH_LOANS, originate_loans
+from .repayments import record_payments
+from .schedules import payments_per_year
 
 
 class StatusSerializer(ModelSerializer):
@@ -103,7 +112,10 @@ class AccountSerializer(ModelSerializer):
     class Meta:
         model = Account
         fields = '__all__'
-        read_only_fields = ['id', 'account_number', 'created_at', 'updated_at', 'closed_at']
+        read_only_fields = [
+            'id', 'account_number', 'created_at', 'updated_at', 'closed_at', 'accrued_interest',
+            'interest_accrued_through',
+        ]
 
 
 class TransactionSerializer(ModelSerializer):
@@ -117,14 +129,14 @@ class LoanSerializer(ModelSerializer):
     class Meta:
         model = Loan
         fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'updated_at', 'closed_at', 'fully_paid', 'current_loan_amount']
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'closed_at', 'fully_paid', 'current_loan_amount', 'transaction',
+        ]
 
     def create(self, validated_data):
-        loan = Loan.objects.create(**validated_data)
-        loan.interest_rate = loan.loan_type.interest_rate
-        loan.current_loan_amount = loan.loan_amount
-        loan.save()
-        return loan
+        # Disburses the loan from the bank's account and records it in one transaction
+        request = self.context.get('request')
+        return originate_loans([Loan(**validated_data)], initiated_by=getattr(request, 'user', None))[0]
 
 
 
@@ -132,14 +144,48 @@ class LoanPaymentSerializer(ModelSerializer):
     class Meta:
         model = LoanPayment
         fields = '__all__'
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'created_at', 'interest_paid', 'principal_paid']
+        extra_kwargs = {'loan': {'required': True, 'allow_null': False}}
+
+    def validate_payment_amount(self, value):
+        if value <= 0:
+            raise ValidationError('Payment amount must be positive.')
+        return value
+
+    def create(self, validated_data):
+        # Splits the payment into interest and principal and updates the loan's balance
+        return record_payments([LoanPayment(**validated_data)])[0]
 
 
 class InvestmentSerializer(ModelSerializer):
     class Meta:
         model = Investment
         fields = '__all__'
-        read_only_fields = ['id', 'created_at', 'updated_at', 'closed_at']
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'closed_at', 'last_credited_on', 'next_event_date', 'accrued_interest',
+            'interest_accrued_through',
+        ]
+
+    def validate_crediting_frequency(self, value):
+        if value:
+            try:
+                payments_per_year(value)
+            except ValueError as error:
+                raise ValidationError(str(error))
+        return value
+
+    def validate(self, attrs):
+        # Schedules the investment's next crediting or maturity for the investment processor
+        instance = self.instance
+        if instance is None or instance.closed_at is None:
+            start = instance.created_at.date() if instance else timezone.localdate()
+            attrs['next_event_date'] = next_event_date(
+                start,
+                attrs.get('crediting_frequency', getattr(instance, 'crediting_frequency', None)),
+                attrs.get('maturity_date', getattr(instance, 'maturity_date', None)),
+                max(filter(None, (getattr(instance, 'last_credited_on', None), start))),
+            )
+        return attrs
 
 
 class InvestmentCreditingSerializer(ModelSerializer):
@@ -282,3 +328,187 @@ class ExpenseSerializer(ModelSerializer):
         model = Expense
         fields = '__all__'
         read_only_fields = ['id', 'created_at']
+
+
+#####################################################################
+## Read serializers: related objects are nested declaratively so a
+## list is rendered in a single pass over a select_related queryset.
+#####################################################################
+class AccountTypeDetailSerializer(AccountTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class AssetTypeDetailSerializer(AssetTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class CapitalTypeDetailSerializer(CapitalTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class ExpenseTypeDetailSerializer(ExpenseTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class IncomeTypeDetailSerializer(IncomeTypeSerializer):
+    updated_by = BaseEntitySerializer(read_only=True)
+
+
+class InvestmentTypeDetailSerializer(InvestmentTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class LiabilityTypeDetailSerializer(LiabilityTypeSerializer):
+    updated_by = BaseEntityDetailSerializer(read_only=True)
+
+
+class AnnualBalanceDetailSerializer(AnnualBalanceSerializer):
+    branch = BranchSerializer(read_only=True)
+
+
+class AssetDetailSerializer(AssetSerializer):
+    branch = BranchSerializer(read_only=True)
+    asset_type = AssetTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+
+
+class CapitalDetailSerializer(CapitalSerializer):
+    branch = BranchSerializer(read_only=True)
+    capital_type = CapitalTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+
+
+class LiabilityDetailSerializer(LiabilitySerializer):
+    branch = BranchSerializer(read_only=True)
+    liability_type = LiabilityTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+
+
+class ExpenseDetailSerializer(ExpenseSerializer):
+    expense_type = ExpenseTypeSerializer(read_only=True)
+
+
+class IncomeDetailSerializer(IncomeSerializer):
+    income_type = IncomeTypeSerializer(read_only=True)
+
+
+class AccountDetailSerializer(AccountSerializer):
+    owner = BaseEntityDetailSerializer(read_only=True)
+    account_type = AccountTypeSerializer(read_only=True)
+    branch = BranchSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    created_by = BaseEntitySerializer(read_only=True)
+
+
+class AccountSummarySerializer(AccountSerializer):
+    owner = BaseEntitySerializer(read_only=True)
+    account_type = AccountTypeSerializer(read_only=True)
+    branch = BranchSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+
+
+class InvestmentDetailSerializer(InvestmentSerializer):
+    from_account = AccountSummarySerializer(read_only=True)
+    to_account = AccountSummarySerializer(read_only=True)
+    investment_type = InvestmentTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    transaction = TransactionSerializer(read_only=True)
+
+
+class InvestmentSummarySerializer(InvestmentSerializer):
+    from_account = AccountSerializer(read_only=True)
+    to_account = AccountSerializer(read_only=True)
+    investment_type = InvestmentTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+
+
+class InvestmentCreditingDetailSerializer(InvestmentCreditingSerializer):
+    transaction = TransactionSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    investment = InvestmentSummarySerializer(read_only=True)
+
+
+class LoanDetailSerializer(LoanSerializer):
+    from_account = AccountSerializer(read_only=True)
+    to_account = AccountSerializer(read_only=True)
+    loan_type = LoanTypeSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    loan_term = LoanTermsSerializer(read_only=True)
+    transaction = TransactionSerializer(read_only=True)
+
+
+class LoanPaymentDetailSerializer(LoanPaymentSerializer):
+    paid_by = BaseEntitySerializer(read_only=True)
+    transaction = TransactionSerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    loan = LoanSerializer(read_only=True)
+
+
+class LoanTermsDetailSerializer(LoanTermsSerializer):
+    entity = BaseEntitySerializer(read_only=True)
+    loan_type = LoanTypeSerializer(read_only=True)
+    interest_rate_type = InterestRateTypeSerializer(read_only=True)
+
+
+class TransactionDetailSerializer(TransactionSerializer):
+    sender_account = AccountSerializer(read_only=True)
+    recipient_account = AccountSerializer(read_only=True)
+    transaction_type = TransactionTypeSerializer(read_only=True)
+    initiated_by = BaseEntitySerializer(read_only=True)
+    status = StatusSerializer(read_only=True)
+    branch = BranchSerializer(read_only=True)
+    transaction_direction = TransactionDirectionSerializer(read_only=True)
+
+
+# Batch requests
+
+class BatchItemSerializer(Serializer):
+    method = ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = CharField()
+    body = JSONField(required=False, allow_null=True)
+    headers = DictField(child=CharField(), required=False)
+
+
+class BatchSerializer(Serializer):
+    requests = ListField(child=BatchItemSerializer(), allow_empty=False, max_length=25)
+    atomic = BooleanField(default=False)
+
+
+# Batch loan origination
+
+class LoanOriginationSerializer(Serializer):
+    to_account = UUIDField()
+    loan_amount = FloatField(min_value=0.01)
+    interest_rate = FloatField(min_value=0)
+    disbursement_date = DateField()
+    loan_type = IntegerField(required=False, allow_null=True)
+    loan_term = UUIDField(required=False, allow_null=True)
+
+
+class LoanBatchSerializer(Serializer):
+    """
+    Validates a batch of loans with one query per referenced table, not one per loan.
+    """
+    loans = ListField(child=LoanOriginationSerializer(), allow_empty=False, max_length=MAX_BATCH_LOANS)
+
+    references = {'to_account': Account, 'loan_type': LoanType, 'loan_term': LoanTerms}
+
+    def validate_loans(self, loans):
+        errors = {}
+        for field, model in self.references.items():
+            ids = {loan[field] for loan in loans if loan.get(field) is not None}
+            found = set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            for index, loan in enumerate(loans):
+                if loan.get(field) is not None and loan[field] not in found:
+                    errors.setdefault(index, {})[field] = f'Invalid pk "{loan[field]}" - object does not exist.'
+        if errors:
+            raise ValidationError(errors)
+        return loans
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        loans = [
+            Loan(**{f'{field}_id' if field in self.references else field: value for field, value in loan.items()})
+            for loan in validated_data['loans']
+        ]
+        return originate_loans(loans, initiated_by=getattr(request, 'user', None))
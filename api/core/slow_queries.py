@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal
+from rest_framework.views import APIView
+
+logger = logging.getLogger('pocket_bank.slow_queries')
+logger.propagate = False
+
+# Size and number of rotated slow-query log files kept next to SLOW_QUERY_LOG_FILE.
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Set while the recorder runs its own EXPLAIN, so that query is not recorded too.
+_explaining = threading.local()
+
+
+def get_log_handler():
+    """
+    Attach the rotating file handler on first use, so nothing is written unless enabled.
+    """
+    path = os.path.abspath(settings.SLOW_QUERY_LOG_FILE)
+    for handler in logger.handlers:
+        if handler.baseFilename == path:
+            return handler
+        logger.removeHandler(handler)
+        handler.close()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def describe_caller():
+    """
+    Find the view and the signal receivers on the current call stack.
+
+    Returns:
+        tuple: (view, handlers) where `view` is e.g. 'AccountViewSet.list' or None and
+        `handlers` lists the receivers being run, outermost first.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+
+    view, handlers, inside_send = None, [], False
+    for frame in reversed(frames):
+        instance = frame.f_locals.get('self')
+        if view is None and isinstance(instance, APIView):
+            view = f'{type(instance).__name__}.{getattr(instance, "action", None) or frame.f_code.co_name}'
+        elif isinstance(instance, Signal) and frame.f_code.co_name in ('send', 'send_robust'):
+            inside_send = True
+        elif inside_send and frame.f_code.co_filename.startswith(str(settings.BASE_DIR)):
+            handlers.append(f'{frame.f_globals.get("__name__")}.{frame.f_code.co_qualname}')
+            inside_send = False
+    return view, handlers
+
+
+def explain(connection, sql, params):
+    """
+    Return the database's plan for `sql` as a list of lines, or None if it has none.
+
+    The EXPLAIN runs in a savepoint, so a failure cannot abort the request's transaction
+    on databases such as PostgreSQL.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    _explaining.active = True
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN failed: {error}']
+    finally:
+        _explaining.active = False
+
+
+class SlowQueryRecorder:
+    """
+    `execute_wrapper` that logs every query slower than `SLOW_QUERY_THRESHOLD_MS`.
+
+    Each entry is one JSON line holding the SQL, its duration, the EXPLAIN plan, the
+    view being served and the signal receivers on the stack, so hot scans can be traced
+    back to the endpoint or handler that ran them.
+    """
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_explaining, 'active', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.record(context['connection'], sql, params, many, duration_ms)
+        return result
+
+    def record(self, connection, sql, params, many, duration_ms):
+        view, handlers = describe_caller()
+        entry = {
+            'time': time.time(),
+            'duration_ms': round(duration_ms, 3),
+            'sql': sql,
+            'plan': None if many else explain(connection, sql, params),
+            'view': view,
+            'handlers': handlers,
+        }
+        get_log_handler()
+        logger.info(json.dumps(entry, default=str))
+
+
+recorder = SlowQueryRecorder()
+
+
+def install_recorder(sender=None, connection=None, **kwargs):
+    if recorder not in connection.execute_wrappers:
+        connection.execute_wrappers.append(recorder)
+
+
+def connect_slow_query_log():
+    connection_created.connect(install_recorder, dispatch_uid='core.slow_queries.install_recorder')
+
+
+def read_entries():
+    """
+    Yield the entries from the current log file and its rotated backups.
+    """
+    path = settings.SLOW_QUERY_LOG_FILE
+    for name in [path] + [f'{path}.{index}' for index in range(1, LOG_BACKUP_COUNT + 1)]:
+        try:
+            with open(name) as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def top_offenders(limit=20):
+    """
+    Group logged queries by SQL text and rank them by total time.
+
+    Returns:
+        list: Dicts with the SQL, call count, total and max duration, the latest plan
+        and the views and handlers that ran the query.
+    """
+    offenders = {}
+    for entry in read_entries():
+        offender = offenders.setdefault(entry['sql'], {
+            'sql': entry['sql'], 'count': 0, 'total_ms': 0, 'max_ms': 0, 'plan': None, 'last_seen': 0,
+            'views': set(), 'handlers': set(),
+        })
+        offender['count'] += 1
+        offender['total_ms'] += entry['duration_ms']
+        offender['max_ms'] = max(offender['max_ms'], entry['duration_ms'])
+        if entry['time'] >= offender['last_seen']:
+            offender['last_seen'], offender['plan'] = entry['time'], entry['plan']
+        if entry['view']:
+            offender['views'].add(entry['view'])
+        offender['handlers'].update(entry['handlers'])
+
+    ranked = sorted(offenders.values(), key=lambda offender: offender['total_ms'], reverse=True)[:limit]
+    for offender in ranked:
+        offender['total_ms'] = round(offender['total_ms'], 3)
+        offender['views'] = sorted(offender['views'])
+        offender['handlers'] = sorted(offender['handlers'])
+    return ranked
@@ -1,4 +1,7 @@
+import datetime
+
 from celery import shared_task
+from django.db import OperationalError
 from django.utils import timezone
 from django.db.models import Sum
 
@@ -33,3 +36,176 @@ def calculate_annual_balance():
         )
 
 
+
+
+@shared_task
+def accrue_interest(run_date=None):
+    """
+    Accrue the day's interest: plan the accruals here, credit them in parallel chunks and
+    record the run's totals once every chunk has finished.
+    """
+    from celery import chord
+    from .interest import plan_accrual
+
+    run_date = datetime.date.fromisoformat(run_date) if run_date else timezone.localdate()
+    _, chunks = plan_accrual(run_date)
+    callback = complete_accrual_run.si(run_date.isoformat())
+    if not chunks:
+        return callback.delay()
+    return chord(accrue_interest_chunk.s(run_date.isoformat(), **chunk) for chunk in chunks)(callback)
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def accrue_interest_chunk(run_date, kind, ids, amounts):
+    from .interest import apply_accrual_chunk
+
+    return apply_accrual_chunk(datetime.date.fromisoformat(run_date), kind, ids, amounts)
+
+
+@shared_task
+def complete_accrual_run(run_date):
+    from .interest import complete_accrual_run as complete
+
+    complete(datetime.date.fromisoformat(run_date))
+
+
+@shared_task
+def regenerate_loan_schedules(rate_type_id=None, loan_term_id=None):
+    """
+    Rebuild the schedules of the open portfolio, or only of the loans on one interest rate
+    type or set of terms, in parallel chunks.
+    """
+    from celery import group
+    from .models import Loan
+    from .schedules import portfolio_chunks
+
+    loans = Loan.objects.filter(fully_paid=False, closed_at__isnull=True)
+    if rate_type_id is not None:
+        loans = loans.filter(loan_term__interest_rate_type=rate_type_id)
+    if loan_term_id is not None:
+        loans = loans.filter(loan_term=loan_term_id)
+    chunks = [[str(loan_id) for loan_id in ids] for ids in portfolio_chunks(loans)]
+    return group(regenerate_loan_schedule_chunk.s(ids) for ids in chunks)()
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def regenerate_loan_schedule_chunk(loan_ids):
+    from .schedules import regenerate_chunk
+
+    return len(regenerate_chunk(loan_ids))
+
+
+@shared_task
+def collect_due_installments(run_date=None):
+    """
+    Debit the installments due today from borrowers' accounts, in parallel chunks.
+    """
+    from celery import group
+    from .auto_debit import plan_collection
+
+    run_date = datetime.date.fromisoformat(run_date) if run_date else timezone.localdate()
+    chunks = plan_collection(run_date)
+    return group(collect_installments_chunk.s(run_date.isoformat(), loan_ids) for loan_ids in chunks)()
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def collect_installments_chunk(run_date, loan_ids, attempt=0):
+    """
+    Collect one chunk and schedule another try for the loans that were short of funds.
+    """
+    from .auto_debit import COLLECTION_RETRIES, COLLECTION_RETRY_DELAY, collect_chunk
+
+    final = attempt >= COLLECTION_RETRIES
+    short = collect_chunk(datetime.date.fromisoformat(run_date), loan_ids, final=final)
+    if short and not final:
+        collect_installments_chunk.apply_async((run_date, short, attempt + 1), countdown=COLLECTION_RETRY_DELAY)
+    return len(loan_ids) - len(short)
+
+
+@shared_task
+def assess_delinquency(run_date=None):
+    """
+    Classify overdue loans into delinquency buckets and charge late fees, in parallel
+    chunks, then mark the loans that have caught up as current.
+    """
+    from celery import chord
+    from .delinquency import plan_assessment
+
+    run_date = datetime.date.fromisoformat(run_date) if run_date else timezone.localdate()
+    chunks = plan_assessment(run_date)
+    callback = complete_delinquency_assessment.si(run_date.isoformat())
+    if not chunks:
+        return callback.delay()
+    return chord(assess_delinquency_chunk.s(run_date.isoformat(), loan_ids) for loan_ids in chunks)(callback)
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def assess_delinquency_chunk(run_date, loan_ids):
+    from .delinquency import assess_chunk
+
+    return assess_chunk(datetime.date.fromisoformat(run_date), loan_ids)
+
+
+@shared_task
+def complete_delinquency_assessment(run_date):
+    from .delinquency import complete_assessment
+
+    return complete_assessment(datetime.date.fromisoformat(run_date))
+
+
+@shared_task
+def rebuild_portfolio_rollups():
+    """
+    Recompute the portfolio rollup from the open loans, correcting any drift in the
+    incremental updates.
+    """
+    from .portfolio import rebuild_rollups
+
+    return rebuild_rollups()
+
+
+@shared_task
+def process_investments(run_date=None):
+    """
+    Credit interest to, and repay at maturity, the investments with an event due on
+    `run_date` (default: today), in parallel chunks.
+    """
+    from celery import chord
+    from .investments import plan_processing
+
+    run_date = datetime.date.fromisoformat(run_date) if run_date else timezone.localdate()
+    chunks = plan_processing(run_date)
+    callback = complete_investment_processing.si(run_date.isoformat())
+    if not chunks:
+        return callback.delay()
+    return chord(process_investments_chunk.s(run_date.isoformat(), ids) for ids in chunks)(callback)
+
+
+@shared_task(autoretry_for=(OperationalError,), retry_backoff=True, max_retries=5)
+def process_investments_chunk(run_date, investment_ids):
+    from .investments import process_chunk
+
+    return process_chunk(datetime.date.fromisoformat(run_date), investment_ids)
+
+
+@shared_task
+def complete_investment_processing(run_date):
+    from .investments import complete_processing_run
+
+    run = complete_processing_run(datetime.date.fromisoformat(run_date))
+    return {'processed': run.processed, 'matured': run.matured, 'interest_credited': run.interest_credited}
+
+
+@shared_task
+def simulate_credit_losses(scenarios=10000, seed=0, workers=1, stress=1.0, as_of=None):
+    """
+    Run a Monte Carlo credit loss simulation on the open loan book; the result (loss
+    distributions per branch) is kept by the result backend. It runs in the worker's own
+    process, as prefork workers are daemonic and cannot start a pool.
+    """
+    from .credit_risk import simulate_credit_losses as simulate
+
+    return simulate(
+        scenarios=scenarios, seed=seed, workers=workers, stress=stress,
+        as_of=datetime.date.fromisoformat(as_of) if as_of else None,
+    )
@@ -1,3 +1,1440 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, models
+from django.db.models.signals import post_save
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.permissions import IsAdminUser
+from rest_framework.test import APITestCase
+
+from accounts.models import BaseEntity, Branch, EntityType
+from accounts.urls import router as accounts_router
+from .auto_debit import COLLECTION_RETRY_DELAY, plan_collection, run_collection
+from .cache import REFERENCE_DATA_TIMEOUT, reference_cache_key
+from .credit_risk import simulate_credit_losses
+from .delinquency import run_assessment
+from .interest import plan_accrual, run_accrual
+from .investments import next_event_date, run_processing
+from .metrics import MetricsRegistry
+from .models import (
+    Account, AccountType, Asset, Audit, CollectionRun, InterestAccrualRun, InterestRateType, Investment,
+    InvestmentCrediting, InvestmentProcessingRun, Loan, LoanDelinquency, LoanInstallment, LoanPayment, LoanSchedule,
+    LoanTerms, LoanType, PortfolioRollup, Status, Transaction, TransactionDirection, TransactionType,
+)
+from .origination import originate_loans
+from .permissions import IsStaffOrRelated
+from .portfolio import rebuild_rollups
+from .repayments import process_repayment_files, record_payments
+from .schedules import regenerate_schedules
+from .slow_queries import explain, recorder
+from .tasks import collect_installments_chunk, simulate_credit_losses as simulate_credit_losses_task
+from .urls import router as core_router
+from .views import AccountViewSet, ReferenceDataView, TransactionViewSet
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CoreAPITestCase(APITestCase):
+    """
+    Shared fixtures: a branch, the lookup rows an account needs and an authenticated staff user.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.branch = Branch.objects.create(name='Main', address='1 Main St', branch_code='001', phone_number='000')
+        self.entity_type = EntityType.objects.create(type_name='Individual')
+        self.status = Status.objects.create(status_name='Active')
+        self.account_type = AccountType.objects.create(type_name='Savings')
+        self.transaction_type = TransactionType.objects.create(type_name='Transfer')
+        self.direction = TransactionDirection.objects.create(direction='Internal')
+        self.staff = self.create_entity('staff', is_staff=True)
+        self.client.force_authenticate(self.staff)
+
+    def create_entity(self, username, **extra_fields):
+        return BaseEntity.objects.create(
+            username=username, email=f'{username}@example.com', phone_number=username,
+            address='1 Main St', date_of_birth='2000-01-01', tax_identifier_number=username,
+            branch=self.branch, entity_type=self.entity_type, **extra_fields
+        )
+
+    def create_accounts(self, count):
+        for index in range(count):
+            owner = self.create_entity(f'owner{Account.objects.count()}')
+            sender = Account.objects.create(
+                account_name=f'Account {index}', owner=owner, account_type=self.account_type,
+                branch=self.branch, status=self.status, created_by=self.staff,
+            )
+            Transaction.objects.create(
+                sender_account=sender, recipient_account=sender, transaction_type=self.transaction_type,
+                initiated_by=owner, transaction_amount=10, status=self.status, branch=self.branch,
+                transaction_direction=self.direction,
+            )
+
+
+class NestedSerializationQueryCountTests(CoreAPITestCase):
+    """
+    List endpoints must cost a constant number of queries, however many rows they return.
+    """
+
+    def count_list_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assert_constant_queries(self, url):
+        self.create_accounts(1)
+        single, _ = self.count_list_queries(url)
+        self.create_accounts(9)
+        many, response = self.count_list_queries(url)
+        rows = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(single, many)
+        return rows
+
+    def test_account_list_query_count_is_independent_of_rows(self):
+        item = self.assert_constant_queries('/api/v1/accounts/')[0]
+        self.assertEqual(item['owner']['branch']['name'], 'Main')
+        self.assertEqual(item['owner']['entity_type']['type_name'], 'Individual')
+        self.assertEqual(item['account_type']['type_name'], 'Savings')
+        self.assertEqual(item['created_by']['username'], 'staff')
+
+    def test_transaction_list_query_count_is_independent_of_rows(self):
+        item = self.assert_constant_queries('/api/v1/transactions/')[0]
+        self.assertEqual(item['sender_account']['account_type'], self.account_type.id)
+        self.assertEqual(item['transaction_direction']['direction'], 'Internal')
+
+
+class SparseFieldsetTests(CoreAPITestCase):
+    """
+    `?fields=` and `?expand=` shape both the payload and the SQL behind it.
+    """
+
+    def test_relations_are_ids_unless_expanded(self):
+        self.create_accounts(1)
+        response = self.client.get('/api/v1/accounts/?fields=id,account_name,owner,branch&expand=owner')
+        self.assertEqual(response.status_code, 200)
+        item = response.data[0]
+        self.assertEqual(set(item), {'id', 'account_name', 'owner', 'branch'})
+        self.assertEqual(item['branch'], self.branch.id)
+        self.assertEqual(item['owner']['branch'], self.branch.id)
+
+    def test_dotted_expand_reaches_nested_relations(self):
+        self.create_accounts(1)
+        response = self.client.get('/api/v1/accounts/?expand=owner.branch')
+        item = response.data[0]
+        self.assertEqual(item['owner']['branch']['name'], 'Main')
+        self.assertEqual(item['owner']['entity_type'], self.entity_type.id)
+        self.assertEqual(item['account_type'], self.account_type.id)
+
+    def test_queryset_follows_requested_shape(self):
+        self.create_accounts(3)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/accounts/?fields=id,account_name')
+        self.assertEqual(response.status_code, 200)
+        sql = context.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('current_balance', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/v1/accounts/?fields=nope')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/accounts/?expand=account_name')
+        self.assertEqual(response.status_code, 400)
+
+
+class StreamingListTests(CoreAPITestCase):
+    """
+    `?stream=true` returns the same rows as the buffered list, written incrementally.
+    """
+
+    def test_streamed_list_matches_buffered_list(self):
+        self.create_accounts(3)
+        buffered = self.client.get('/api/v1/accounts/?expand=owner')
+        streamed = self.client.get('/api/v1/accounts/?expand=owner&stream=true')
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(streamed['Content-Type'], 'application/json')
+        body = b''.join(streamed.streaming_content)
+        self.assertEqual(json.loads(body), json.loads(buffered.content))
+
+    def test_streamed_list_writes_rows_in_chunks(self):
+        self.create_accounts(5)
+        with mock.patch.object(AccountViewSet, 'stream_chunk_size', 2):
+            streamed = self.client.get('/api/v1/accounts/?stream=1')
+            chunks = list(streamed.streaming_content)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(len(json.loads(b''.join(chunks))), 5)
+
+
+class RowScopingTests(CoreAPITestCase):
+    """
+    Customers only see their own rows and branch staff only their branch, filtered in SQL.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_accounts(3)
+        self.customer = Account.objects.order_by('account_name').first().owner
+        self.other_branch = Branch.objects.create(name='Other', address='2 Main St', branch_code='002', phone_number='001')
+
+    def test_customer_sees_only_owned_accounts(self):
+        self.client.force_authenticate(self.customer)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/accounts/?fields=id,owner')
+        self.assertEqual([item['owner'] for item in response.data], [self.customer.id])
+        self.assertNotIn('JOIN', context.captured_queries[-1]['sql'])
+
+    def test_customer_sees_only_own_transactions(self):
+        self.client.force_authenticate(self.customer)
+        results = self.client.get('/api/v1/transactions/').data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['initiated_by']['id'], str(self.customer.id))
+
+    def test_customer_cannot_retrieve_other_accounts(self):
+        other = Account.objects.exclude(owner=self.customer).first()
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(f'/api/v1/accounts/{other.id}/').status_code, 404)
+
+    def test_branch_staff_see_only_their_branch(self):
+        Account.objects.filter(pk=Account.objects.first().pk).update(branch=self.other_branch)
+        response = self.client.get('/api/v1/accounts/')
+        self.assertEqual(len(response.data), 2)
+        self.staff.branch = None
+        self.staff.save()
+        response = self.client.get('/api/v1/accounts/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_object_permission_compares_ids_without_loading_relations(self):
+        transaction = Transaction.objects.get(initiated_by=self.customer)
+        request = mock.Mock(user=self.customer, method='GET')
+        with CaptureQueriesContext(connection) as context:
+            allowed = IsStaffOrRelated().has_object_permission(request, TransactionViewSet(), transaction)
+        self.assertTrue(allowed)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('baseentity', context.captured_queries[0]['sql'])
+
+    def create_loans_and_investments(self):
+        account = Account.objects.get(owner=self.customer)
+        investment = Investment.objects.create(from_account=account, interest_rate=5, principal=100, status=self.status)
+        InvestmentCrediting.objects.create(investment=investment, payment_amount=1, interest_earned=1, status=self.status)
+        loan = Loan.objects.create(
+            to_account=account, interest_rate=12, loan_amount=1200, current_loan_amount=1200,
+            disbursement_date=datetime.date(2024, 1, 31), status=self.status,
+        )
+        LoanPayment.objects.create(loan=loan, payment_amount=10, interest_paid=10, principal_paid=0, status=self.status)
+
+    def test_branch_staff_see_only_their_branchs_loans_and_investments(self):
+        self.create_loans_and_investments()
+        urls = ('/api/v1/investments/', '/api/v1/investment-creditings/', '/api/v1/loans/', '/api/v1/loan-payments/')
+        rows = {url: self.client.get(url).data for url in urls}
+        self.staff.branch = self.other_branch
+        self.staff.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(len(rows[url]), 1)
+                self.assertEqual(self.client.get(url).data, [])
+                self.assertEqual(self.client.get(f"{url}{rows[url][0]['id']}/").status_code, 404)
+
+    def test_customer_can_retrieve_every_row_of_their_lists(self):
+        self.create_loans_and_investments()
+        self.client.force_authenticate(self.customer)
+        for url in ('/api/v1/investment-creditings/', '/api/v1/loan-payments/'):
+            with self.subTest(url=url):
+                rows = self.client.get(url).data
+                self.assertEqual(len(rows), 1)
+                self.assertEqual(self.client.get(f"{url}{rows[0]['id']}/").status_code, 200)
+
+
+class ConditionalGetTests(CoreAPITestCase):
+    """
+    Unchanged resources are answered with a 304 carrying the same validators.
+    """
+
+    def test_list_etag_changes_with_updates_and_deletions(self):
+        self.create_accounts(2)
+        first = self.client.get('/api/v1/accounts/')
+        etag = first['ETag']
+        self.assertIn('Last-Modified', first)
+
+        with CaptureQueriesContext(connection) as context:
+            cached = self.client.get('/api/v1/accounts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+
+        Account.objects.first().delete()
+        self.assertEqual(self.client.get('/api/v1/accounts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_retrieve_honours_if_none_match_and_if_modified_since(self):
+        self.create_accounts(1)
+        account = Account.objects.get()
+        url = f'/api/v1/accounts/{account.id}/'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        account.account_name = 'Renamed'
+        account.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_shaped_responses_get_their_own_etag(self):
+        self.create_accounts(1)
+        full = self.client.get('/api/v1/accounts/')
+        sparse = self.client.get('/api/v1/accounts/?fields=id', HTTP_IF_NONE_MATCH=full['ETag'])
+        self.assertEqual(sparse.status_code, 200)
+
+
+class ReferenceDataCacheTests(CoreAPITestCase):
+    """
+    Reference tables are served from the cache until one of their rows is written.
+    """
+
+    def count_queries(self, url, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return len(context.captured_queries), response
+
+    def test_cached_until_written(self):
+        _, first = self.count_queries('/api/v1/statuses/')
+        queries, cached = self.count_queries('/api/v1/statuses/')
+        self.assertEqual(queries, 0)
+        self.assertEqual(cached.data, first.data)
+
+        Status.objects.create(status_name='Closed')
+        _, fresh = self.count_queries('/api/v1/statuses/')
+        self.assertEqual(len(fresh.data), len(first.data) + 1)
+
+    def test_cached_validators_answer_304_without_queries(self):
+        first = self.client.get('/api/v1/account-types/')
+        queries, cached = self.count_queries('/api/v1/account-types/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(queries, 0)
+        self.assertEqual(cached.status_code, 304)
+
+    def test_bundle_is_cached_and_invalidated_per_table(self):
+        _, first = self.count_queries('/api/v1/reference-data/')
+        self.assertEqual(first.data['account-types'][0]['type_name'], 'Savings')
+        self.assertIn('roles', first.data)
+        queries, _ = self.count_queries('/api/v1/reference-data/')
+        self.assertEqual(queries, 0)
+
+        self.account_type.type_name = 'Current'
+        self.account_type.save()
+        _, fresh = self.count_queries('/api/v1/reference-data/')
+        self.assertEqual(fresh.data['account-types'][0]['type_name'], 'Current')
+
+    def test_bundle_leaves_staff_only_tables_out_for_customers(self):
+        self.client.get('/api/v1/reference-data/')
+        self.client.force_authenticate(self.create_entity('customer'))
+        response = self.client.get('/api/v1/reference-data/')
+        self.assertEqual(set(response.data), {'entity-types', 'roles'})
+        viewsets = dict((prefix, viewset) for prefix, viewset, _ in core_router.registry + accounts_router.registry)
+        for name in ReferenceDataView.tables:
+            staff_only = IsAdminUser in viewsets[name].permission_classes
+            self.assertEqual(name in ReferenceDataView.public_tables, not staff_only, name)
+
+    def test_rows_read_before_the_commit_are_not_served_after_it(self):
+        first = self.client.get('/api/v1/statuses/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Status.objects.create(status_name='Closed')
+            # A concurrent request that still saw the committed rows caches them under the new version
+            cache.set(reference_cache_key([Status], '/api/v1/statuses/'), {'data': first.data, 'headers': {}}, REFERENCE_DATA_TIMEOUT)
+        self.assertEqual(len(self.client.get('/api/v1/statuses/').data), len(first.data) + 1)
+
+
+class MetricsTests(CoreAPITestCase):
+    """
+    Requests are measured per view and action and reported for every worker.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.registry = MetricsRegistry()
+        for target in ('core.metrics.registry', 'core.views.registry'):
+            patcher = mock.patch(target, self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_metrics(self):
+        response = self.client.get('/api/v1/metrics')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_request_is_measured_by_view_and_action(self):
+        self.create_accounts(2)
+        self.client.get('/api/v1/accounts/')
+        body = self.get_metrics()
+        labels = '{action="list",view="AccountViewSet"}'
+        self.assertIn(f'http_request_db_queries_count{labels} 1', body)
+        self.assertIn(f'http_request_serializer_duration_seconds_count{labels} 1', body)
+        self.assertIn('http_requests_total{action="list",status="200",view="AccountViewSet"} 1', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+
+    def test_snapshots_of_other_workers_are_merged(self):
+        self.client.get('/api/v1/accounts/')
+        self.write_snapshot(os.getppid(), 4)
+        body = self.get_metrics()
+        self.assertIn('http_requests_total{action="list",status="200",view="AccountViewSet"} 5', body)
+
+    def test_snapshots_of_exited_workers_are_pruned(self):
+        self.client.get('/api/v1/accounts/')
+        worker = subprocess.Popen([sys.executable, '-c', ''])
+        worker.wait()
+        path = self.write_snapshot(worker.pid, 4)
+        body = self.get_metrics()
+        self.assertIn('http_requests_total{action="list",status="200",view="AccountViewSet"} 1', body)
+        self.assertFalse(os.path.exists(path))
+
+    def write_snapshot(self, pid, requests):
+        path = os.path.join(self.directory, f'{pid}.json')
+        with open(path, 'w') as file:
+            json.dump({'histograms': [], 'counters': [
+                ['http_requests_total', {'view': 'AccountViewSet', 'action': 'list', 'status': 200}, requests],
+            ]}, file)
+        return path
+
+    def test_signal_receivers_are_timed(self):
+        self.account_type.save()
+        body = self.get_metrics()
+        self.assertIn('signal_receivers_duration_seconds_count{sender="core.accounttype",signal="post_save"} 1', body)
+
+    def test_metrics_are_admin_only(self):
+        self.client.force_authenticate(self.create_entity('customer'))
+        self.assertEqual(self.client.get('/api/v1/metrics').status_code, 403)
+
+
+class RouterQueryCountTests(CoreAPITestCase):
+    """
+    Guard rail against N+1 queries: every router endpoint must run as many queries
+    for 50 rows as for one, on both list and retrieve.
+
+    Rows are seeded generically from the model definition, with every foreign key
+    filled in so nested serializers have something to render.
+    """
+    routers = (core_router, accounts_router)
+    many = 50
+
+    def setUp(self):
+        super().setUp()
+        self.sequence = count()
+        self.shared = {Branch: self.branch, BaseEntity: self.staff}
+        self.building = set()
+
+    def field_value(self, field):
+        if field.choices:
+            return field.choices[0][0]
+        number = next(self.sequence)
+        if isinstance(field, models.EmailField):
+            return f'seed{number}@example.com'
+        if isinstance(field, (models.CharField, models.TextField)):
+            return f'{number}'
+        if isinstance(field, models.BooleanField):
+            return False
+        if isinstance(field, (models.IntegerField, models.FloatField)):
+            return 1
+        if isinstance(field, models.DecimalField):
+            return Decimal('1')
+        if isinstance(field, models.DateTimeField):
+            return datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        if isinstance(field, models.DateField):
+            return datetime.date(2024, 1, 1)
+        raise TypeError(f'No seed value for {field!r}')
+
+    def build(self, model):
+        self.building.add(model)
+        values = {}
+        for field in model._meta.concrete_fields:
+            if field.primary_key or not field.editable or field.name in ('password', 'last_login'):
+                continue
+            if field.is_relation:
+                # Break cycles (self-references, Employee -> Department -> Employee) on nullable keys
+                if field.related_model in self.building and field.null:
+                    continue
+                values[field.attname] = self.shared_instance(field.related_model).pk
+            elif not field.has_default():
+                values[field.name] = self.field_value(field)
+        self.building.discard(model)
+        return model.objects.create(**values)
+
+    def shared_instance(self, model):
+        if model not in self.shared:
+            self.shared[model] = self.build(model)
+        return self.shared[model]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context.captured_queries)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for router in self.routers:
+            for prefix, viewset, _ in router.registry:
+                with self.subTest(prefix=prefix):
+                    model = viewset.queryset.model
+                    instance = self.build(model)
+                    list_url = f'/api/v1/{prefix}/'
+                    detail_url = f'/api/v1/{prefix}/{instance.pk}/'
+                    one = self.count_queries(list_url), self.count_queries(detail_url)
+
+                    for _ in range(self.many - 1):
+                        self.build(model)
+                    many = self.count_queries(list_url), self.count_queries(detail_url)
+                    self.assertEqual(one, many, f'{prefix}: (list, retrieve) queries for 1 vs {self.many} rows')
+
+
+def count_accounts_on_save(sender, **kwargs):
+    Account.objects.count()
+
+
+class SlowQueryLogTests(CoreAPITestCase):
+    """
+    Slow queries are logged with their plan and caller and ranked by total time.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_file = os.path.join(directory.name, 'slow_queries.log')
+        settings_override = override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_FILE=self.log_file)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.create_accounts(1)
+
+    def record_queries(self, url):
+        connection.execute_wrappers.append(recorder)
+        try:
+            self.client.get(url)
+        finally:
+            connection.execute_wrappers.remove(recorder)
+
+    def test_queries_are_logged_with_plan_and_view(self):
+        self.record_queries('/api/v1/accounts/')
+        with open(self.log_file) as file:
+            entries = [json.loads(line) for line in file]
+        listing = [entry for entry in entries if 'core_account' in entry['sql'] and 'JOIN' in entry['sql']]
+        self.assertTrue(listing)
+        self.assertEqual(listing[0]['view'], 'AccountViewSet.list')
+        self.assertTrue(listing[0]['plan'])
+        # The recorder's own EXPLAIN queries are not logged
+        self.assertFalse([entry for entry in entries if entry['sql'].startswith('EXPLAIN')])
+
+    def test_failed_explain_is_rolled_back_to_a_savepoint(self):
+        with CaptureQueriesContext(connection) as context:
+            plan = explain(connection, 'SELECT * FROM missing_table', [])
+        self.assertTrue(plan[0].startswith('EXPLAIN failed'))
+        self.assertTrue(any(query['sql'].startswith('ROLLBACK TO SAVEPOINT') for query in context.captured_queries))
+        self.assertTrue(Status.objects.exists())
+
+    def test_signal_handlers_are_captured(self):
+        post_save.connect(count_accounts_on_save, sender=Status)
+        self.addCleanup(post_save.disconnect, count_accounts_on_save, sender=Status)
+        connection.execute_wrappers.append(recorder)
+        try:
+            self.status.save()
+        finally:
+            connection.execute_wrappers.remove(recorder)
+        with open(self.log_file) as file:
+            entries = [json.loads(line) for line in file]
+        counted = [entry for entry in entries if 'COUNT' in entry['sql']]
+        self.assertEqual(counted[0]['handlers'], ['core.tests.count_accounts_on_save'])
+
+    def test_top_offenders_are_admin_only_and_ranked(self):
+        self.record_queries('/api/v1/accounts/')
+        self.record_queries('/api/v1/accounts/')
+        response = self.client.get('/api/v1/slow-queries/?limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.data), 3)
+        totals = [offender['total_ms'] for offender in response.data]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+
+        self.client.force_authenticate(self.create_entity('customer'))
+        self.assertEqual(self.client.get('/api/v1/slow-queries/').status_code, 403)
+
+
+class TransactionFilterTests(CoreAPITestCase):
+    """
+    Transactions can be filtered and ordered by indexed columns only.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_accounts(3)
+        self.closed = Status.objects.create(status_name='Closed')
+        for amount, transaction in zip((5, 50, 500), Transaction.objects.order_by('created_at')):
+            transaction.transaction_amount = amount
+            transaction.save()
+        Transaction.objects.filter(transaction_amount=500).update(status=self.closed)
+
+    def get_amounts(self, query):
+        response = self.client.get(f'/api/v1/transactions/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['transaction_amount'] for item in response.data['results']]
+
+    def test_equality_filters(self):
+        account = Transaction.objects.get(transaction_amount=50).sender_account
+        self.assertEqual(self.get_amounts(f'account={account.id}'), [50])
+        self.assertEqual(self.get_amounts(f'status={self.closed.id}'), [500])
+        self.assertEqual(self.get_amounts(f'branch={self.branch.id}&status={self.status.id}'), [50, 5])
+
+    def test_range_filters_and_ordering(self):
+        self.assertEqual(self.get_amounts(''), [500, 50, 5])
+        self.assertEqual(self.get_amounts('min_amount=10'), [50, 500])
+        self.assertEqual(self.get_amounts('min_amount=10&ordering=-transaction_amount'), [500, 50])
+        self.assertEqual(self.get_amounts('created_after=2000-01-01&ordering=created_at'), [5, 50, 500])
+
+    def test_unindexed_combinations_are_rejected(self):
+        for query in (
+            f'status={self.status.id}&type={self.transaction_type.id}',
+            'min_amount=10&created_after=2000-01-01',
+            f'status={self.status.id}&ordering=transaction_amount',
+            'ordering=description',
+            'account=not-a-uuid',
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/v1/transactions/?{query}').status_code, 400)
+
+    def test_scope_columns_count_towards_the_index(self):
+        # Staff assigned to a branch filter on it too, through the branch-led indexes
+        self.assertEqual(self.get_amounts(f'type={self.transaction_type.id}'), [500, 50, 5])
+        self.assertEqual(self.get_amounts('ordering=transaction_amount'), [5, 50, 500])
+        # Customers are scoped by their accounts, and no account index leads into the status
+        self.client.force_authenticate(Transaction.objects.get(transaction_amount=50).initiated_by)
+        self.assertEqual(self.get_amounts(''), [50])
+        self.assertEqual(self.client.get(f'/api/v1/transactions/?status={self.status.id}').status_code, 400)
+
+    def test_list_is_paged_with_a_cursor(self):
+        response = self.client.get('/api/v1/transactions/?page_size=2')
+        self.assertEqual([item['transaction_amount'] for item in response.data['results']], [500, 50])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['transaction_amount'] for item in response.data['results']], [5])
+        self.assertIsNone(response.data['next'])
+
+
+class CustomerOverviewTests(CoreAPITestCase):
+    """
+    The customer 360 endpoint costs the same number of queries however much the customer holds.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.customer = self.create_entity('customer')
+
+    def add_account(self):
+        account = Account.objects.create(
+            account_name='Savings', owner=self.customer, account_type=self.account_type,
+            branch=self.branch, status=self.status, created_by=self.staff, current_balance=100,
+        )
+        Transaction.objects.create(
+            sender_account=account, recipient_account=account, transaction_type=self.transaction_type,
+            initiated_by=self.customer, transaction_amount=10, status=self.status, branch=self.branch,
+            transaction_direction=self.direction,
+        )
+        Loan.objects.create(
+            to_account=account, interest_rate=5, disbursement_date='2024-01-01', loan_amount=1000,
+            current_loan_amount=400, status=self.status,
+        )
+
+    def get_overview(self, query='refresh=true'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/v1/base-entities/{self.customer.id}/overview/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_query_count_is_fixed(self):
+        self.add_account()
+        single, _ = self.get_overview()
+        for _ in range(4):
+            self.add_account()
+        many, data = self.get_overview()
+        self.assertEqual(single, many)
+        self.assertEqual(len(data['accounts']), 5)
+        self.assertEqual(data['total_balance'], 500)
+        self.assertEqual(data['outstanding_loan_amount'], 2000)
+        self.assertEqual(len(data['recent_transactions']), 5)
+        self.assertEqual(data['unread_notifications'], 0)
+
+    def test_transactions_are_limited(self):
+        for _ in range(3):
+            self.add_account()
+        _, data = self.get_overview('refresh=true&transactions=2')
+        self.assertEqual(len(data['recent_transactions']), 2)
+        for value in ('-5', 'many'):
+            response = self.client.get(f'/api/v1/base-entities/{self.customer.id}/overview/?transactions={value}')
+            self.assertEqual(response.status_code, 400)
+
+    def test_cached_overview_skips_the_aggregation(self):
+        self.add_account()
+        uncached, first = self.get_overview('')
+        cached, second = self.get_overview('')
+        self.assertEqual(cached, 1)
+        self.assertLess(cached, uncached)
+        self.assertEqual(first, second)
+
+    def test_customers_only_see_their_own_overview(self):
+        self.client.force_authenticate(self.customer)
+        self.get_overview()
+        other = self.create_entity('other')
+        response = self.client.get(f'/api/v1/base-entities/{other.id}/overview/')
+        self.assertEqual(response.status_code, 403)
+
+
+class BatchTests(CoreAPITestCase):
+    """
+    Batched sub-requests run in-process as the batch's user, optionally in one transaction.
+    """
+
+    def batch(self, requests, atomic=False):
+        return self.client.post('/api/v1/batch/', {'requests': requests, 'atomic': atomic}, format='json')
+
+    def test_sub_requests_share_the_authenticated_user(self):
+        self.create_accounts(2)
+        account = Account.objects.first()
+        response = self.batch([
+            {'method': 'GET', 'path': '/api/v1/accounts/?fields=id'},
+            {'method': 'GET', 'path': f'/api/v1/accounts/{account.id}/'},
+            {'method': 'GET', 'path': '/api/v1/nowhere/'},
+            {'method': 'POST', 'path': '/api/v1/batch/', 'body': {}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status'] for item in response.data], [200, 200, 404, 400])
+        self.assertEqual(len(response.data[0]['body']), 2)
+        self.assertEqual(response.data[1]['body']['account_name'], account.account_name)
+        self.assertIn('ETag', response.data[1]['headers'])
+
+    def test_customers_stay_scoped_inside_a_batch(self):
+        self.create_accounts(2)
+        customer = Account.objects.first().owner
+        self.client.force_authenticate(customer)
+        response = self.batch([{'method': 'GET', 'path': '/api/v1/accounts/'}])
+        self.assertEqual(len(response.data[0]['body']), 1)
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        requests = [
+            {'method': 'POST', 'path': '/api/v1/statuses/', 'body': {'status_name': 'Frozen'}},
+            {'method': 'POST', 'path': '/api/v1/statuses/', 'body': {}},
+            {'method': 'GET', 'path': '/api/v1/statuses/'},
+        ]
+        response = self.batch(requests, atomic=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['status'] for item in response.data], [201, 400])
+        self.assertFalse(Status.objects.filter(status_name='Frozen').exists())
+
+        response = self.batch(requests)
+        self.assertEqual([item['status'] for item in response.data], [201, 400, 200])
+        self.assertTrue(Status.objects.filter(status_name='Frozen').exists())
+
+
+class InterestAccrualTests(CoreAPITestCase):
+    """
+    Daily interest is computed for all positions at once and credited idempotently.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.account_type.interest_rate = 3.65
+        self.account_type.save()
+        self.create_accounts(3)
+        self.run_date = datetime.date(2024, 6, 10)
+        Account.objects.update(created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+
+    def test_accounts_earn_one_day_of_interest_once(self):
+        Account.objects.update(current_balance=1000)
+        run_accrual(self.run_date)
+        run_accrual(self.run_date)
+        self.assertEqual(set(Account.objects.values_list('current_balance', flat=True)), {1000.1})
+        credits = Transaction.objects.filter(transaction_type__type_name='Interest Crediting')
+        self.assertEqual(credits.count(), 3)
+        run = InterestAccrualRun.objects.get(run_date=self.run_date)
+        self.assertEqual((run.positions, round(run.total_interest, 2)), (3, 0.3))
+        self.assertIsNotNone(run.completed_at)
+
+    def test_days_since_each_position_last_accrued_are_accrued(self):
+        Account.objects.update(current_balance=1000, interest_accrued_through=self.run_date - datetime.timedelta(days=3))
+        _, chunks = plan_accrual(self.run_date)
+        self.assertEqual([round(amount, 6) for amount in chunks[0]['amounts']], [0.3] * 3)
+
+    def test_days_missed_by_a_failed_chunk_are_caught_up(self):
+        Account.objects.update(current_balance=1000)
+        # The day's chunk is planned but never applied
+        plan_accrual(self.run_date)
+        run_accrual(self.run_date + datetime.timedelta(days=1))
+        self.assertEqual(set(Account.objects.values_list('current_balance', flat=True)), {1000.2})
+
+    def test_days_without_a_balance_earn_nothing_later(self):
+        Account.objects.update(current_balance=0)
+        run_accrual(self.run_date)
+        Account.objects.update(current_balance=1000)
+        run_accrual(self.run_date + datetime.timedelta(days=2))
+        self.assertEqual(set(Account.objects.values_list('current_balance', flat=True)), {1000.2})
+
+    def test_query_count_does_not_grow_with_positions(self):
+        Account.objects.update(current_balance=1000)
+        with CaptureQueriesContext(connection) as first:
+            run_accrual(self.run_date)
+        self.create_accounts(5)
+        Account.objects.update(created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc), current_balance=1000)
+        with CaptureQueriesContext(connection) as second:
+            run_accrual(self.run_date + datetime.timedelta(days=1))
+        self.assertEqual(Transaction.objects.filter(external_reference__startswith='interest:').count(), 11)
+        self.assertLessEqual(len(second), len(first))
+
+    def test_investments_credit_their_funding_account(self):
+        self.account_type.interest_rate = 0
+        self.account_type.save()
+        account = Account.objects.first()
+        investment = Investment.objects.create(
+            from_account=account, interest_rate=7.3, principal=5000, status=self.status,
+        )
+        Investment.objects.filter(pk=investment.pk).update(created_at=account.created_at)
+        balance = account.current_balance
+        run_accrual(self.run_date)
+        account.refresh_from_db()
+        self.assertEqual(account.current_balance, balance + 1)
+        crediting = InvestmentCrediting.objects.get(investment=investment)
+        self.assertEqual(crediting.interest_earned, 1)
+        self.assertEqual(crediting.transaction.recipient_account, account)
+
+    def test_a_year_of_daily_accrual_earns_the_annual_interest(self):
+        self.account_type.interest_rate = 0
+        self.account_type.save()
+        account = Account.objects.first()
+        investment = Investment.objects.create(from_account=account, interest_rate=2, principal=1000, status=self.status)
+        Investment.objects.filter(pk=investment.pk).update(created_at=account.created_at)
+        balance = account.current_balance
+        for day in range(365):
+            run_accrual(self.run_date + datetime.timedelta(days=day))
+        account.refresh_from_db()
+        self.assertAlmostEqual(account.current_balance, balance + 20)
+        self.assertAlmostEqual(sum(InvestmentCrediting.objects.values_list('interest_earned', flat=True)), 20)
+        # 0.0548 a day is credited as 5 or 6 cents, never less than it has earned
+        self.assertEqual(set(InvestmentCrediting.objects.values_list('interest_earned', flat=True)), {0.05, 0.06})
+
+    def test_conditional_get_sees_credited_balances(self):
+        Account.objects.update(current_balance=1000)
+        account = Account.objects.first()
+        url = f'/api/v1/accounts/{account.id}/'
+        listed, retrieved = self.client.get('/api/v1/accounts/'), self.client.get(url)
+        run_accrual(self.run_date)
+        self.assertEqual(self.client.get('/api/v1/accounts/', HTTP_IF_NONE_MATCH=listed['ETag']).status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=retrieved['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['current_balance'], 1000.1)
+
+
+class InvestmentProcessingTests(CoreAPITestCase):
+    """
+    Investments with a crediting schedule are credited on their dates and repaid at maturity.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_accounts(2)
+        self.investor, self.holder = Account.objects.order_by('account_name')
+        Account.objects.update(current_balance=20000)
+        made = datetime.date(2024, 1, 31)
+        self.investment = Investment.objects.create(
+            from_account=self.investor, to_account=self.holder, interest_rate=7.3, principal=12000, status=self.status,
+            crediting_frequency='Monthly', maturity_date=datetime.date(2024, 4, 30),
+            next_event_date=next_event_date(made, 'Monthly', datetime.date(2024, 4, 30)),
+        )
+        Investment.objects.filter(pk=self.investment.pk).update(
+            created_at=datetime.datetime(2024, 1, 31, 12, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_interest_is_credited_monthly_and_principal_returned_at_maturity(self):
+        self.assertEqual(self.investment.next_event_date, datetime.date(2024, 2, 29))
+        self.assertEqual(run_processing(datetime.date(2024, 2, 28)).investments_due, 0)
+        run_processing(datetime.date(2024, 2, 29))
+        run = run_processing(datetime.date(2024, 2, 29))
+        self.assertEqual((run.investments_due, run.processed, run.progress), (1, 1, 1.0))
+        self.investment.refresh_from_db()
+        self.assertEqual(self.investment.next_event_date, datetime.date(2024, 3, 31))
+        self.assertEqual(list(InvestmentCrediting.objects.values_list('interest_earned', flat=True)), [69.6])
+
+        run_processing(datetime.date(2024, 3, 31))
+        run = run_processing(datetime.date(2024, 5, 2))
+        self.assertEqual((run.processed, run.matured, run.principal_returned), (1, 1, 12000))
+        self.assertAlmostEqual(run.interest_credited, 72)
+        self.investment.refresh_from_db()
+        self.assertEqual((self.investment.last_credited_on, self.investment.next_event_date), (datetime.date(2024, 4, 30), None))
+        self.assertIsNotNone(self.investment.closed_at)
+        self.assertAlmostEqual(Account.objects.get(pk=self.investor.pk).current_balance, 20000 + 69.6 + 74.4 + 72 + 12000)
+        self.assertEqual(Account.objects.get(pk=self.holder.pk).current_balance, 8000)
+        self.assertEqual(
+            Transaction.objects.filter(transaction_type__type_name='Investment Maturity', recipient_account=self.investor).count(), 1,
+        )
+
+    def test_daily_accrual_leaves_scheduled_investments_alone(self):
+        run_accrual(datetime.date(2024, 2, 10))
+        self.assertFalse(InvestmentCrediting.objects.exists())
+        self.assertEqual(InvestmentProcessingRun.objects.count(), 0)
+
+    def test_api_schedules_the_next_event(self):
+        data = {'from_account': str(self.investor.pk), 'interest_rate': 5, 'principal': 100}
+        response = self.client.post('/api/v1/investments/', {**data, 'crediting_frequency': 'Quarterly'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        today = timezone.localdate()
+        self.assertEqual(Investment.objects.get(pk=response.data['id']).next_event_date, next_event_date(today, 'Quarterly', None))
+        response = self.client.post('/api/v1/investments/', {**data, 'crediting_frequency': 'Hourly'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/investments/', data, format='json')
+        self.assertIsNone(Investment.objects.get(pk=response.data['id']).next_event_date)
+
+
+class LoanTestCase(CoreAPITestCase):
+    """
+    Adds a customer account, monthly 12-month terms and a variable interest rate type.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_accounts(1)
+        self.account = Account.objects.get()
+        self.rate_type = InterestRateType.objects.create(type_name='Variable', is_variable=True, index_rate=2)
+        self.terms = LoanTerms.objects.create(term_duration=12, payment_frequency='Monthly', late_fee=10, prepayment_penalty=0)
+
+    def create_loan(self, disbursement_date=datetime.date(2024, 1, 31), **extra_fields):
+        fields = {'to_account': self.account, 'interest_rate': 12, 'loan_amount': 1200, **extra_fields}
+        return Loan.objects.create(
+            disbursement_date=disbursement_date, current_loan_amount=fields['loan_amount'], loan_term=self.terms,
+            status=self.status, **fields
+        )
+
+
+class LoanScheduleTests(LoanTestCase):
+    """
+    Amortization schedules are built with NumPy, stored per loan and served from the cache.
+    """
+
+    def test_fixed_schedule_amortizes_the_loan(self):
+        loan = self.create_loan()
+        response = self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+        self.assertEqual(response.status_code, 200)
+        rows = response.data['schedule']
+        self.assertEqual(response.data['installment'], 106.62)
+        self.assertEqual(response.data['total_interest'], 79.42)
+        self.assertEqual([row['due_date'] for row in rows[:3]], ['2024-02-29', '2024-03-31', '2024-04-30'])
+        self.assertAlmostEqual(sum(row['principal'] for row in rows), 1200)
+        self.assertEqual(rows[-1]['balance'], 0)
+
+        # The loan and its inputs, whose digest keys the cached schedule
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+
+    def test_schedule_is_rebuilt_when_the_loan_changes(self):
+        loan = self.create_loan()
+        self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+        self.client.patch(f'/api/v1/loans/{loan.pk}/', {'interest_rate': 0}, format='json')
+        response = self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+        self.assertEqual(response.data['installment'], 100)
+        self.assertEqual(LoanSchedule.objects.count(), 1)
+
+    def test_schedule_is_rebuilt_when_the_loan_changes_outside_the_api(self):
+        loan = self.create_loan()
+        self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+        Loan.objects.filter(pk=loan.pk).update(interest_rate=0)
+        response = self.client.get(f'/api/v1/loans/{loan.pk}/schedule/')
+        self.assertEqual(response.data['installment'], 100)
+
+    def test_rate_change_only_moves_future_installments(self):
+        self.terms.interest_rate_type = self.rate_type
+        self.terms.save()
+        today = datetime.date.today()
+        loan = self.create_loan(disbursement_date=today - datetime.timedelta(days=100))
+        first = self.client.get(f'/api/v1/loans/{loan.pk}/schedule/').data['schedule']
+
+        self.rate_type.index_rate = 6
+        self.rate_type.save()
+        self.assertEqual(regenerate_schedules(), 1)
+        second = self.client.get(f'/api/v1/loans/{loan.pk}/schedule/').data['schedule']
+        due = sum(1 for row in first if row['due_date'] <= today.isoformat())
+        self.assertEqual(first[:due], second[:due])
+        self.assertGreater(second[due]['interest'], first[due]['interest'])
+        self.assertEqual(second[-1]['balance'], 0)
+
+    def test_bulk_regeneration_runs_a_fixed_number_of_queries(self):
+        for _ in range(3):
+            self.create_loan()
+        with self.assertNumQueries(8):
+            regenerate_schedules()
+        for _ in range(5):
+            self.create_loan()
+        with self.assertNumQueries(8):
+            self.assertEqual(regenerate_schedules(), 8)
+
+
+class RepaymentTests(LoanTestCase):
+    """
+    Payments are split into interest and principal along the schedule and update their loan.
+    """
+
+    def pay(self, loan, amount):
+        return self.client.post('/api/v1/loan-payments/', {'loan': str(loan.pk), 'payment_amount': amount}, format='json')
+
+    def test_payments_settle_interest_before_principal(self):
+        loan = self.create_loan()
+        response = self.pay(loan, 5)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['interest_paid'], response.data['principal_paid']), (5, 0))
+        response = self.pay(loan, 101.62)
+        self.assertEqual((response.data['interest_paid'], response.data['principal_paid']), (7, 94.62))
+        loan.refresh_from_db()
+        self.assertAlmostEqual(loan.current_loan_amount, 1105.38)
+        self.assertFalse(loan.fully_paid)
+        self.assertEqual(self.pay(loan, -1).status_code, 400)
+
+    def test_payments_to_repaid_loans_are_refused(self):
+        loan = self.create_loan(loan_amount=100)
+        self.assertEqual(self.pay(loan, 200).status_code, 201)
+        loan.refresh_from_db()
+        self.assertTrue(loan.fully_paid)
+        response = self.pay(loan, 50)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('loan', response.data)
+        self.assertEqual(LoanPayment.objects.filter(loan=loan).count(), 1)
+
+    def test_repayment_files_close_paid_off_loans_once(self):
+        loans = [self.create_loan() for _ in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'repayments.csv')
+            with open(path, 'w') as file:
+                file.write('loan,amount,reference\n')
+                for loan in loans[:2]:
+                    for period in range(12):
+                        file.write(f'{loan.pk},106.62,{loan.pk}-{period}\n')
+                file.write(f'{loans[2].pk},500,{loans[2].pk}-0\n')
+                file.write('not-a-loan,10,x\n')
+
+            with self.assertNumQueries(25):
+                result = process_repayment_files([path])
+            self.assertEqual((result['recorded'], result['skipped'], len(result['rejected'])), (25, 0, 1))
+            result = process_repayment_files([path])
+            self.assertEqual((result['recorded'], result['skipped']), (0, 25))
+
+        self.assertEqual(LoanPayment.objects.count(), 25)
+        paid_off = Loan.objects.filter(fully_paid=True)
+        self.assertEqual(set(paid_off), set(loans[:2]))
+        self.assertEqual(set(paid_off.values_list('current_loan_amount', flat=True)), {0})
+        self.assertAlmostEqual(
+            sum(LoanPayment.objects.filter(loan=loans[0]).values_list('interest_paid', flat=True)), 79.42,
+        )
+        loans[2].refresh_from_db()
+        # Four installments (42.28 interest) plus period 5's interest of 8.16
+        self.assertAlmostEqual(loans[2].current_loan_amount, 1200 - (500 - 42.28 - 8.16))
+
+    def process_rows(self, rows):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'repayments.csv')
+            with open(path, 'w') as file:
+                file.write('loan,amount,reference\n')
+                for index, (loan, amount) in enumerate(rows):
+                    file.write(f'{loan.pk},{amount},row-{index}\n')
+            with mock.patch('core.repayments.REPAYMENT_CHUNK_SIZE', 2):
+                return process_repayment_files([path])
+
+    def test_repayment_files_keep_each_loans_rows_in_one_chunk(self):
+        repaid, other, closed, last = (self.create_loan(loan_amount=100) for _ in range(4))
+        Loan.objects.filter(pk=closed.pk).update(closed_at=timezone.now())
+        result = self.process_rows([(repaid, 200), (other, 10), (repaid, 5), (closed, 10), (last, 10)])
+        self.assertEqual((result['recorded'], result['amount']), (4, 225))
+        self.assertEqual([error for _, _, error in result['rejected']], [f'No open loan {closed.pk}.'])
+        self.assertTrue(Loan.objects.get(pk=repaid.pk).fully_paid)
+
+    def test_repayment_files_reject_chunks_whose_loans_closed_meanwhile(self):
+        closing, other = self.create_loan(), self.create_loan()
+
+        def close_first_loan(payments):
+            if payments[0].loan_id == closing.pk:
+                Loan.objects.filter(pk=closing.pk).update(closed_at=timezone.now())
+            return record_payments(payments)
+
+        with mock.patch('core.repayments.record_payments', side_effect=close_first_loan):
+            result = self.process_rows([(closing, 10), (closing, 10), (other, 10)])
+        self.assertEqual((result['recorded'], result['amount']), (1, 10))
+        self.assertEqual([line for _, line, _ in result['rejected']], [2, 3])
+        self.assertFalse(LoanPayment.objects.filter(loan=closing).exists())
+
+
+class AutoDebitTests(LoanTestCase):
+    """
+    The collection run debits due installments in bulk and leaves short accounts for a retry.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bank = Account.objects.create(
+            account_name='Bank', account_number=settings.BANK_ACCOUNT_NUMBER, current_balance=0,
+            branch=self.branch, status=self.status,
+        )
+        self.create_accounts(3)
+        self.borrowers = list(Account.objects.exclude(pk__in=[self.account.pk, self.bank.pk]))
+        Account.objects.filter(pk__in=[account.pk for account in self.borrowers[:2]]).update(current_balance=1000)
+        Account.objects.filter(pk=self.borrowers[2].pk).update(current_balance=50)
+        self.loans = [self.create_loan(to_account=account) for account in self.borrowers]
+        self.run_date = datetime.date(2024, 2, 29)
+
+    def test_due_installments_are_collected_once(self):
+        run = run_collection(self.run_date)
+        self.assertEqual(LoanInstallment.objects.filter(due_date=self.run_date).count(), 3)
+        self.assertEqual((run.loans_due, run.collected, run.insufficient_funds), (3, 2, 1))
+        self.assertAlmostEqual(run.amount_collected, 213.24)
+
+        self.bank.refresh_from_db()
+        self.assertAlmostEqual(self.bank.current_balance, 213.24)
+        balances = dict(Account.objects.filter(pk__in=[a.pk for a in self.borrowers]).values_list('pk', 'current_balance'))
+        self.assertAlmostEqual(balances[self.borrowers[0].pk], 1000 - 106.62)
+        self.assertEqual(balances[self.borrowers[2].pk], 50)
+        payment = LoanPayment.objects.get(loan=self.loans[0])
+        self.assertEqual((payment.interest_paid, payment.principal_paid), (12, 94.62))
+        self.assertEqual(payment.transaction.recipient_account, self.bank)
+
+        run_collection(self.run_date)
+        self.assertEqual(LoanPayment.objects.count(), 2)
+
+    def test_arrears_are_collected_with_the_next_installment(self):
+        run_collection(self.run_date)
+        Account.objects.filter(pk=self.borrowers[2].pk).update(current_balance=500)
+        run = run_collection(datetime.date(2024, 3, 31))
+        self.assertEqual(run.collected, 3)
+        self.assertAlmostEqual(LoanPayment.objects.get(loan=self.loans[2]).payment_amount, 2 * 106.62)
+
+    def test_short_loans_are_retried_later(self):
+        plan_collection(self.run_date)
+        ids = [str(loan.pk) for loan in self.loans]
+        with mock.patch.object(collect_installments_chunk, 'apply_async') as retry:
+            self.assertEqual(collect_installments_chunk(self.run_date.isoformat(), ids), 2)
+        retry.assert_called_once_with(
+            (self.run_date.isoformat(), [str(self.loans[2].pk)], 1), countdown=COLLECTION_RETRY_DELAY,
+        )
+        with mock.patch.object(collect_installments_chunk, 'apply_async') as retry:
+            collect_installments_chunk(self.run_date.isoformat(), [str(self.loans[2].pk)], attempt=3)
+        retry.assert_not_called()
+        self.assertEqual(CollectionRun.objects.get(run_date=self.run_date).abandoned, 1)
+
+
+class DelinquencyTests(LoanTestCase):
+    """
+    Overdue loans are bucketed by their oldest unpaid installment and charged each late fee once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bank = Account.objects.create(
+            account_name='Bank', account_number=settings.BANK_ACCOUNT_NUMBER, current_balance=0,
+            branch=self.branch, status=self.status,
+        )
+        self.terms.late_fee = 10
+        self.terms.save()
+        self.behind, self.partly_paid = self.create_loan(), self.create_loan()
+        regenerate_schedules()
+        record_payments([LoanPayment(loan=self.partly_paid, payment_amount=106.62)])
+
+    def test_loans_are_bucketed_and_charged_once(self):
+        balance = Account.objects.get(pk=self.account.pk).current_balance
+        self.assertEqual(run_assessment(datetime.date(2024, 4, 1))['30-59'], 1)
+        run_assessment(datetime.date(2024, 4, 1))
+
+        behind = LoanDelinquency.objects.get(loan=self.behind)
+        self.assertEqual((behind.bucket, behind.days_past_due, behind.installments_overdue), ('30-59', 32, 2))
+        self.assertEqual(behind.oldest_due_date, datetime.date(2024, 2, 29))
+        self.assertAlmostEqual(behind.amount_overdue, 213.24)
+        self.assertEqual(behind.fees_charged, 20)
+        partly_paid = LoanDelinquency.objects.get(loan=self.partly_paid)
+        self.assertEqual((partly_paid.bucket, partly_paid.days_past_due, partly_paid.fees_charged), ('1-29', 1, 10))
+
+        fees = Transaction.objects.filter(transaction_type__type_name='Fee')
+        self.assertEqual(sorted(fees.values_list('transaction_amount', flat=True)), [10, 20])
+        self.assertAlmostEqual(Account.objects.get(pk=self.account.pk).current_balance, balance - 30)
+        self.assertAlmostEqual(Account.objects.get(pk=self.bank.pk).current_balance, 30)
+
+    def test_loans_that_catch_up_become_current(self):
+        run_assessment(datetime.date(2024, 4, 1))
+        record_payments([LoanPayment(loan=self.behind, payment_amount=213.24)])
+        summary = run_assessment(datetime.date(2024, 4, 15))
+        self.assertEqual(LoanDelinquency.objects.get(loan=self.behind).bucket, 'current')
+        self.assertEqual(summary, {'current': 1, '1-29': 1, '30-59': 0, '60-89': 0, '90+': 0})
+
+        summary = run_assessment(datetime.date(2024, 7, 1))
+        behind = LoanDelinquency.objects.get(loan=self.behind)
+        self.assertEqual((behind.bucket, behind.installments_overdue, behind.fees_charged), ('60-89', 3, 50))
+        self.assertEqual(behind.oldest_due_date, datetime.date(2024, 4, 30))
+        self.assertEqual(summary['90+'], 1)
+
+
+class PortfolioTests(LoanTestCase):
+    """
+    The portfolio summary is answered from a rollup kept up to date on origination and repayment.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.personal, self.mortgage = LoanType.objects.create(type_name='Personal'), LoanType.objects.create(type_name='Mortgage')
+        self.terms.interest_rate_type = self.rate_type
+        self.terms.save()
+        self.loans = [
+            self.create_loan(loan_type=self.personal),
+            self.create_loan(loan_type=self.personal, loan_amount=600, interest_rate=6),
+            self.create_loan(loan_type=self.mortgage, loan_amount=3000, interest_rate=4),
+        ]
+
+    def rollup(self):
+        return sorted(PortfolioRollup.objects.values_list(
+            'key', 'loan_count', 'exposure', 'outstanding_principal', 'rate_weight',
+        ))
+
+    def test_originations_are_rolled_up(self):
+        response = self.client.get('/api/v1/portfolio/', {'group_by': 'loan_type'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {
+            'loan_count': 3, 'exposure': 4800, 'outstanding_principal': 4800, 'weighted_average_rate': 6.25,
+        })
+        personal, mortgage = sorted(response.data['groups'], key=lambda group: group['loan_type_name'], reverse=True)
+        self.assertEqual((personal['loan_type'], personal['loan_count'], personal['weighted_average_rate']), (self.personal.pk, 2, 10))
+        self.assertEqual((mortgage['exposure'], mortgage['weighted_average_rate']), (3000, 4))
+
+        incremental = self.rollup()
+        self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_repayments_reduce_the_rollup(self):
+        payments = record_payments([
+            LoanPayment(loan=self.loans[0], payment_amount=106.62),
+            LoanPayment(loan=self.loans[1], payment_amount=700),
+        ])
+        response = self.client.get('/api/v1/portfolio/', {'loan_type': self.personal.pk, 'group_by': 'branch,interest_rate_type'})
+        group, = response.data['groups']
+        self.assertEqual((group['branch'], group['interest_rate_type_name']), (self.branch.pk, 'Variable'))
+        self.assertEqual(group['loan_count'], 1)
+        self.assertEqual(group['exposure'], 1200)
+        self.assertAlmostEqual(group['outstanding_principal'], 1200 - payments[0].principal_paid)
+
+        incremental = self.rollup()
+        rebuild_rollups()
+        for before, after in zip(incremental, self.rollup()):
+            self.assertEqual(before[:3], after[:3])
+            self.assertAlmostEqual(before[3], after[3])
+            self.assertAlmostEqual(before[4], after[4])
+
+    def test_summary_reads_only_the_rollup(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/v1/portfolio/', {'group_by': 'branch,loan_type,interest_rate_type'})
+        self.assertEqual(self.client.get('/api/v1/portfolio/', {'group_by': 'region'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/portfolio/', {'branch': 'main'}).status_code, 400)
+        response = self.client.get('/api/v1/portfolio/', {'loan_type': 'none'})
+        self.assertEqual(response.data['totals']['loan_count'], 0)
+
+
+class OriginationTests(LoanTestCase):
+    """
+    Loans are disbursed and recorded in one transaction, with a query count independent of the batch size.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bank = Account.objects.create(
+            account_name='Bank', account_number=settings.BANK_ACCOUNT_NUMBER, current_balance=100000,
+            branch=self.branch, status=self.status,
+        )
+
+    def loan_data(self, **extra_fields):
+        return {
+            'to_account': str(self.account.pk), 'loan_amount': 1200, 'interest_rate': 12,
+            'disbursement_date': '2024-01-31', 'loan_term': str(self.terms.pk), **extra_fields,
+        }
+
+    def originate(self, count, **extra_fields):
+        return self.client.post('/api/v1/loans/batch/', {'loans': [self.loan_data(**extra_fields)] * count}, format='json')
+
+    def test_loan_is_disbursed_from_the_bank(self):
+        response = self.client.post('/api/v1/loans/', self.loan_data(), format='json')
+        self.assertEqual(response.status_code, 201)
+        loan = Loan.objects.get()
+        self.assertEqual((loan.current_loan_amount, loan.from_account_id), (1200, self.bank.pk))
+        self.assertEqual(loan.transaction.transaction_type.type_name, 'Loan Disbursement')
+        self.assertEqual(Account.objects.get(pk=self.bank.pk).current_balance, 98800)
+        self.assertEqual(Account.objects.get(pk=self.account.pk).current_balance, self.account.current_balance + 1200)
+        self.assertEqual(Asset.objects.get().updated_balance, 1200)
+        self.assertEqual(Audit.objects.filter(action='Loan originated').count(), 1)
+        self.assertEqual(PortfolioRollup.objects.get().loan_count, 1)
+
+    def test_batch_costs_a_constant_number_of_queries(self):
+        self.originate(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.originate(2).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            response = self.originate(50)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual((response.data['count'], response.data['total']), (50, 60000))
+        self.assertEqual(Account.objects.get(pk=self.bank.pk).current_balance, 100000 - 53 * 1200)
+        self.assertEqual(Asset.objects.order_by('updated_balance').last().updated_balance, 53 * 1200)
+        self.assertEqual(PortfolioRollup.objects.get().loan_count, 53)
+
+    def test_bank_account_is_debited_after_the_borrowers_are_locked(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.originate(2).status_code, 201)
+        queries = [query['sql'] for query in context.captured_queries]
+        borrowers = next(i for i, sql in enumerate(queries) if sql.startswith('SELECT') and str(self.account.pk).replace('-', '') in sql)
+        bank = next(i for i, sql in enumerate(queries) if sql.startswith('UPDATE "core_account"'))
+        self.assertLess(borrowers, bank)
+        self.assertIn('"current_balance" >=', queries[bank])
+        transaction = Transaction.objects.filter(transaction_type__type_name='Loan Disbursement').order_by('created_at').last()
+        self.assertEqual(transaction.sender_account_balance, 100000 - 2400)
+
+    def test_batch_is_all_or_nothing(self):
+        response = self.originate(90)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Loan.objects.exists())
+        self.assertEqual(Account.objects.get(pk=self.bank.pk).current_balance, 100000)
+
+        response = self.client.post('/api/v1/loans/batch/', {'loans': [
+            self.loan_data(), self.loan_data(to_account='00000000-0000-0000-0000-000000000000'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('to_account', response.data['loans'][1])
+        self.assertFalse(Transaction.objects.filter(transaction_type__type_name='Loan Disbursement').exists())
+
+
+class CashFlowProjectionTests(LoanTestCase):
+    """
+    Expected cash flows are projected per branch and day from schedules and investments, and cached per run date.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.loan = self.create_loan()
+        made = datetime.datetime(2024, 1, 31, 12, tzinfo=datetime.timezone.utc)
+        scheduled = Investment.objects.create(
+            from_account=self.account, interest_rate=7.3, principal=12000, status=self.status,
+            crediting_frequency='Monthly', maturity_date=datetime.date(2024, 4, 30),
+            last_credited_on=datetime.date(2024, 2, 29), next_event_date=datetime.date(2024, 3, 31),
+        )
+        daily = Investment.objects.create(from_account=self.account, interest_rate=10, principal=3650, status=self.status)
+        Investment.objects.filter(pk__in=[scheduled.pk, daily.pk]).update(created_at=made)
+
+    def project(self, **params):
+        response = self.client.get('/api/v1/cash-flow-projection/', {'run_date': '2024-03-15', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_flows_are_projected_per_branch_and_day(self):
+        data = self.project()
+        self.assertEqual((data['start'], data['end']), ('2024-03-16', '2025-03-15'))
+        self.assertEqual(data['totals'], {
+            'loan_repayments': 1172.8, 'investment_interest': 511.4, 'investment_maturities': 12000,
+        })
+        self.assertAlmostEqual(data['net'], 1172.8 - 511.4 - 12000)
+        branch, = data['branches']
+        self.assertEqual((branch['branch'], branch['branch_name']), (self.branch.pk, 'Main'))
+        days = {day['date']: day for day in branch['days']}
+        self.assertEqual(len(days), 365)
+        self.assertEqual(days['2024-03-31']['loan_repayments'], 106.62)
+        self.assertEqual(days['2024-03-31']['investment_interest'], 75.4)
+        self.assertEqual(days['2024-04-30']['investment_maturities'], 12000)
+        self.assertEqual(self.project(branch='0')['branches'], [])
+
+    def test_payments_ahead_of_schedule_reduce_the_inflows(self):
+        record_payments([LoanPayment(loan=self.loan, payment_amount=300)])
+        data = self.project(refresh='true')
+        self.assertAlmostEqual(data['totals']['loan_repayments'], 979.42)
+        days = {day['date']: day for day in data['branches'][0]['days']}
+        self.assertEqual(days['2024-03-31']['loan_repayments'], 0)
+        self.assertAlmostEqual(days['2024-04-30']['loan_repayments'], 19.86)
+
+    def test_projection_is_cached_until_schedules_are_rebuilt(self):
+        self.project()
+        with CaptureQueriesContext(connection) as cached:
+            self.project()
+        self.assertLessEqual(len(cached), 1)
+
+        Loan.objects.filter(pk=self.loan.pk).update(interest_rate=0)
+        regenerate_schedules()
+        self.assertAlmostEqual(self.project()['totals']['loan_repayments'], 1100)
+
+    def test_projection_is_refreshed_by_repayments_and_originations(self):
+        repayments = self.project()['totals']['loan_repayments']
+        record_payments([LoanPayment(loan=self.loan, payment_amount=300)])
+        self.assertAlmostEqual(self.project()['totals']['loan_repayments'], 979.42)
+
+        Account.objects.create(
+            account_name='Bank', account_number=settings.BANK_ACCOUNT_NUMBER, current_balance=100000,
+            branch=self.branch, status=self.status,
+        )
+        originate_loans([Loan(
+            to_account=self.account, loan_amount=1200, interest_rate=12, loan_term=self.terms,
+            disbursement_date=datetime.date(2024, 1, 31),
+        )])
+        self.assertAlmostEqual(self.project()['totals']['loan_repayments'], 979.42 + repayments)
+
+
+class CreditLossSimulationTests(LoanTestCase):
+    """
+    Credit losses are simulated reproducibly per branch, in one process or a pool.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.risky = LoanType.objects.create(type_name='Unsecured', default_probability=0.2, recovery_rate=0.5)
+        for _ in range(20):
+            self.create_loan(loan_type=self.risky, interest_rate=0)
+        self.create_loan(loan_type=LoanType.objects.create(type_name='Secured', default_probability=0, recovery_rate=1))
+
+    def simulate(self, **options):
+        return simulate_credit_losses(scenarios=3000, seed=7, workers=1, as_of=datetime.date(2024, 1, 31), **options)
+
+    def test_losses_follow_the_assumptions(self):
+        result = self.simulate()
+        self.assertEqual(result['loans'], 21)
+        branch, = result['branches']
+        self.assertEqual((branch['branch'], branch['exposure']), (self.branch.pk, 24000 + 1272))
+        # 20 loans of 1200, each with a 20% chance of losing half
+        self.assertAlmostEqual(branch['expected_loss'], 20 * 1200 * 0.2 * 0.5, delta=150)
+        self.assertLess(branch['expected_loss'], branch['var_99'])
+        self.assertLessEqual(branch['var_99'], branch['expected_shortfall_99'])
+        self.assertEqual(result['portfolio']['expected_loss'], branch['expected_loss'])
+        self.assertGreater(self.simulate(stress=2)['portfolio']['expected_loss'], branch['expected_loss'])
+
+    def test_results_depend_on_the_seed_only(self):
+        result = self.simulate()
+        self.assertEqual(self.simulate(), result)
+        self.assertEqual(simulate_credit_losses(
+            scenarios=3000, seed=7, workers=2, as_of=datetime.date(2024, 1, 31),
+        ), result)
+        self.assertNotEqual(simulate_credit_losses(
+            scenarios=3000, seed=8, workers=1, as_of=datetime.date(2024, 1, 31),
+        )['portfolio'], result['portfolio'])
+
+    def test_task_runs_in_the_worker_process(self):
+        with mock.patch('os.cpu_count', return_value=4), mock.patch('core.credit_risk.ProcessPoolExecutor') as pool:
+            result = simulate_credit_losses_task.apply(kwargs={'scenarios': 3000, 'seed': 7, 'as_of': '2024-01-31'}).get()
+        pool.assert_not_called()
+        self.assertEqual(result, self.simulate())
+
+    def test_daemonic_processes_do_not_start_a_pool(self):
+        with mock.patch('billiard.current_process', return_value=mock.Mock(daemon=True)), \
+                mock.patch('core.credit_risk.ProcessPoolExecutor') as pool:
+            result = simulate_credit_losses(scenarios=3000, seed=7, workers=2, as_of=datetime.date(2024, 1, 31))
+        pool.assert_not_called()
+        self.assertEqual(result, self.simulate())
+
+    def test_management_command(self):
+        output = StringIO()
+        call_command('simulate_credit_losses', scenarios=500, workers=1, as_of=datetime.date(2024, 1, 31), stdout=output)
+        self.assertIn('Simulated 500 scenarios over 21 loans (seed 0).', output.getvalue())
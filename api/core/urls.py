@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     AccountViewSet, AccountTypeViewSet, AnnualBalanceViewSet,
@@ -8,7 +8,8 @@ from .views import (
     InvestmentViewSet, InvestmentCreditingViewSet, InvestmentTypeViewSet,
     LiabilityViewSet, LiabilityTypeViewSet, LoanViewSet, LoanPaymentViewSet,
     LoanTermsViewSet, LoanTypeViewSet, StatusViewSet, TransactionViewSet,
-    TransactionDirectionViewSet, TransactionTypeViewSet
+    TransactionDirectionViewSet, TransactionTypeViewSet, ReferenceDataView, MetricsView,
+    SlowQueryView, BatchView, PortfolioSummaryView, CashFlowProjectionView,
 )
 
 router = DefaultRouter()
@@ -40,5 +41,11 @@ router.register(r'transaction-directions', TransactionDirectionViewSet)
 router.register(r'transaction-types', TransactionTypeViewSet)
 
 urlpatterns = [
+    path('reference-data/', ReferenceDataView.as_view(), name='reference_data'),
+    re_path(r'^metrics/?$', MetricsView.as_view(), name='metrics'),
+    path('slow-queries/', SlowQueryView.as_view(), name='slow_queries'),
+    path('batch/', BatchView.as_view(), name='batch'),
+    path('portfolio/', PortfolioSummaryView.as_view(), name='portfolio_summary'),
+    path('cash-flow-projection/', CashFlowProjectionView.as_view(), name='cash_flow_projection'),
     path('', include(router.urls)),
 ]
@@ -1,14 +1,30 @@
-from datetime import timezone
+from datetime import date, timezone
+from uuid import UUID
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from .permissions import IsStaffOrRelated
+from .batch import run_subrequest
+from .cache import REFERENCE_DATA_TIMEOUT, reference_cache_key
+from .filters import Filter, IndexedCursorPagination, IndexedFilterBackend, parse_timestamp
+from .metrics import registry, render_prometheus
+from .portfolio import PORTFOLIO_DIMENSIONS, portfolio_summary
+from .projections import get_projection
+from .schedules import get_schedule
+from .slow_queries import top_offenders
+from .tasks import regenerate_loan_schedules
+from .mixins import (
+    ConditionalGetMixin, ReferenceDataCacheMixin, RowScopingMixin, SparseFieldsetMixin, StreamingListMixin,
+)
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.db import transaction as db_transaction
 
-from accounts.serializers import BaseEntitySerializer, BranchSerializer, EntityTypeSerializer
-from accounts.models import BaseEntity, Branch
+from accounts.models import BaseEntity, Branch, EntityType, Role
+from accounts.serializers import EntityTypeSerializer, RoleSerializer
 
 from .models import (
     Account, AccountType, AnnualBalance, Asset, AssetType, Audit,
@@ -24,15 +40,44 @@ from .serializers import (
     IncomeSerializer, IncomeTypeSerializer, InterestRateTypeSerializer,
     InvestmentSerializer, InvestmentCreditingSerializer, InvestmentTypeSerializer,
     LiabilitySerializer, LiabilityTypeSerializer, LoanSerializer, LoanPaymentSerializer,
-    LoanTermsSerializer, LoanTypeSerializer, StatusSerializer, TransactionSerializer,
-    TransactionDirectionSerializer, TransactionTypeSerializer
+    LoanBatchSerializer, LoanTermsSerializer, LoanTypeSerializer, StatusSerializer, TransactionSerializer,
+    TransactionDirectionSerializer, TransactionTypeSerializer,
+    AccountDetailSerializer, AccountTypeDetailSerializer, AnnualBalanceDetailSerializer,
+    AssetDetailSerializer, AssetTypeDetailSerializer, CapitalDetailSerializer,
+    CapitalTypeDetailSerializer, ExpenseDetailSerializer, ExpenseTypeDetailSerializer,
+    IncomeDetailSerializer, IncomeTypeDetailSerializer, InvestmentDetailSerializer,
+    InvestmentCreditingDetailSerializer, InvestmentTypeDetailSerializer,
+    LiabilityDetailSerializer, LiabilityTypeDetailSerializer, LoanDetailSerializer,
+    LoanPaymentDetailSerializer, LoanTermsDetailSerializer, TransactionDetailSerializer,
+    BatchSerializer,
 )
 
 
-class BaseViewSet(ModelViewSet):
+class BaseViewSet(ConditionalGetMixin, RowScopingMixin, StreamingListMixin, SparseFieldsetMixin, ModelViewSet):
     """
     Base ViewSet that provides a standardized delete response.
+
+    Subclasses may set `read_serializer_class` to a serializer that nests the
+    related objects; it is used for the `list` and `retrieve` actions, while
+    writes keep using `serializer_class`. The nested fields must be covered by
+    the viewset's `select_related` so that a list costs a constant number of
+    queries.
+
+    Responses can be narrowed with `?fields=` and `?expand=`; see `SparseFieldsetMixin`.
+    Large lists can be streamed with `?stream=true`; see `StreamingListMixin`.
+    Rows are limited to what the user may see in SQL; see `RowScopingMixin`.
+    Unchanged resources are answered with a 304; see `ConditionalGetMixin`.
     """
+    read_serializer_class = None
+
+    def get_serializer_class(self):
+        """
+        Use the nested read serializer for `list` and `retrieve` when one is set.
+        """
+        if self.action in ('list', 'retrieve') and self.read_serializer_class is not None:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
     def destroy(self, request, *args, **kwargs):
         """
         Handle deletion of an object and return a standardized response.
@@ -68,86 +113,13 @@ class AccountViewSet(BaseViewSet):
     Return a specific Account instance by its ID with detailed information including related fields.
     """
     queryset = Account.objects.select_related(
-        'owner', 'account_type', 'branch', 'status'
+        'owner__branch', 'owner__entity_type', 'account_type', 'branch', 'status', 'created_by'
     ).all()
     serializer_class = AccountSerializer
+    read_serializer_class = AccountDetailSerializer
     permission_classes = [IsAuthenticated, IsStaffOrRelated]
-
-    # def get_queryset(self):
-    #     user = self.request.user
-    #     if user.is_staff:
-    #         return self.queryset
-    #     elif user.is_anonymous:
-    #         return self.queryset.none()
-    #     else:
-    #         return self.queryset.filter(owner=user)
-
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Account instance and include full details of the related 'owner', 'account_type',
-        'branch', and 'status' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including 'owner', 'account_type', 'branch', and 'status'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        data['owner'] = self.get_base_entity_details(instance.owner)
-        data['account_type'] = AccountTypeSerializer(instance.account_type).data if instance.account_type else None
-        data['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-        data['status'] = StatusSerializer(instance.status).data if instance.status else None
-        data['created_by'] = BaseEntitySerializer(instance.created_by).data if instance.created_by else None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Account instances and include full details of the related 'owner', 'account_type',
-        'branch', and 'status' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'owner', 'account_type', 'branch', and 'status' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        for item, instance in zip(data, queryset):
-            item['owner'] = self.get_base_entity_details(instance.owner)
-            item['account_type'] = AccountTypeSerializer(instance.account_type).data if instance.account_type else None
-            item['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-            item['status'] = StatusSerializer(instance.status).data if instance.status else None
-            item['created_by'] = BaseEntitySerializer(instance.created_by).data if instance.created_by else None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
+    owner_fields = ('owner',)
+    branch_field = 'branch'
 
     def perform_create(self, serializer):
         """
@@ -158,7 +130,7 @@ class AccountViewSet(BaseViewSet):
         """
         serializer.save(created_by=self.request.user)
 
-class AccountTypeViewSet(BaseViewSet):
+class AccountTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing AccountType instances.
 
@@ -168,74 +140,11 @@ class AccountTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific AccountType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = AccountType.objects.select_related('updated_by').all()
+    queryset = AccountType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = AccountTypeSerializer
+    read_serializer_class = AccountTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific AccountType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all AccountType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 class AnnualBalanceViewSet(BaseViewSet):
     """
     A viewset for viewing and editing `AnnualBalance` instances.
@@ -248,68 +157,9 @@ class AnnualBalanceViewSet(BaseViewSet):
     """
     queryset = AnnualBalance.objects.select_related('branch').all()
     serializer_class = AnnualBalanceSerializer
+    read_serializer_class = AnnualBalanceDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific `AnnualBalance` instance and include full details of the related `branch` field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the `branch` field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'branch' field if it exists
-        if instance.branch:
-            data['branch'] = self.get_branch_details(instance.branch)
-        else:
-            data['branch'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all `AnnualBalance` instances and include full details of the related `branch` field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the `branch` field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of `branch` field for each item
-        for item, instance in zip(data, queryset):
-            if instance.branch:
-                item['branch'] = self.get_branch_details(instance.branch)
-            else:
-                item['branch'] = None
-        return Response(data)
-
-    def get_branch_details(self, branch):
-        """
-        Retrieve detailed information of a `Branch`.
-
-        Args:
-            branch: The `Branch` instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the `Branch`.
-        """
-        if branch:
-            serializer = BranchSerializer(branch)
-            return serializer.data
-        return None
-
 class AssetViewSet(BaseViewSet):
     """
     A viewset for viewing and editing `Asset` instances.
@@ -322,98 +172,11 @@ class AssetViewSet(BaseViewSet):
     """
     queryset = Asset.objects.select_related('branch', 'asset_type', 'status').all()
     serializer_class = AssetSerializer
+    read_serializer_class = AssetDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific `Asset` instance and include full details of related fields like `branch`, `asset_type`, and `status`.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize related fields if they exist
-        data['branch'] = self.get_branch_details(instance.branch)
-        data['asset_type'] = self.get_asset_type_details(instance.asset_type)
-        data['status'] = self.get_status_details(instance.status)
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all `Asset` instances and include full details of related fields like `branch`, `asset_type`, and `status` for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['branch'] = self.get_branch_details(instance.branch)
-            item['asset_type'] = self.get_asset_type_details(instance.asset_type)
-            item['status'] = self.get_status_details(instance.status)
-        return Response(data)
-
-    def get_branch_details(self, branch):
-        """
-        Retrieve detailed information of a `Branch`.
-
-        Args:
-            branch: The `Branch` instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the `Branch`.
-        """
-        if branch:
-            serializer = BranchSerializer(branch)
-            return serializer.data
-        return None
-
-    def get_asset_type_details(self, asset_type):
-        """
-        Retrieve detailed information of an `AssetType`.
-
-        Args:
-            asset_type: The `AssetType` instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the `AssetType`.
-        """
-        if asset_type:
-            serializer = AssetTypeSerializer(asset_type)
-            return serializer.data
-        return None
-
-    def get_status_details(self, status):
-        """
-        Retrieve detailed information of a `Status`.
-
-        Args:
-            status: The `Status` instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the `Status`.
-        """
-        if status:
-            serializer = StatusSerializer(status)
-            return serializer.data
-        return None
-
 
-class AssetTypeViewSet(BaseViewSet):
+class AssetTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing AssetType instances.
 
@@ -423,74 +186,11 @@ class AssetTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific AssetType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = AssetType.objects.select_related('updated_by').all()
+    queryset = AssetType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = AssetTypeSerializer
+    read_serializer_class = AssetTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific AssetType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all AssetType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 
 class AuditViewSet(BaseViewSet):
     queryset = Audit.objects.all()
@@ -509,53 +209,11 @@ class CapitalViewSet(BaseViewSet):
     """
     queryset = Capital.objects.select_related('branch', 'capital_type', 'status').all()
     serializer_class = CapitalSerializer
+    read_serializer_class = CapitalDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Capital instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Add full details of related fields
-        data['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-        data['capital_type'] = CapitalTypeSerializer(instance.capital_type).data if instance.capital_type else None
-        data['status'] = StatusSerializer(instance.status).data if instance.status else None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Capital instances and include full details of the related fields for each item.
 
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['branch'] = BranchSerializer(instance.branch).data if instance.branch else None
-            item['capital_type'] = CapitalTypeSerializer(instance.capital_type).data if instance.capital_type else None
-            item['status'] = StatusSerializer(instance.status).data if instance.status else None
-        return Response(data)
-
-
-class CapitalTypeViewSet(BaseViewSet):
+class CapitalTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing CapitalType instances.
 
@@ -565,74 +223,11 @@ class CapitalTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific CapitalType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = CapitalType.objects.select_related('updated_by').all()
+    queryset = CapitalType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = CapitalTypeSerializer
+    read_serializer_class = CapitalTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific CapitalType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all CapitalType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 
 class ExpenseViewSet(BaseViewSet):
     """
@@ -646,68 +241,11 @@ class ExpenseViewSet(BaseViewSet):
     """
     queryset = Expense.objects.select_related('expense_type').all()
     serializer_class = ExpenseSerializer
+    read_serializer_class = ExpenseDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Expense instance and include full details of the related 'expense_type' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
 
-        Returns:
-            Response: The serialized data including the 'expense_type' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'expense_type' field
-        if instance.expense_type:
-            data['expense_type'] = self.get_expense_type_details(instance.expense_type)
-        else:
-            data['expense_type'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Expense instances and include full details of the related 'expense_type' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'expense_type' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'expense_type' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.expense_type:
-                item['expense_type'] = self.get_expense_type_details(instance.expense_type)
-            else:
-                item['expense_type'] = None
-        return Response(data)
-
-    def get_expense_type_details(self, expense_type):
-        """
-        Retrieve detailed information of an ExpenseType.
-
-        Args:
-            expense_type: The ExpenseType instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the ExpenseType.
-        """
-        serializer = ExpenseTypeSerializer(expense_type)
-        return serializer.data
-
-
-class ExpenseTypeViewSet(BaseViewSet):
+class ExpenseTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing ExpenseType instances.
 
@@ -717,74 +255,11 @@ class ExpenseTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific ExpenseType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = ExpenseType.objects.select_related('updated_by').all()
+    queryset = ExpenseType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = ExpenseTypeSerializer
+    read_serializer_class = ExpenseTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific ExpenseType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all ExpenseType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 
 class IncomeViewSet(BaseViewSet):
     """
@@ -798,56 +273,11 @@ class IncomeViewSet(BaseViewSet):
     """
     queryset = Income.objects.select_related('income_type').all()
     serializer_class = IncomeSerializer
+    read_serializer_class = IncomeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Income instance and include full details of the related 'income_type'.
 
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data of the Income instance including 'income_type'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        if instance.income_type:
-            data['income_type'] = IncomeTypeSerializer(instance.income_type).data
-        else:
-            data['income_type'] = None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Income instances and include full details of the related 'income_type' for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'income_type' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'income_type' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.income_type:
-                item['income_type'] = IncomeTypeSerializer(instance.income_type).data
-            else:
-                item['income_type'] = None
-        return Response(data)
-
-
-class IncomeTypeViewSet(BaseViewSet):
+class IncomeTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing IncomeType instances.
 
@@ -859,142 +289,41 @@ class IncomeTypeViewSet(BaseViewSet):
     """
     queryset = IncomeType.objects.select_related('updated_by').all()
     serializer_class = IncomeTypeSerializer
+    read_serializer_class = IncomeTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific IncomeType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data of the IncomeType instance including 'updated_by'.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-
-        if instance.updated_by:
-            data['updated_by'] = BaseEntitySerializer(instance.updated_by).data
-        else:
-            data['updated_by'] = None
-
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all IncomeType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including 'updated_by' for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = BaseEntitySerializer(instance.updated_by).data
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-class InterestRateTypeViewSet(BaseViewSet):
+class InterestRateTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     queryset = InterestRateType.objects.all()
     serializer_class = InterestRateTypeSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-class InvestmentViewSet(BaseViewSet):
-    """
-    A viewset for viewing and editing Investment instances.
-
-    list:
-    Return a list of all Investment instances with detailed information about the related 'from_account', 'to_account', and 'investment_type' fields.
-
-    retrieve:
-    Return a specific Investment instance by its ID with detailed information about the related 'from_account', 'to_account', and 'investment_type' fields.
-    """
-    queryset = Investment.objects.select_related(
-        'from_account', 'to_account', 'investment_type', 'status', 'transaction'
-    ).all()
-    serializer_class = InvestmentSerializer
-    permission_classes = [IsAuthenticated, IsStaffOrRelated]
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Investment instance and include full details of the related 'from_account', 'to_account', 'investment_type', 'status', and 'transaction' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize related fields with full details
-        data['from_account'] = self.get_account_details(instance.from_account)
-        data['to_account'] = self.get_account_details(instance.to_account)
-        data['investment_type'] = InvestmentTypeSerializer(instance.investment_type).data
-        data['status'] = StatusSerializer(instance.status).data
-        data['transaction'] = TransactionSerializer(instance.transaction).data if instance.transaction else None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
+    def perform_update(self, serializer):
         """
-        List all Investment instances and include full details of the related 'from_account', 'to_account', 'investment_type', 'status', and 'transaction' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the related fields for each item.
+        Save the rate type and, once committed, rebuild the schedules of the loans on it.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['from_account'] = self.get_account_details(instance.from_account)
-            item['to_account'] = self.get_account_details(instance.to_account)
-            item['investment_type'] = InvestmentTypeSerializer(instance.investment_type).data
-            item['status'] = StatusSerializer(instance.status).data
-            item['transaction'] = TransactionSerializer(instance.transaction).data if instance.transaction else None
-        return Response(data)
+        instance = serializer.save()
+        db_transaction.on_commit(lambda: regenerate_loan_schedules.delay(rate_type_id=instance.pk))
 
-    def get_account_details(self, account):
-        """
-        Retrieve detailed information of an Account, including its related fields.
+class InvestmentViewSet(BaseViewSet):
+    """
+    A viewset for viewing and editing Investment instances.
 
-        Args:
-            account: The Account instance to be detailed.
+    list:
+    Return a list of all Investment instances with detailed information about the related 'from_account', 'to_account', and 'investment_type' fields.
 
-        Returns:
-            dict: The serialized data of the Account including related fields.
-        """
-        if account:
-            serializer = AccountSerializer(account)
-            data = serializer.data
-            # Assume that Account has related fields 'owner', 'account_type', 'branch', and 'status'
-            data['owner'] = BaseEntitySerializer(account.owner).data if account.owner else None
-            data['account_type'] = AccountTypeSerializer(account.account_type).data if account.account_type else None
-            data['branch'] = BranchSerializer(account.branch).data if account.branch else None
-            data['status'] = StatusSerializer(account.status).data if account.status else None
-            return data
-        return None
+    retrieve:
+    Return a specific Investment instance by its ID with detailed information about the related 'from_account', 'to_account', and 'investment_type' fields.
+    """
+    queryset = Investment.objects.select_related(
+        'from_account__owner', 'from_account__account_type', 'from_account__branch', 'from_account__status',
+        'to_account__owner', 'to_account__account_type', 'to_account__branch', 'to_account__status',
+        'investment_type', 'status', 'transaction'
+    ).all()
+    serializer_class = InvestmentSerializer
+    read_serializer_class = InvestmentDetailSerializer
+    permission_classes = [IsAuthenticated, IsStaffOrRelated]
+    account_fields = ('from_account', 'to_account')
+    branch_field = 'from_account__branch'
 
 
 class InvestmentCreditingViewSet(BaseViewSet):
@@ -1008,77 +337,17 @@ class InvestmentCreditingViewSet(BaseViewSet):
     Return a specific InvestmentCrediting instance by its ID with detailed information about the related 'transaction', 'status', and 'investment' fields.
     """
     queryset = InvestmentCrediting.objects.select_related(
-        'transaction', 'status', 'investment'
+        'transaction', 'status', 'investment__from_account', 'investment__to_account',
+        'investment__investment_type', 'investment__status'
     ).all()
     serializer_class = InvestmentCreditingSerializer
+    read_serializer_class = InvestmentCreditingDetailSerializer
     permission_classes = [IsAuthenticated, IsStaffOrRelated]
+    account_fields = ('investment__from_account', 'investment__to_account')
+    branch_field = 'investment__from_account__branch'
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific InvestmentCrediting instance and include full details of the related 'transaction', 'status', and 'investment' fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize related fields with full details
-        data['transaction'] = TransactionSerializer(instance.transaction).data
-        data['status'] = StatusSerializer(instance.status).data
-        data['investment'] = self.get_investment_details(instance.investment)
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all InvestmentCrediting instances and include full details of the related 'transaction', 'status', and 'investment' fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['transaction'] = TransactionSerializer(instance.transaction).data
-            item['status'] = StatusSerializer(instance.status).data
-            item['investment'] = self.get_investment_details(instance.investment)
-        return Response(data)
-
-    def get_investment_details(self, investment):
-        """
-        Retrieve detailed information of an Investment, including its related fields.
-
-        Args:
-            investment: The Investment instance to be detailed.
 
-        Returns:
-            dict: The serialized data of the Investment including related fields.
-        """
-        if investment:
-            serializer = InvestmentSerializer(investment)
-            data = serializer.data
-            # Assume that Investment has related fields 'from_account', 'to_account', 'investment_type', and 'status'
-            data['from_account'] = AccountSerializer(investment.from_account).data if investment.from_account else None
-            data['to_account'] = AccountSerializer(investment.to_account).data if investment.to_account else None
-            data['investment_type'] = InvestmentTypeSerializer(investment.investment_type).data if investment.investment_type else None
-            data['status'] = StatusSerializer(investment.status).data if investment.status else None
-            return data
-        return None
-
-
-class InvestmentTypeViewSet(BaseViewSet):
+class InvestmentTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing InvestmentType instances.
 
@@ -1088,74 +357,11 @@ class InvestmentTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific InvestmentType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = InvestmentType.objects.select_related('updated_by').all()
+    queryset = InvestmentType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = InvestmentTypeSerializer
+    read_serializer_class = InvestmentTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific InvestmentType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all InvestmentType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            # Assume that BaseEntity has 'branch' and 'entity_type' related fields
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 
 class LiabilityViewSet(BaseViewSet):
     """
@@ -1169,53 +375,11 @@ class LiabilityViewSet(BaseViewSet):
     """
     queryset = Liability.objects.select_related('branch', 'liability_type', 'status').all()
     serializer_class = LiabilitySerializer
+    read_serializer_class = LiabilityDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Liability instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize related fields
-        data['branch'] = BranchSerializer(instance.branch).data
-        data['liability_type'] = LiabilityTypeSerializer(instance.liability_type).data
-        data['status'] = StatusSerializer(instance.status).data
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Liability instances and include full details of the related fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['branch'] = BranchSerializer(instance.branch).data
-            item['liability_type'] = LiabilityTypeSerializer(instance.liability_type).data
-            item['status'] = StatusSerializer(instance.status).data
-        return Response(data)
-
 
-class LiabilityTypeViewSet(BaseViewSet):
+class LiabilityTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     """
     A viewset for viewing and editing LiabilityType instances.
 
@@ -1225,73 +389,11 @@ class LiabilityTypeViewSet(BaseViewSet):
     retrieve:
     Return a specific LiabilityType instance by its ID with detailed information including the related 'updated_by' field.
     """
-    queryset = LiabilityType.objects.select_related('updated_by').all()
+    queryset = LiabilityType.objects.select_related('updated_by__branch', 'updated_by__entity_type').all()
     serializer_class = LiabilityTypeSerializer
+    read_serializer_class = LiabilityTypeDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific LiabilityType instance and include full details of the related 'updated_by' field.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including the 'updated_by' field.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize the 'updated_by' field if it exists
-        if instance.updated_by:
-            data['updated_by'] = self.get_base_entity_details(instance.updated_by)
-        else:
-            data['updated_by'] = None
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all LiabilityType instances and include full details of the related 'updated_by' field for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including the 'updated_by' field for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of 'updated_by' field for each item
-        for item, instance in zip(data, queryset):
-            if instance.updated_by:
-                item['updated_by'] = self.get_base_entity_details(instance.updated_by)
-            else:
-                item['updated_by'] = None
-        return Response(data)
-
-    def get_base_entity_details(self, base_entity):
-        """
-        Retrieve detailed information of a BaseEntity, including its related fields.
-
-        Args:
-            base_entity: The BaseEntity instance to be detailed.
-
-        Returns:
-            dict: The serialized data of the BaseEntity including related fields.
-        """
-        if base_entity:
-            serializer = BaseEntitySerializer(base_entity)
-            data = serializer.data
-            data['branch'] = BranchSerializer(base_entity.branch).data if base_entity.branch else None
-            data['entity_type'] = EntityTypeSerializer(base_entity.entity_type).data if base_entity.entity_type else None
-            return data
-        return None
-
 
 class LoanViewSet(BaseViewSet):
     """
@@ -1305,56 +407,46 @@ class LoanViewSet(BaseViewSet):
     """
     queryset = Loan.objects.select_related('from_account', 'to_account', 'loan_type', 'status', 'loan_term', 'transaction').all()
     serializer_class = LoanSerializer
+    read_serializer_class = LoanDetailSerializer
     permission_classes = [IsAuthenticated, IsStaffOrRelated]
+    account_fields = ('from_account', 'to_account')
+    branch_field = 'to_account__branch'
 
-    def retrieve(self, request, *args, **kwargs):
+    @action(detail=True, methods=['get'], url_path='schedule')
+    def schedule(self, request, pk=None):
         """
-        Retrieve a specific Loan instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
+        Return the loan's amortization schedule: every period's due date, payment,
+        principal, interest and remaining balance.
 
-        Returns:
-            Response: The serialized data including related fields.
+        Schedules are stored per loan and cached; one is rebuilt when the loan, its terms
+        or, for variable-rate loans, the index rate have changed since it was built.
         """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        # Serialize related fields
-        data['from_account'] = AccountSerializer(instance.from_account).data
-        data['to_account'] = AccountSerializer(instance.to_account).data
-        data['loan_type'] = LoanTypeSerializer(instance.loan_type).data
-        data['status'] = StatusSerializer(instance.status).data
-        data['loan_term'] = LoanTermsSerializer(instance.loan_term).data
-        data['transaction'] = TransactionSerializer(instance.transaction).data if instance.transaction else None
+        loan = self.get_object()
+        data = get_schedule(loan.pk)
+        if data is None:
+            return Response(
+                {"error": "The loan needs terms with a supported payment frequency to build a schedule."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         return Response(data)
 
-    def list(self, request, *args, **kwargs):
+    @action(detail=False, methods=['post'], url_path='batch', permission_classes=[IsAuthenticated, IsAdminUser])
+    def originate_batch(self, request):
         """
-        List all Loan instances and include full details of the related fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
+        Originate up to 10,000 loans at once, e.g. for a portfolio purchase.
 
-        Returns:
-            Response: A list of serialized data including related fields for each item.
+        The body is `{"loans": [{"to_account", "loan_amount", "interest_rate",
+        "disbursement_date", "loan_type", "loan_term"}, ...]}`. Either every loan is
+        disbursed from the bank's account and recorded, or none is.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        # Add full details of related fields for each item
-        for item, instance in zip(data, queryset):
-            item['from_account'] = AccountSerializer(instance.from_account).data
-            item['to_account'] = AccountSerializer(instance.to_account).data
-            item['loan_type'] = LoanTypeSerializer(instance.loan_type).data
-            item['status'] = StatusSerializer(instance.status).data
-            item['loan_term'] = LoanTermsSerializer(instance.loan_term).data
-            item['transaction'] = TransactionSerializer(instance.transaction).data if instance.transaction else None
-        return Response(data)
+        serializer = LoanBatchSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        loans = serializer.save()
+        return Response(
+            {'count': len(loans), 'total': round(sum(loan.loan_amount for loan in loans), 2),
+             'loans': [str(loan.pk) for loan in loans]},
+            status=status.HTTP_201_CREATED,
+        )
 
 
 class LoanPaymentViewSet(BaseViewSet):
@@ -1369,50 +461,11 @@ class LoanPaymentViewSet(BaseViewSet):
     """
     queryset = LoanPayment.objects.select_related('paid_by', 'transaction', 'status', 'loan').all()
     serializer_class = LoanPaymentSerializer
+    read_serializer_class = LoanPaymentDetailSerializer
     permission_classes = [IsAuthenticated, IsStaffOrRelated]
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific LoanPayment instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        data['paid_by'] = BaseEntitySerializer(instance.paid_by).data
-        data['transaction'] = TransactionSerializer(instance.transaction).data
-        data['status'] = StatusSerializer(instance.status).data
-        data['loan'] = LoanSerializer(instance.loan).data
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all LoanPayment instances and include full details of the related fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        for item, instance in zip(data, queryset):
-            item['paid_by'] = BaseEntitySerializer(instance.paid_by).data
-            item['transaction'] = TransactionSerializer(instance.transaction).data
-            item['status'] = StatusSerializer(instance.status).data
-            item['loan'] = LoanSerializer(instance.loan).data
-        return Response(data)
+    owner_fields = ('paid_by',)
+    account_fields = ('loan__to_account',)
+    branch_field = 'loan__to_account__branch'
 
 
 class LoanTermsViewSet(BaseViewSet):
@@ -1427,56 +480,23 @@ class LoanTermsViewSet(BaseViewSet):
     """
     queryset = LoanTerms.objects.select_related('entity', 'loan_type', 'interest_rate_type').all()
     serializer_class = LoanTermsSerializer
+    read_serializer_class = LoanTermsDetailSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific LoanTerms instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        data['entity'] = BaseEntitySerializer(instance.entity).data
-        data['loan_type'] = LoanTypeSerializer(instance.loan_type).data
-        data['interest_rate_type'] = InterestRateTypeSerializer(instance.interest_rate_type).data
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
+    def perform_update(self, serializer):
         """
-        List all LoanTerms instances and include full details of the related fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including related fields for each item.
+        Save the terms and, once committed, rebuild the schedules of the loans using them.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        for item, instance in zip(data, queryset):
-            item['entity'] = BaseEntitySerializer(instance.entity).data
-            item['loan_type'] = LoanTypeSerializer(instance.loan_type).data
-            item['interest_rate_type'] = InterestRateTypeSerializer(instance.interest_rate_type).data
-        return Response(data)
+        instance = serializer.save()
+        db_transaction.on_commit(lambda: regenerate_loan_schedules.delay(loan_term_id=instance.pk))
 
 
-class LoanTypeViewSet(BaseViewSet):
+class LoanTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     queryset = LoanType.objects.all()
     serializer_class = LoanTypeSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-class StatusViewSet(BaseViewSet):
+class StatusViewSet(ReferenceDataCacheMixin, BaseViewSet):
     queryset = Status.objects.all()
     serializer_class = StatusSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
@@ -1493,69 +513,26 @@ class TransactionViewSet(BaseViewSet):
     """
     queryset = Transaction.objects.select_related('sender_account', 'recipient_account', 'transaction_type', 'initiated_by', 'status', 'branch', 'transaction_direction').all()
     serializer_class = TransactionSerializer
+    read_serializer_class = TransactionDetailSerializer
     permission_classes = [IsAuthenticated, IsStaffOrRelated]
-
-    # def get_queryset(self):
-    #     user = self.request.user
-    #     if user.is_staff:
-    #         return self.queryset
-    #     elif user.is_anonymous:
-    #         return self.queryset.none()
-    #     else:
-    #         return self.queryset.filter(
-    #             sender_account__owner=user
-    #         ) | self.queryset.filter(
-    #             recipient_account__owner=user
-    #         )
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Retrieve a specific Transaction instance and include full details of the related fields.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: The serialized data including related fields.
-        """
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        data = serializer.data
-        data['sender_account'] = AccountSerializer(instance.sender_account).data
-        data['recipient_account'] = AccountSerializer(instance.receiver_account).data
-        data['transaction_type'] = TransactionTypeSerializer(instance.transaction_type).data
-        data['initiated_by'] = BaseEntitySerializer(instance.initiated_by).data
-        data['status'] = StatusSerializer(instance.status).data
-        data['branch'] = BranchSerializer(instance.branch).data
-        data['transaction_direction'] = TransactionDirectionSerializer(instance.transaction_direction).data
-        return Response(data)
-
-    def list(self, request, *args, **kwargs):
-        """
-        List all Transaction instances and include full details of the related fields for each item.
-
-        Args:
-            request: The HTTP request.
-            *args: Variable length argument list.
-            **kwargs: Arbitrary keyword arguments.
-
-        Returns:
-            Response: A list of serialized data including related fields for each item.
-        """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        for item, instance in zip(data, queryset):
-            item['sender_account'] = AccountSerializer(instance.sender_account).data
-            item['recipient_account'] = AccountSerializer(instance.receiver_account).data
-            item['transaction_type'] = TransactionTypeSerializer(instance.transaction_type).data
-            item['initiated_by'] = BaseEntitySerializer(instance.initiated_by).data
-            item['status'] = StatusSerializer(instance.status).data
-            item['branch'] = BranchSerializer(instance.branch).data
-            item['transaction_direction'] = TransactionDirectionSerializer(instance.transaction_direction).data
-        return Response(data)
+    account_fields = ('sender_account', 'recipient_account')
+    branch_field = 'branch'
+    filter_backends = [IndexedFilterBackend]
+    pagination_class = IndexedCursorPagination
+    filter_params = {
+        'account': Filter(('sender_account', 'recipient_account'), '', UUID),
+        'type': Filter(('transaction_type',), '', int),
+        'direction': Filter(('transaction_direction',), '', int),
+        'status': Filter(('status',), '', int),
+        'branch': Filter(('branch',), '', int),
+        'external_reference': Filter(('external_reference',), '', str),
+        'created_after': Filter(('created_at',), '__gte', parse_timestamp),
+        'created_before': Filter(('created_at',), '__lt', parse_timestamp),
+        'min_amount': Filter(('transaction_amount',), '__gte', float),
+        'max_amount': Filter(('transaction_amount',), '__lte', float),
+    }
+    ordering_fields = ('created_at', 'transaction_amount')
+    default_ordering = '-created_at'
 
     def create(self, request, *args, **kwargs):
         """
@@ -1598,7 +575,7 @@ class TransactionViewSet(BaseViewSet):
                     {"error": "Sender and receiver accounts cannot be the same."},
                     status=status.HTTP_400_BAD_REQUEST)
 
-            if user.entity_type.name == 'Individual':
+            if user.entity_type.type_name == 'Individual':
                 if sender_account.owner != user:
                     return Response(
                         {"error": "You are not authorized to make transactions from this account."},
@@ -1624,7 +601,7 @@ class TransactionViewSet(BaseViewSet):
                     return Response(
                         {"error": "Insufficient funds in sender account."},
                         status=status.HTTP_400_BAD_REQUEST)
-                if user.entity_type.name == 'Individual':
+                if user.entity_type.type_name == 'Individual':
                     if sender_account.owner != transaction_type.type_name == 'Withdrawal':
                         return Response(
                             {"error": "You are not authorized to make transactions from this account."},
@@ -1668,12 +645,12 @@ class TransactionViewSet(BaseViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class TransactionDirectionViewSet(BaseViewSet):
+class TransactionDirectionViewSet(ReferenceDataCacheMixin, BaseViewSet):
     queryset = TransactionDirection.objects.all()
     serializer_class = TransactionDirectionSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-class TransactionTypeViewSet(BaseViewSet):
+class TransactionTypeViewSet(ReferenceDataCacheMixin, BaseViewSet):
     queryset = TransactionType.objects.all()
     serializer_class = TransactionTypeSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
@@ -1707,3 +684,164 @@ class BalanceSheetView(APIView):
             },
         }
         return Response(balance_sheet)
+
+
+class ReferenceDataView(APIView):
+    """
+    Return every reference table in a single cached response.
+
+    The bundle is keyed by the versions of all the tables it contains, so a write to any
+    of them (see `core.cache`) makes the next request rebuild it. Non-staff users only get
+    the tables in `public_tables`, as the other tables' own viewsets are staff-only.
+    """
+    permission_classes = [IsAuthenticated]
+    public_tables = {'entity-types', 'roles'}
+    tables = {
+        'statuses': (Status, StatusSerializer),
+        'transaction-types': (TransactionType, TransactionTypeSerializer),
+        'transaction-directions': (TransactionDirection, TransactionDirectionSerializer),
+        'loan-types': (LoanType, LoanTypeSerializer),
+        'interest-rate-types': (InterestRateType, InterestRateTypeSerializer),
+        'account-types': (AccountType, AccountTypeSerializer),
+        'asset-types': (AssetType, AssetTypeSerializer),
+        'capital-types': (CapitalType, CapitalTypeSerializer),
+        'liability-types': (LiabilityType, LiabilityTypeSerializer),
+        'income-types': (IncomeType, IncomeTypeSerializer),
+        'expense-types': (ExpenseType, ExpenseTypeSerializer),
+        'investment-types': (InvestmentType, InvestmentTypeSerializer),
+        'entity-types': (EntityType, EntityTypeSerializer),
+        'roles': (Role, RoleSerializer),
+    }
+
+    def get(self, request):
+        key = reference_cache_key([model for model, _ in self.tables.values()], 'bundle')
+        data = cache.get(key)
+        if data is None:
+            data = {
+                name: serializer_class(model.objects.order_by('pk'), many=True).data
+                for name, (model, serializer_class) in self.tables.items()
+            }
+            cache.set(key, data, REFERENCE_DATA_TIMEOUT)
+        if not request.user.is_staff:
+            data = {name: rows for name, rows in data.items() if name in self.public_tables}
+        return Response(data)
+
+
+class MetricsView(APIView):
+    """
+    Expose the request metrics of every worker in the Prometheus text format.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            render_prometheus(registry.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+class SlowQueryView(APIView):
+    """
+    Return the slowest queries from the slow-query log, ranked by total time.
+
+    Accepts `?limit=` (default 20). The log is only written when `SLOW_QUERY_LOG_ENABLED` is set.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(top_offenders(limit))
+
+
+class PortfolioSummaryView(APIView):
+    """
+    Summarize the open loan portfolio: loan count, exposure (amount originated),
+    outstanding principal and outstanding-weighted average interest rate.
+
+    Accepts `?group_by=` with a comma-separated list of `branch`, `loan_type` and
+    `interest_rate_type` (default `branch`), and the same names as filters to drill down,
+    e.g. `?branch=3&group_by=loan_type`; `none` selects loans without a value. Answers
+    come from the precomputed portfolio rollup, not from the loans themselves.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        group_by = [name for name in request.query_params.get('group_by', 'branch').split(',') if name]
+        unknown = [name for name in group_by if name not in PORTFOLIO_DIMENSIONS]
+        if unknown:
+            return Response(
+                {"error": f"Cannot group by {', '.join(unknown)}; choose from {', '.join(PORTFOLIO_DIMENSIONS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        filters = {}
+        for name in PORTFOLIO_DIMENSIONS:
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            if value == 'none':
+                filters[name] = None
+            elif value.isdigit():
+                filters[name] = int(value)
+            else:
+                return Response({"error": f"{name} must be an id or 'none'."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(portfolio_summary(group_by, filters))
+
+
+class CashFlowProjectionView(APIView):
+    """
+    Project the expected cash flows per branch per day for the next 12 months: loan
+    repayments from the schedules coming in, investment interest and maturities going out.
+
+    Accepts `?run_date=` (default today) to project from another day, `?branch=` to
+    return one branch only and `?refresh=true` to recompute instead of using the cached
+    projection. Projections are cached per run date until schedules are rebuilt or
+    investments are processed.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            run_date = date.fromisoformat(request.query_params['run_date']) if 'run_date' in request.query_params else None
+        except ValueError:
+            return Response({"error": "run_date must be a date (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+        data = get_projection(run_date, refresh=request.query_params.get('refresh') == 'true')
+        branch = request.query_params.get('branch')
+        if branch is not None:
+            data = {**data, 'branches': [item for item in data['branches'] if str(item['branch']) == branch]}
+        return Response(data)
+
+
+class BatchView(APIView):
+    """
+    Execute several API requests in one round trip.
+
+    The body is `{"requests": [{"method", "path", "body", "headers"}, ...], "atomic": false}`
+    with up to 25 items. Items run in order, in-process, as the authenticated user, and
+    the response is the list of their `{"status", "headers", "body"}`.
+
+    With `"atomic": true` the items run inside one database transaction: the first item
+    answering with a 4xx or 5xx stops the batch, everything it wrote is rolled back and
+    the batch answers 400 with the responses up to and including the failed one.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data['requests']
+
+        if not serializer.validated_data['atomic']:
+            return Response([run_subrequest(request, item) for item in items])
+
+        responses = []
+        with db_transaction.atomic():
+            for item in items:
+                responses.append(run_subrequest(request, item))
+                if responses[-1]['status'] >= 400:
+                    db_transaction.set_rollback(True)
+                    return Response(responses, status=status.HTTP_400_BAD_REQUEST)
+        return Response(responses)
@@ -15,5 +15,29 @@ app.conf.beat_schedule = {
         'schedule': crontab(day_of_month='31', hour='23', minute='59'),
         'options': {'expires': 10.0},
     },
+    'prune-revoked-tokens': {
+        'task': 'accounts.tasks.prune_revoked_tokens',
+        'schedule': crontab(hour='3', minute='0'),
+    },
+    'accrue-interest': {
+        'task': 'core.tasks.accrue_interest',
+        'schedule': crontab(hour='0', minute='30'),
+    },
+    'process-investments': {
+        'task': 'core.tasks.process_investments',
+        'schedule': crontab(hour='0', minute='45'),
+    },
+    'assess-delinquency': {
+        'task': 'core.tasks.assess_delinquency',
+        'schedule': crontab(hour='1', minute='0'),
+    },
+    'rebuild-portfolio-rollups': {
+        'task': 'core.tasks.rebuild_portfolio_rollups',
+        'schedule': crontab(hour='2', minute='0'),
+    },
+    'collect-due-installments': {
+        'task': 'core.tasks.collect_due_installments',
+        'schedule': crontab(hour='6', minute='0'),
+    },
 }
 app.autodiscover_tasks()
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +106,37 @@ else:
     }
 
 
+# Cache
+# A file-based cache is shared by every worker process on the host; point
+# CACHE_LOCATION at a directory writable by all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+    }
+}
+
+
+# Metrics
+# Each worker writes its request metrics to METRICS_DIR so /api/v1/metrics can
+# report on all of them; it must be shared by every worker process on the host.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(BASE_DIR, 'metrics'))
+
+
+# Slow query log
+# Opt-in: queries slower than SLOW_QUERY_THRESHOLD_MS are written with their EXPLAIN
+# plan to SLOW_QUERY_LOG_FILE (rotated) and ranked at /api/v1/slow-queries/.
+SLOW_QUERY_LOG_ENABLED = config('SLOW_QUERY_LOG_ENABLED', default=False, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default=os.path.join(BASE_DIR, 'logs', 'slow_queries.log'))
+
+
+# Loan collections
+# Due installments are debited from borrowers' accounts into this account of the bank.
+BANK_ACCOUNT_NUMBER = config('BANK_ACCOUNT_NUMBER', default='4352958644329')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -153,12 +185,16 @@ AUTH_USER_MODEL = 'accounts.BaseEntity'
 # JWT Authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+        'accounts.authentication.CachedBasicAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 # JWT settings
@@ -173,6 +209,10 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    # Tokens carry a hash of the password and stop working once it changes. Tokens
+    # issued before this was enabled carry no such claim and are refused, so every user
+    # had to log in again after the deploy that turned it on.
+    'CHECK_REVOKE_TOKEN': True,
 }
 
 # Swagger settings
@@ -19,9 +19,8 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework.authentication import BasicAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from accounts.authentication import CachedBasicAuthentication, CachedJWTAuthentication
 from accounts.views import ApiRootView
 
 
@@ -37,8 +36,8 @@ schema_view = get_schema_view(
     public=True,
     permission_classes=(permissions.AllowAny,),
     authentication_classes=(
-        BasicAuthentication,
-        JWTAuthentication,
+        CachedBasicAuthentication,
+        CachedJWTAuthentication,
     ),
 )
 